@@ -0,0 +1,253 @@
+"""
+PII Anonymizer
+Single-pass, precompiled redaction of Indian personal identifiers
+"""
+
+import re
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# ==================== INDIC DIGITS ====================
+# Zero code points of the Indic scripts we support; each block has 10 digits.
+# Mapping is 1:1 per character, so match offsets in the normalized text
+# are valid offsets into the original text.
+_INDIC_ZEROS = (
+    0x0966,  # Devanagari
+    0x09E6,  # Bengali
+    0x0A66,  # Gurmukhi
+    0x0AE6,  # Gujarati
+    0x0B66,  # Oriya
+    0x0BE6,  # Tamil
+    0x0C66,  # Telugu
+    0x0CE6,  # Kannada
+    0x0D66,  # Malayalam
+)
+INDIC_DIGITS = {zero + i: ord("0") + i for zero in _INDIC_ZEROS for i in range(10)}
+
+# ==================== PATTERNS ====================
+# Every branch is either fixed/bounded length or a single possessive run
+# guarded by a lookbehind, so the regex engine does O(1) work per start
+# position (or one scan per token) and cannot backtrack catastrophically.
+_NOT_DIGIT_BEFORE = r"(?<![0-9])"
+_NOT_DIGIT_AFTER = r"(?![0-9])"
+_NOT_ALNUM_BEFORE = r"(?<![A-Za-z0-9])"
+_NOT_ALNUM_AFTER = r"(?![A-Za-z0-9])"
+
+# Registration state codes (plus BH series) keep vehicle matches specific
+_STATE_CODES = (
+    "AN|AP|AR|AS|BR|CG|CH|DD|DL|DN|GA|GJ|HP|HR|JH|JK|KA|KL|LA|LD|MH|ML|MN|MP|MZ|"
+    "NL|OD|OR|PB|PY|RJ|SK|TN|TR|TS|UA|UK|UP|WB"
+)
+
+_PATTERNS = {
+    # ABHA address, e.g. "ramesh.kumar@abdm"
+    "abha_address": r"(?<![A-Za-z0-9._%+-])[A-Za-z0-9._]++@(?:abdm|sbx)(?![A-Za-z0-9.-])",
+    # Email; the TLD is checked in the dispatcher so a trailing "." never forces backtracking
+    "email": r"(?<![A-Za-z0-9._%+-])[A-Za-z0-9._%+-]++@[A-Za-z0-9-]++(?:\.[A-Za-z0-9-]++)++",
+    # ABHA number: 14 digits, usually written 91-1234-5678-9012
+    "abha": _NOT_DIGIT_BEFORE + r"[0-9]{2}(?P<abha_sep>[ -]?)[0-9]{4}(?P=abha_sep)[0-9]{4}(?P=abha_sep)[0-9]{4}" + _NOT_DIGIT_AFTER,
+    # Aadhaar: 12 digits starting 2-9, optionally grouped 4-4-4 (Verhoeff-checked)
+    "aadhaar": _NOT_DIGIT_BEFORE + r"[2-9][0-9]{3}(?P<aadhaar_sep>[ -]?)[0-9]{4}(?P=aadhaar_sep)[0-9]{4}" + _NOT_DIGIT_AFTER,
+    # Phone: optional +91/0091/91/0 prefix, then 10 digits as 10, 3-3-4 or 5-5
+    "phone": (
+        r"(?<![0-9+])(?:(?:\+|00)91[ -]?|91[ -]|0)?"
+        r"(?:[0-9]{3}[-. ]?[0-9]{3}[-. ]?[0-9]{4}|[0-9]{5}[ -][0-9]{5})"
+        + _NOT_DIGIT_AFTER
+    ),
+    # PAN: AAAPA1234A (4th letter is the holder type)
+    "pan": _NOT_ALNUM_BEFORE + r"[A-Z]{3}[ABCFGHJLPT][A-Z][0-9]{4}[A-Z]" + _NOT_ALNUM_AFTER,
+    # Vehicle registration: MH 12 AB 1234, DL3CAB1234, 22 BH 1234 AA
+    "vehicle": (
+        _NOT_ALNUM_BEFORE
+        + r"(?:(?:" + _STATE_CODES + r")[ -]?[0-9]{1,2}[ -]?[A-Z]{0,3}[ -]?[0-9]{4}"
+        + r"|[0-9]{2}[ -]?BH[ -]?[0-9]{4}[ -]?[A-Z]{1,2})"
+        + _NOT_ALNUM_AFTER
+    ),
+    # PIN code: standalone 6 digits (first digit 1-9), optionally "400 001";
+    # only redacted with address context (see _PIN_CONTEXT)
+    "pin": _NOT_DIGIT_BEFORE + r"[1-9][0-9]{2} ?[0-9]{3}" + _NOT_DIGIT_AFTER,
+}
+
+# A bare 6-digit number is usually a lab value ("platelet count 150000"),
+# so a PIN candidate needs a keyword or a place name right before it:
+# "PIN: 400001", "pincode 560 001", "Pune - 411001", "Tamil Nadu 600001"
+_PIN_KEYWORDS = r"pin ?code|pin|postal code|zip(?: ?code)?|पिन ?कोड|पिन"
+_PLACES = (
+    # States and union territories
+    "andhra pradesh|arunachal pradesh|assam|bihar|chhattisgarh|goa|gujarat|haryana|"
+    "himachal pradesh|jharkhand|karnataka|kerala|madhya pradesh|maharashtra|manipur|"
+    "meghalaya|mizoram|nagaland|odisha|orissa|punjab|rajasthan|sikkim|tamil nadu|"
+    "telangana|tripura|uttar pradesh|uttarakhand|west bengal|delhi|chandigarh|"
+    "puducherry|pondicherry|jammu|kashmir|ladakh|"
+    # Large cities
+    "mumbai|bombay|new delhi|kolkata|calcutta|chennai|madras|bengaluru|bangalore|"
+    "hyderabad|ahmedabad|pune|surat|jaipur|lucknow|kanpur|nagpur|indore|thane|bhopal|"
+    "visakhapatnam|patna|vadodara|ghaziabad|ludhiana|agra|nashik|noida|gurgaon|gurugram|"
+    "coimbatore|madurai|kochi|cochin|thiruvananthapuram|mysuru|mysore|varanasi|ranchi|"
+    "guwahati|bhubaneswar|raipur|dehradun|amritsar|srinagar"
+)
+_PIN_CONTEXT = re.compile(
+    r"(?:(?<!\w)(?:" + _PIN_KEYWORDS + r")(?: ?(?:no\.?|number))?|(?<!\w)(?:" + _PLACES + r"))[ :.#,-]{0,4}$",
+    re.IGNORECASE,
+)
+# How far back the keyword / place name is searched for
+_PIN_CONTEXT_CHARS = 40
+
+# Branches that need an "@" in the text
+_AT_PATTERNS = ("abha_address", "email")
+
+
+def _compile(names, gate: str) -> "re.Pattern":
+    """
+    Combine branches into one alternation behind a leading lookahead gate
+
+    The gate lets the scanner reject positions that cannot start any
+    identifier (spaces, lowercase letters, Indic letters) after a single
+    character-class test instead of trying every branch.
+    """
+    body = "|".join(f"(?P<{name}>{_PATTERNS[name]})" for name in names)
+    return re.compile(f"(?={gate})(?:{body})")
+
+
+# Alternation order matters: longer / more specific identifiers first.
+# Texts without "@" (the common case) use the narrower pattern.
+PII_PATTERN = _compile(list(_PATTERNS), r"[0-9+A-Za-z._%-]")
+PII_PATTERN_NO_AT = _compile([n for n in _PATTERNS if n not in _AT_PATTERNS], r"[0-9+A-Z]")
+
+# Used to reclassify 12-digit numbers that fail the Aadhaar checksum
+_PHONE_FULL = re.compile(r"91[6-9][0-9]{9}")
+_TLD = re.compile(r"[A-Za-z]{2,}")
+
+REPLACEMENTS = {
+    "abha_address": "[ABHA]",
+    "email": "[EMAIL]",
+    "abha": "[ABHA]",
+    "aadhaar": "[AADHAAR]",
+    "phone": "[PHONE]",
+    "pan": "[PAN]",
+    "vehicle": "[VEHICLE]",
+    "pin": "[PIN]",
+}
+
+# ==================== VERHOEFF CHECKSUM ====================
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
+    (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
+    (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
+    (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
+    (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+
+def verhoeff_valid(digits: str) -> bool:
+    """
+    Validate a number whose last digit is a Verhoeff check digit (Aadhaar)
+
+    Args:
+        digits: ASCII digit string
+
+    Returns:
+        True if the checksum is valid
+    """
+    check = 0
+    for i, ch in enumerate(reversed(digits)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[i % 8][ord(ch) - 48]]
+    return check == 0
+
+
+def _classify(kind: str, value: str, before: str = "") -> str:
+    """
+    Replacement token for one match, or the value itself if it is a false positive
+
+    Args:
+        kind: Pattern name
+        value: Matched text
+        before: Text just before the match (PIN codes need address context)
+    """
+    if kind == "pin":
+        if _PIN_CONTEXT.search(before):
+            return REPLACEMENTS["pin"]
+        return value
+    if kind == "aadhaar":
+        digits = value.replace(" ", "").replace("-", "")
+        if verhoeff_valid(digits):
+            return REPLACEMENTS["aadhaar"]
+        # 12 digits failing the checksum are often 91-prefixed mobile numbers
+        if _PHONE_FULL.fullmatch(digits):
+            return REPLACEMENTS["phone"]
+        return value
+    if kind == "email":
+        if _TLD.fullmatch(value.rsplit(".", 1)[1]):
+            return REPLACEMENTS["email"]
+        return value
+    return REPLACEMENTS[kind]
+
+
+def anonymize(text: str) -> str:
+    """
+    Replace personal identifiers with placeholder tokens in one regex pass
+
+    Covers phone numbers, emails, Aadhaar (Verhoeff-validated), ABHA numbers
+    and addresses, PAN, vehicle registrations and PIN codes (with address
+    context only), written with ASCII or Indic-script digits.
+
+    Args:
+        text: Free text, e.g. a patient's symptom description
+
+    Returns:
+        Text with identifiers replaced by tokens like [PHONE] or [AADHAAR]
+    """
+    normalized = text.translate(INDIC_DIGITS)
+    pattern = PII_PATTERN if "@" in normalized else PII_PATTERN_NO_AT
+
+    parts = []
+    last = 0
+    for match in pattern.finditer(normalized):
+        value = match.group()
+        start, end = match.span()
+        replacement = _classify(match.lastgroup, value, normalized[max(0, start - _PIN_CONTEXT_CHARS):start])
+        if replacement is value:
+            continue
+        parts.append(text[last:start])
+        parts.append(replacement)
+        last = end
+
+    if not parts:
+        return text
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def find_pii(text: str) -> Dict[str, int]:
+    """
+    Count identifiers by type without modifying the text (for audits/debugging)
+    """
+    counts: Dict[str, int] = {}
+    normalized = text.translate(INDIC_DIGITS)
+    pattern = PII_PATTERN if "@" in normalized else PII_PATTERN_NO_AT
+    for match in pattern.finditer(normalized):
+        value = match.group()
+        before = normalized[max(0, match.start() - _PIN_CONTEXT_CHARS):match.start()]
+        if _classify(match.lastgroup, value, before) is not value:
+            counts[match.lastgroup] = counts.get(match.lastgroup, 0) + 1
+    return counts
+
+
+logger.info(f"PII anonymizer loaded ({len(_PATTERNS)} identifier patterns)")
@@ -0,0 +1,344 @@
+"""
+Audit Store
+Append-only, batched audit log (DISHA Act) kept apart from the debug log
+
+Layout under AUDIT_DIR (one segment series per writing process, so
+uvicorn workers never append to the same file):
+    audit-YYYYMMDD-PID-NNNN.seg   length-prefixed compact JSON records
+    audit-YYYYMMDD-PID-NNNN.idx   fixed header + request_id per record (timestamp, offset)
+
+Usage:
+    python audit_store.py --request-id 20250101_101500_123456
+    python audit_store.py --since 2025-01-01T00:00 --until 2025-01-02T00:00
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import struct
+import logging
+import argparse
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from write_behind import WriteBehindQueue, DROP_OLDEST
+from serialization import dumps, loads
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Audit Store Configuration
+DATA_DIR = os.getenv("NIDAAN_DATA_DIR", "data")
+AUDIT_DIR = os.path.join(DATA_DIR, "audit")
+AUDIT_SEGMENT_MAX_BYTES = int(os.getenv("AUDIT_SEGMENT_MAX_BYTES", str(16 * 1024 * 1024)))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "512"))
+AUDIT_RING_CAPACITY = int(os.getenv("AUDIT_RING_CAPACITY", "65536"))
+# always: fsync every batch | interval: at most every AUDIT_FSYNC_SECONDS | never: leave it to the OS
+AUDIT_FSYNC_POLICY = os.getenv("AUDIT_FSYNC_POLICY", "interval")
+AUDIT_FSYNC_SECONDS = float(os.getenv("AUDIT_FSYNC_SECONDS", "5.0"))
+
+_FRAME = struct.Struct("<I")          # payload length
+_INDEX = struct.Struct("<dIB")        # timestamp, segment offset, request_id length
+
+
+def _encode(entry: Dict) -> bytes:
+    return dumps(entry)
+
+
+def _prefix(day: str) -> str:
+    """Segment name prefix of this process for a day, e.g. audit-20250101-4242-"""
+    return f"audit-{day}-{os.getpid()}-"
+
+
+class AuditStore:
+    """
+    Write-behind ring buffer in front of append-only segment files
+
+    append() only touches memory; the write-behind queue flushes batches to
+    the current day's segment and its index. Lookups by request_id or time range
+    use the in-memory index and read records with one seek each.
+    """
+
+    def __init__(
+        self,
+        directory: str = AUDIT_DIR,
+        fsync_policy: str = AUDIT_FSYNC_POLICY,
+        segment_max_bytes: int = AUDIT_SEGMENT_MAX_BYTES,
+        ring_capacity: int = AUDIT_RING_CAPACITY
+    ):
+        if fsync_policy not in ("always", "interval", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+
+        self.directory = directory
+        self.fsync_policy = fsync_policy
+        self.segment_max_bytes = segment_max_bytes
+        self.ring_capacity = ring_capacity
+        # Lossy by design: under overload the oldest buffered entries are dropped (and counted)
+        self.writes = WriteBehindQueue(
+            "audit", self.write_batch,
+            capacity=ring_capacity,
+            batch_size=AUDIT_BATCH_SIZE,
+            flush_interval=AUDIT_FLUSH_INTERVAL,
+            overflow=DROP_OLDEST
+        )
+        # Guards segment files and index (flushes run in a worker thread)
+        self._lock = threading.RLock()
+
+        # Index: time-ordered (ts, segment, offset) plus request_id -> positions
+        self._times: List[float] = []
+        self._positions: List[Tuple[str, int]] = []
+        self._by_request: Dict[str, List[int]] = {}
+
+        self._segment: Optional[str] = None
+        self._seg_file = None
+        self._idx_file = None
+        self._last_fsync = 0.0
+
+        self.stats = {"flushed": 0, "flushes": 0, "bytes": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # ==================== WRITE PATH ====================
+    def append(self, entry: Dict):
+        """
+        Buffer one audit entry (never blocks on disk)
+
+        When the ring is full the oldest buffered entry is dropped and counted.
+        """
+        self.writes.put_nowait(entry)
+
+    async def start(self):
+        """Start the background flusher (called from app lifespan)"""
+        await self.writes.start()
+        logger.info(f"✓ Audit store started: {self.directory} (fsync={self.fsync_policy})")
+
+    async def stop(self):
+        """Stop the flusher and write everything still buffered"""
+        await self.writes.stop()
+        with self._lock:
+            self._close_segment()
+        logger.info("Audit store stopped")
+
+    def flush(self):
+        """Drain the ring buffer to disk in batches"""
+        self.writes.flush()
+
+    def write_batch(self, batch: List[Dict]):
+        """Append a batch of entries to the current segment with one write per file"""
+        if not batch:
+            return
+        with self._lock:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Dict]):
+        day = datetime.fromtimestamp(batch[0]["ts"]).strftime("%Y%m%d")
+        # The pid check also reopens after a fork: offsets come from tell(),
+        # which is only right while this process is the file's sole writer
+        if self._segment is None or not os.path.basename(self._segment).startswith(_prefix(day)) \
+                or self._seg_file.tell() >= self.segment_max_bytes:
+            self._open_segment(day)
+
+        offset = self._seg_file.tell()
+        frames = []
+        index = []
+        for entry in batch:
+            payload = _encode(entry)
+            request_id = (entry.get("request_id") or "").encode()[:255]
+            frames.append(_FRAME.pack(len(payload)))
+            frames.append(payload)
+            index.append(_INDEX.pack(entry["ts"], offset, len(request_id)))
+            index.append(request_id)
+            self._add_to_index(entry["ts"], self._segment, offset, entry.get("request_id"))
+            offset += _FRAME.size + len(payload)
+
+        data = b"".join(frames)
+        self._seg_file.write(data)
+        self._idx_file.write(b"".join(index))
+        self._seg_file.flush()
+        self._idx_file.flush()
+
+        now = time.monotonic()
+        if self.fsync_policy == "always" or (
+            self.fsync_policy == "interval" and now - self._last_fsync >= AUDIT_FSYNC_SECONDS
+        ):
+            os.fsync(self._seg_file.fileno())
+            os.fsync(self._idx_file.fileno())
+            self._last_fsync = now
+
+        self.stats["flushed"] += len(batch)
+        self.stats["flushes"] += 1
+        self.stats["bytes"] += len(data)
+
+    def _open_segment(self, day: str):
+        self._close_segment()
+        existing = sorted(glob.glob(os.path.join(self.directory, f"{_prefix(day)}*.seg")))
+        number = 0
+        if existing:
+            number = int(existing[-1].rsplit("-", 1)[1].split(".")[0])
+            if os.path.getsize(existing[-1]) >= self.segment_max_bytes:
+                number += 1
+        self._segment = os.path.join(self.directory, f"{_prefix(day)}{number:04d}.seg")
+        self._seg_file = open(self._segment, "ab")
+        self._idx_file = open(self._segment[:-4] + ".idx", "ab")
+
+    def _close_segment(self):
+        for f in (self._seg_file, self._idx_file):
+            if f is not None:
+                f.flush()
+                if self.fsync_policy != "never":
+                    os.fsync(f.fileno())
+                f.close()
+        self._seg_file = self._idx_file = None
+        self._segment = None
+
+    # ==================== INDEX ====================
+    def _add_to_index(self, ts: float, segment: str, offset: int, request_id: Optional[str]):
+        # Entries almost always arrive in time order; insort only when they do not
+        if self._times and ts < self._times[-1]:
+            pos = bisect_right(self._times, ts)
+            self._times.insert(pos, ts)
+            self._positions.insert(pos, (segment, offset))
+            for positions in self._by_request.values():
+                for i, p in enumerate(positions):
+                    if p >= pos:
+                        positions[i] = p + 1
+        else:
+            pos = len(self._times)
+            self._times.append(ts)
+            self._positions.append((segment, offset))
+        if request_id:
+            self._by_request.setdefault(request_id, []).append(pos)
+
+    def _load_index(self):
+        """
+        Rebuild the in-memory index from the .idx sidecars
+
+        Segments of several processes interleave in time, so entries are
+        collected first and sorted once (inserting them one by one out of
+        order would be quadratic).
+        """
+        entries = []
+        for idx_path in glob.glob(os.path.join(self.directory, "audit-*.idx")):
+            segment = idx_path[:-4] + ".seg"
+            with open(idx_path, "rb") as f:
+                data = f.read()
+            pos = 0
+            while pos + _INDEX.size <= len(data):
+                ts, offset, rid_len = _INDEX.unpack_from(data, pos)
+                pos += _INDEX.size
+                request_id = data[pos:pos + rid_len].decode(errors="replace")
+                pos += rid_len
+                entries.append((ts, segment, offset, request_id))
+        entries.sort(key=lambda e: (e[0], e[1], e[2]))
+
+        self._times = [e[0] for e in entries]
+        self._positions = [(e[1], e[2]) for e in entries]
+        self._by_request = {}
+        for pos, entry in enumerate(entries):
+            if entry[3]:
+                self._by_request.setdefault(entry[3], []).append(pos)
+        if self._times:
+            logger.info(f"✓ Audit index loaded: {len(self._times)} entries")
+
+    def forget_segment(self, segment: str):
+        """Drop a deleted segment from the index (used by retention)"""
+        with self._lock:
+            self._forget_segment(segment)
+
+    def _forget_segment(self, segment: str):
+        keep = [i for i, (seg, _) in enumerate(self._positions) if seg != segment]
+        self._times = [self._times[i] for i in keep]
+        self._positions = [self._positions[i] for i in keep]
+        remap = {old: new for new, old in enumerate(keep)}
+        self._by_request = {
+            rid: [remap[p] for p in positions if p in remap]
+            for rid, positions in self._by_request.items()
+        }
+        self._by_request = {rid: p for rid, p in self._by_request.items() if p}
+
+    # ==================== READ PATH ====================
+    def _read(self, positions: List[int]) -> List[Dict]:
+        entries = []
+        handles = {}
+        # Segments deleted by another worker's retention sweep (forget_segment
+        # only runs in the worker that dropped them)
+        missing = set()
+        try:
+            for p in positions:
+                segment, offset = self._positions[p]
+                if segment in missing:
+                    continue
+                f = handles.get(segment)
+                if f is None:
+                    try:
+                        f = handles[segment] = open(segment, "rb")
+                    except FileNotFoundError:
+                        missing.add(segment)
+                        continue
+                f.seek(offset)
+                (length,) = _FRAME.unpack(f.read(_FRAME.size))
+                entries.append(loads(f.read(length)))
+        finally:
+            for f in handles.values():
+                f.close()
+        for segment in missing:
+            self._forget_segment(segment)
+        return entries
+
+    def query(
+        self,
+        request_id: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: int = 1000
+    ) -> List[Dict]:
+        """
+        Look up audit entries by request_id and/or time range (epoch seconds)
+
+        Flushed entries come from disk via the index; entries still buffered
+        in memory are included as well.
+        """
+        with self._lock:
+            lo = bisect_left(self._times, start) if start is not None else 0
+            hi = bisect_right(self._times, end) if end is not None else len(self._times)
+            if request_id is not None:
+                positions = [p for p in self._by_request.get(request_id, []) if lo <= p < hi]
+            else:
+                positions = list(range(lo, hi))
+            entries = self._read(positions[:limit])
+
+        for entry in self.writes.pending():
+            if len(entries) >= limit:
+                break
+            if request_id is not None and entry.get("request_id") != request_id:
+                continue
+            if (start is not None and entry["ts"] < start) or (end is not None and entry["ts"] > end):
+                continue
+            entries.append(entry)
+        return entries
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the NIDAAN-AI audit store")
+    parser.add_argument("--request-id", help="Exact request id")
+    parser.add_argument("--since", help="ISO timestamp (inclusive)")
+    parser.add_argument("--until", help="ISO timestamp (inclusive)")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--dir", default=AUDIT_DIR)
+    args = parser.parse_args()
+
+    store = AuditStore(args.dir)
+    for entry in store.query(args.request_id, _parse_time(args.since), _parse_time(args.until), args.limit):
+        entry["timestamp"] = datetime.fromtimestamp(entry["ts"]).isoformat()
+        sys.stdout.write(json.dumps(entry, ensure_ascii=False) + "\n")
@@ -0,0 +1,318 @@
+"""
+Batch Triage
+Re-triage archived symptom records (JSONL or CSV) offline with a bounded worker pool
+
+Each input record needs a symptom text column/field ("symptom_text", "symptoms"
+or "text"); "user_language"/"language" and "id" are optional. Results are
+appended to a JSONL file as they complete, so output order is completion
+order - every result carries the input "index".
+
+Usage:
+    python nidaan.py batch records.jsonl -o results.jsonl --workers 8
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Iterator, Optional, Set, Tuple
+from anonymizer import anonymize
+from emergency import find_emergency_keywords
+from serialization import dumps_str
+
+logger = logging.getLogger(__name__)
+
+# Batch Configuration
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+BATCH_LLM_RETRIES = 3
+# Checkpoint after this many results or seconds, whichever comes first
+CHECKPOINT_EVERY_RESULTS = 50
+CHECKPOINT_EVERY_SECONDS = 5.0
+PROGRESS_EVERY_SECONDS = 2.0
+
+TEXT_FIELDS = ("symptom_text", "symptoms", "text")
+LANGUAGE_FIELDS = ("user_language", "language")
+ID_FIELDS = ("id", "record_id")
+
+
+# ==================== INPUT ====================
+def _first(record: Dict, fields, default=None):
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return value
+    return default
+
+
+def read_records(path: str) -> Iterator[Tuple[int, Dict]]:
+    """
+    Stream (index, record) pairs from a .jsonl or .csv file
+
+    Only one line is held in memory at a time. Malformed JSON lines are
+    yielded as {"_error": ...} so they still produce a result row.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            for index, row in enumerate(csv.DictReader(f)):
+                yield index, row
+            return
+        index = 0
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    record = {"_error": "record is not a JSON object"}
+            except json.JSONDecodeError as e:
+                record = {"_error": f"invalid JSON: {e}"}
+            yield index, record
+            index += 1
+
+
+def count_records(path: str) -> int:
+    """Record count for ETA (one streaming pass, no parsing)"""
+    with open(path, encoding="utf-8") as f:
+        count = sum(1 for line in f if line.strip())
+    return count - 1 if path.lower().endswith(".csv") and count else count
+
+
+# ==================== CHECKPOINT ====================
+class Checkpoint:
+    """
+    Resume point for a batch run
+
+    Stored as a watermark (every index below it is done) plus the set of
+    done indexes above it. Workers finish out of order, but the set never
+    grows beyond roughly the worker count, so the file stays tiny.
+    Results written after the last save are recovered from the output
+    file on resume (see reconcile), so they are not re-run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = 0
+        self.done: Set[int] = set()
+        self._saved_at = time.monotonic()
+        self._unsaved = 0
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        self.watermark = state["watermark"]
+        self.done = set(state["done"])
+        return True
+
+    def reconcile(self, output_path: str) -> int:
+        """
+        Mark results that reached the output after the last save as done
+
+        A torn final line (crash mid-write) is cut off so it is redone.
+
+        Returns:
+            Number of recovered results
+        """
+        if not os.path.exists(output_path):
+            return 0
+        recovered = 0
+        good_bytes = 0
+        with open(output_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                good_bytes += len(line)
+                try:
+                    index = json.loads(line)["index"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if not self.is_done(index):
+                    self.mark(index)
+                    recovered += 1
+        if good_bytes < os.path.getsize(output_path):
+            with open(output_path, "r+b") as f:
+                f.truncate(good_bytes)
+        return recovered
+
+    def is_done(self, index: int) -> bool:
+        return index < self.watermark or index in self.done
+
+    def mark(self, index: int):
+        self.done.add(index)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+        self._unsaved += 1
+
+    def due(self) -> bool:
+        return self._unsaved >= CHECKPOINT_EVERY_RESULTS or (
+            self._unsaved and time.monotonic() - self._saved_at >= CHECKPOINT_EVERY_SECONDS
+        )
+
+    def save(self):
+        """Atomic replace, so a crash never leaves a torn checkpoint"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"watermark": self.watermark, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+        self._saved_at = time.monotonic()
+        self._unsaved = 0
+
+
+# ==================== TRIAGE ====================
+async def triage_record(record: Dict) -> Dict:
+    """
+    Same pipeline as /analyze minus consent and response translation:
+    translate to English, emergency keyword check, then the LLM
+
+    Returns:
+        Result dict with risk, doctor_summary, advice and status (English)
+    """
+    from llm import call_llm_shared
+    from sarvam_translator import translate_to_english
+
+    if "_error" in record:
+        return {"risk": "ERROR", "status": "invalid_record", "error": record["_error"]}
+
+    # Archived records may contain identifiers; only anonymized text leaves the machine
+    symptom_text = anonymize(str(_first(record, TEXT_FIELDS, "")))
+    language = _first(record, LANGUAGE_FIELDS, "English")
+    if len(symptom_text.strip()) < 5:
+        return {"risk": "LOW", "status": "incomplete_input",
+                "doctor_summary": "Insufficient symptom detail provided.", "advice": ""}
+
+    english_symptoms = symptom_text
+    if language != "English":
+        try:
+            translation = await translate_to_english(symptom_text, language)
+            if translation.get("success"):
+                english_symptoms = translation.get("translated_text", symptom_text)
+        except Exception as e:
+            logger.warning(f"⚠️ Translation failed, using original text: {e}")
+
+    found_urgent = find_emergency_keywords(english_symptoms)
+    if found_urgent:
+        return {
+            "risk": "HIGH",
+            "status": "emergency_detected",
+            "doctor_summary": "EMERGENCY: Severe symptoms detected requiring IMMEDIATE medical attention.",
+            "advice": "Call 108 or visit the nearest emergency room immediately.",
+            "keywords": found_urgent
+        }
+
+    result = {}
+    for attempt in range(BATCH_LLM_RETRIES):
+        result = await call_llm_shared(english_symptoms)
+        if "error" not in result:
+            return {
+                "risk": str(result.get("risk", "MODERATE")).upper(),
+                "status": "success",
+                "doctor_summary": result.get("doctor_summary", ""),
+                "advice": result.get("advice", "")
+            }
+        await asyncio.sleep(2 ** attempt)
+    return {"risk": "ERROR", "status": "ai_error", "error": result.get("raw_error") or result.get("error")}
+
+
+# ==================== RUNNER ====================
+def _print_progress(done: int, skipped: int, total: Optional[int], started: float):
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    line = f"  processed {done}"
+    if total is not None:
+        remaining = max(0, total - skipped - done)
+        eta = remaining / rate if rate > 0 else (0.0 if not remaining else float("inf"))
+        line += f"/{total - skipped}  {rate:6.1f} rec/s  ETA {eta / 60:6.1f} min"
+    else:
+        line += f"  {rate:6.1f} rec/s"
+    sys.stderr.write(line + "\n")
+    sys.stderr.flush()
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    workers: int = BATCH_WORKERS,
+    checkpoint_path: Optional[str] = None,
+    fresh: bool = False,
+    show_eta: bool = True
+) -> Dict:
+    """
+    Triage every record of input_path into output_path (JSONL)
+
+    Args:
+        input_path: .jsonl or .csv file
+        output_path: Results file; appended to when resuming
+        workers: Concurrent records in flight
+        checkpoint_path: Defaults to output_path + ".ckpt"
+        fresh: Ignore any checkpoint and truncate the output
+        show_eta: Count input records first so progress shows an ETA
+
+    Returns:
+        Summary with counts per status and risk, throughput and duration
+    """
+    checkpoint = Checkpoint(checkpoint_path or output_path + ".ckpt")
+    if fresh and os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+    resumed = not fresh and checkpoint.load()
+    if resumed:
+        checkpoint.reconcile(output_path)
+    total = count_records(input_path) if show_eta else None
+    skipped = checkpoint.watermark + len(checkpoint.done) if resumed else 0
+    if resumed:
+        sys.stderr.write(f"Resuming: {skipped} records already done\n")
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    summary = {"status": {}, "risk": {}, "processed": 0}
+    started = time.monotonic()
+    last_progress = started
+
+    with open(output_path, "w" if fresh or not resumed else "a", encoding="utf-8") as out:
+
+        async def producer():
+            for index, record in read_records(input_path):
+                if not checkpoint.is_done(index):
+                    await queue.put((index, record))
+            for _ in range(workers):
+                await queue.put(None)
+
+        async def worker():
+            nonlocal last_progress
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, record = item
+                try:
+                    result = await triage_record(record)
+                except Exception as e:
+                    logger.error(f"❌ Record {index} failed: {e}")
+                    result = {"risk": "ERROR", "status": "failed", "error": str(e)}
+
+                row = {"index": index, "id": _first(record, ID_FIELDS), **result}
+                out.write(dumps_str(row) + "\n")
+                out.flush()
+                checkpoint.mark(index)
+                if checkpoint.due():
+                    checkpoint.save()
+
+                summary["processed"] += 1
+                summary["status"][result["status"]] = summary["status"].get(result["status"], 0) + 1
+                summary["risk"][result["risk"]] = summary["risk"].get(result["risk"], 0) + 1
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_EVERY_SECONDS:
+                    last_progress = now
+                    _print_progress(summary["processed"], skipped, total, started)
+
+        await asyncio.gather(producer(), *(worker() for _ in range(workers)))
+        checkpoint.save()
+
+    duration = time.monotonic() - started
+    _print_progress(summary["processed"], skipped, total, started)
+    summary["duration_seconds"] = round(duration, 2)
+    summary["records_per_second"] = round(summary["processed"] / duration, 2) if duration else 0.0
+    return summary
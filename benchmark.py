@@ -0,0 +1,880 @@
+"""
+NIDAAN-AI Benchmarks
+Micro-benchmarks for the backend subsystems
+
+Usage:
+    python benchmark.py            # run all benchmarks
+    python benchmark.py outbox     # run one benchmark
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+# Benchmarks never touch the real data directory
+os.environ.setdefault("NIDAAN_DATA_DIR", tempfile.mkdtemp(prefix="nidaan-bench-"))
+
+
+def report(name: str, count: int, seconds: float):
+    """Print throughput and per-operation cost for one measurement"""
+    per_op_us = seconds / count * 1e6 if count else 0.0
+    print(f"  {name:<34} {count:>8} ops  {seconds:8.3f}s  "
+          f"{count / seconds:>12,.0f} ops/s  {per_op_us:9.1f} µs/op")
+
+
+# ==================== OUTBOX ====================
+def bench_outbox(messages: int = 20000, batch_size: int = 100):
+    """
+    Durable outbox throughput: one transaction per enqueue (as /send-whatsapp
+    does), then batch fetch/commit as the dispatcher does
+    """
+    from outbox import Outbox
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = Outbox(os.path.join(tmp, "outbox.db"))
+        body = "🏥 *NIDAAN-AI Medical Report*\n\n" + "Risk Level: MODERATE. " * 20
+
+        start = time.perf_counter()
+        for i in range(messages):
+            outbox.enqueue(f"bench-{i}", "whatsapp:+919876543210", body, f"req-{i}")
+        enqueue_elapsed = time.perf_counter() - start
+        report("enqueue (1 txn each)", messages, enqueue_elapsed)
+
+        start = time.perf_counter()
+        delivered = 0
+        while True:
+            batch = outbox.fetch_batch(batch_size)
+            if not batch:
+                break
+            outbox.commit_batch([{"id": row["id"], "status": "sent", "sid": "SM"} for row in batch])
+            delivered += len(batch)
+        drain_elapsed = time.perf_counter() - start
+        report(f"fetch+commit (batch {batch_size})", delivered, drain_elapsed)
+
+        print(f"  → enqueue+drain: {messages / (enqueue_elapsed + drain_elapsed) * 60:,.0f} reports/min on one node")
+        outbox.close()
+
+
+# ==================== ANONYMIZER ====================
+def bench_anonymizer(iterations: int = 20000):
+    """
+    PII redaction throughput on realistic symptom texts, plus a scaling check
+    on adversarial inputs (time must grow linearly with input length)
+    """
+    from anonymizer import anonymize
+
+    texts = [
+        "I have had fever and cough for 3 days. Call me on 9876543210.",
+        "मुझे 2 दिन से सिरदर्द है। मेरा नंबर ९८७६५४३२१० है, आधार 2345 6789 0124",
+        "Child vomiting since morning, temperature 102F. Email: parent.name@gmail.com",
+        "எனக்கு நெஞ்சு வலி உள்ளது. ABHA 91-1234-5678-9012, PIN 600001",
+        "Accident near MH 12 AB 1234, leg swelling and pain, PAN ABCPD1234E on file",
+        "Mild cold and sneezing, no other symptoms. BP 120/80, sugar 110 mg/dl.",
+    ]
+    total_chars = sum(len(t) for t in texts)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            anonymize(text)
+    elapsed = time.perf_counter() - start
+    count = iterations * len(texts)
+    report("anonymize (realistic texts)", count, elapsed)
+    print(f"  → {total_chars * iterations / elapsed / 1e6:.1f} M chars/s")
+
+    # Lab values look like PIN codes; only numbers with address context may go
+    expected = {
+        "Dengue, platelet count 150000 and falling": "Dengue, platelet count 150000 and falling",
+        "WBC 110000/uL, platelets 1,50,000": "WBC 110000/uL, platelets 1,50,000",
+        "PIN: 400 001, platelet count 150000": "PIN: [PIN], platelet count 150000",
+        "Andheri East, Mumbai - 400069": "Andheri East, Mumbai - [PIN]",
+    }
+    for text, redacted in expected.items():
+        assert anonymize(text) == redacted, f"{text!r} -> {anonymize(text)!r}"
+    print(f"  ✓ Medical counts kept, PIN codes with address context redacted ({len(expected)} cases)")
+
+    print("  Adversarial scaling (time per char should stay flat):")
+    adversarial = {
+        "digits": "1",
+        "email local part": "a.",
+        "email domain": "a@b-",
+        "grouped digits": "1234 ",
+        "uppercase": "MH",
+    }
+    for name, unit in adversarial.items():
+        timings = []
+        for size in (10_000, 100_000, 1_000_000):
+            text = unit * (size // len(unit))
+            start = time.perf_counter()
+            anonymize(text)
+            timings.append((time.perf_counter() - start) / size * 1e9)
+        print(f"    {name:<20} " + "  ".join(f"{ns:6.1f} ns/char" for ns in timings))
+
+
+# ==================== AUDIT STORE ====================
+def bench_audit(events: int = 200000):
+    """
+    Per-event cost of the audit path: append() on the request path, then
+    batched flush under each fsync policy, then indexed lookups
+    """
+    import random
+    from audit_store import AuditStore
+
+    for policy in ("never", "interval", "always"):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = AuditStore(tmp, fsync_policy=policy, ring_capacity=events)
+            now = time.time()
+            entries = [
+                {"ts": now + i * 1e-4, "action": "analyze_request", "request_id": f"req_{i:08d}",
+                 "user_hash": "3f2a9c1b7d4e5f60", "status": "started"}
+                for i in range(events)
+            ]
+
+            start = time.perf_counter()
+            for entry in entries:
+                store.append(entry)
+            report(f"append ({policy})", events, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            store.flush()
+            report(f"flush ({policy})", events, time.perf_counter() - start)
+
+            if policy == "never":
+                lookups = 10000
+                ids = [f"req_{random.randrange(events):08d}" for _ in range(lookups)]
+                start = time.perf_counter()
+                for rid in ids:
+                    store.query(request_id=rid)
+                report("query by request_id", lookups, time.perf_counter() - start)
+
+                start = time.perf_counter()
+                for i in range(1000):
+                    t0 = now + random.randrange(events) * 1e-4
+                    store.query(start=t0, end=t0 + 0.01)
+                report("query 10ms time window", 1000, time.perf_counter() - start)
+
+                print(f"  → {store.stats['bytes'] / events:.0f} bytes/event on disk")
+            store._close_segment()
+
+
+# ==================== CONSENT REGISTRY ====================
+def bench_consent(users: int = 10000, checks: int = 500000):
+    """
+    Per-request consent check: cached hits vs read-through misses
+    """
+    import random
+    from consent_registry import ConsentRegistry
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ConsentRegistry(os.path.join(tmp, "consent.db"))
+        start = time.perf_counter()
+        for i in range(users):
+            registry.record(f"user-{i}", "data_collection", True)
+        registry.flush()
+        report("record + batched flush", users, time.perf_counter() - start)
+
+        cold = ConsentRegistry(os.path.join(tmp, "consent.db"))
+        start = time.perf_counter()
+        for i in range(users):
+            cold.check(f"user-{i}", "data_collection")
+        report("check (miss, read-through)", users, time.perf_counter() - start)
+
+        ids = [f"user-{random.randrange(users)}" for _ in range(checks)]
+        start = time.perf_counter()
+        for user_id in ids:
+            cold.check(user_id, "data_collection")
+        report("check (cached)", checks, time.perf_counter() - start)
+
+
+def bench_history(records: int = 200000, users: int = 20000, lookups: int = 20000):
+    """
+    Triage history at scale: batched inserts, then per-patient pages,
+    deep cursor pages and risk-filtered pages (all index seeks)
+    """
+    import random
+    from history_store import HistoryStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.db"))
+        summary = "Patient reports fever and cough for three days, no breathlessness."
+        start = time.perf_counter()
+        for i in range(records):
+            store.record(f"user-{i % users}", f"req-{i:08d}", ("LOW", "MODERATE", "HIGH")[i % 3],
+                         summary, "Rest, fluids, see a doctor if it worsens.", "Hindi")
+            if len(store.writes) >= 5000:
+                store.flush()
+        store.flush()
+        report("record + batched flush", records, time.perf_counter() - start)
+        print(f"  database size: {os.path.getsize(store.path) / 1024 / 1024:.1f} MiB")
+
+        ids = [f"user-{random.randrange(users)}" for _ in range(lookups)]
+        start = time.perf_counter()
+        for user_id in ids:
+            store.history(user_id, limit=20)
+        report("history page (per patient)", lookups, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for user_id in ids:
+            store.recent_summary(user_id)
+        report("recent_summary (LLM context)", lookups, time.perf_counter() - start)
+
+        _, cursor = store.history(risk="HIGH", limit=100)
+        for _ in range(100):
+            _, cursor = store.history(risk="HIGH", limit=100, cursor=cursor)
+        start = time.perf_counter()
+        for _ in range(lookups):
+            store.history(risk="HIGH", limit=20, cursor=cursor)
+        report("risk page (10k rows deep)", lookups, time.perf_counter() - start)
+
+
+# ==================== WRITE-BEHIND ====================
+def bench_analyze_latency(requests: int = 2000, concurrency: int = 8):
+    """
+    p99 /analyze latency (LLM stubbed out) while background traffic pushes
+    audit and history records at increasing rates. With write-behind the
+    handler only appends to memory, so p99 should stay flat; the "inline"
+    row writes the same volume synchronously on the event loop for contrast.
+    """
+    import asyncio
+    import httpx
+    from metrics import percentile
+
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("  skipped: GOOGLE_API_KEY is required to import the API (no calls are made)")
+        return
+    import main_multilanguage as api
+
+    async def stub_llm(text, image=None, history=None):
+        return {"risk": "LOW", "doctor_summary": "Mild cough for two days.", "advice": "Rest and fluids."}
+
+    api.call_llm_shared = stub_llm
+    form = {"symptom_text": "mild cough for two days", "user_id": "bench-user",
+            "consent_given": "true", "include_history": "false"}
+
+    async def background(rate: int, inline: bool, stop: asyncio.Event):
+        per_tick = rate // 100
+        i = 0
+        while not stop.is_set():
+            rows = []
+            for _ in range(per_tick):
+                i += 1
+                entry = {"ts": time.time(), "action": "bench", "request_id": f"bg-{i}",
+                         "user_hash": "0", "status": "ok"}
+                if inline:
+                    rows.append(entry)
+                else:
+                    api.audit_store.append(entry)
+                    api.record_history(f"bg-user-{i % 1000}", f"bg-{i}", "LOW", "background", "none", "English")
+            if inline and rows:
+                api.audit_store.write_batch(rows)
+            await asyncio.sleep(0.01)
+
+    async def scenario(label: str, rate: int, inline: bool = False):
+        transport = httpx.ASGITransport(app=api.app)
+        async with api.lifespan(api.app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            stop = asyncio.Event()
+            producer = asyncio.create_task(background(rate, inline, stop))
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+
+            async def one():
+                async with semaphore:
+                    t0 = time.perf_counter()
+                    response = await client.post("/analyze", data=form)
+                    latencies.append(time.perf_counter() - t0)
+                    assert response.status_code == 200
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(requests)))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await producer
+        latencies.sort()
+        print(f"  {label:<34} {rate:>7,} rec/s  p50 {percentile(latencies, 0.5) * 1000:6.2f} ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:6.2f} ms  ({requests / elapsed:,.0f} req/s)")
+
+    async def run():
+        for rate in (0, 1000, 10000):
+            await scenario("write-behind", rate)
+        await scenario("inline writes (contrast)", 10000, inline=True)
+
+    asyncio.run(run())
+    writes = api.metrics.collect()["write_behind"]
+    print(f"  audit dropped: {writes['audit']['dropped']}, history rejected: {writes['history']['rejected']}")
+
+
+# ==================== PROMPT ASSEMBLY ====================
+def bench_prompt(iterations: int = 100000):
+    """
+    Prompt size and assembly cost: the original f-string (triage-v1 with
+    indentation) vs the normalized, budgeted builder (triage-v2)
+    """
+    from prompts import TRIAGE_PROMPT
+    from prompt_builder import build_triage_prompt, estimate_tokens
+
+    symptoms = "Fever for three days with dry cough, body ache and mild headache. No breathlessness."
+
+    def legacy(symptom_text):
+        return f"""
+    {TRIAGE_PROMPT}
+
+    Patient Symptoms:
+    {symptom_text}
+    """
+
+    old = legacy(symptoms)
+    new, info = build_triage_prompt(symptoms)
+    print(f"  triage-v1 f-string: {len(old):5} chars  ~{estimate_tokens(old)} tokens")
+    inline, _ = build_triage_prompt(symptoms, inline_instructions=True)
+    print(f"  {info['version']} inline:    {len(inline):5} chars  ~{estimate_tokens(inline)} tokens")
+    print(f"  {info['version']} content:   {len(new):5} chars  ~{estimate_tokens(new)} tokens (instructions as system_instruction)")
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        legacy(symptoms)
+    report("f-string assembly", iterations, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        build_triage_prompt(symptoms)
+    report("build_triage_prompt", iterations, time.perf_counter() - start)
+
+    long_text = symptoms * 300
+    prompt, info = build_triage_prompt(long_text)
+    print(f"  {len(long_text)}-char input -> ~{info['estimated_tokens']} tokens (truncated: {info['truncated']})")
+    start = time.perf_counter()
+    for _ in range(1000):
+        build_triage_prompt(long_text)
+    report("build_triage_prompt (truncating)", 1000, time.perf_counter() - start)
+
+
+def bench_ttft(calls: int = 5):
+    """
+    Live Gemini calls (needs GOOGLE_API_KEY and network): prompt tokens and
+    time-to-first-token with the instructions inline in every request
+    (before), as system_instruction, and from explicit context cache
+    """
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("  skipped: needs GOOGLE_API_KEY (makes real API calls)")
+        return
+    import google.generativeai as genai
+    import llm
+    from prompt_builder import build_triage_prompt
+
+    symptoms = "Fever for three days with dry cough, body ache and mild headache. No breathlessness."
+    inline_model = genai.GenerativeModel(llm.GEMINI_MODEL, generation_config=llm.generation_config)
+    cached = llm.TriageModel(llm.GEMINI_MODEL, llm.triage_model.instructions)
+    cached._cache_enabled = True
+    cached_model = cached.get()
+
+    modes = [
+        ("inline instructions (before)", inline_model, True),
+        ("system_instruction", llm.triage_model.base, False),
+    ]
+    if cached_model is not cached.base:
+        modes.append(("context cache", cached_model, False))
+    else:
+        print("  context cache: not available for this model/prompt size (see log)")
+
+    try:
+        for label, model, inline in modes:
+            prompt, _ = build_triage_prompt(symptoms, inline_instructions=inline)
+            ttfts, prompt_tokens, cached_tokens = [], 0, 0
+            for _ in range(calls):
+                start = time.perf_counter()
+                response = model.generate_content([prompt], stream=True)
+                first = None
+                for _chunk in response:
+                    if first is None:
+                        first = time.perf_counter() - start
+                ttfts.append(first or 0.0)
+                usage = response.usage_metadata
+                prompt_tokens = usage.prompt_token_count
+                cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+            ttfts.sort()
+            print(f"  {label:<30} prompt {prompt_tokens:4} tokens (cached {cached_tokens:4})  "
+                  f"TTFT median {ttfts[len(ttfts) // 2] * 1000:7.1f} ms  min {ttfts[0] * 1000:7.1f} ms")
+    except Exception as e:
+        print(f"  ❌ API call failed: {e}")
+    finally:
+        cached.close()
+
+
+def bench_warmup(runs: int = 3):
+    """
+    Live Gemini calls (needs GOOGLE_API_KEY and network): latency of the
+    first call_llm in a fresh process, cold vs after llm.warm_up(). Each
+    run is a new interpreter, so every cold run pays channel setup, TLS
+    and the fixed-token count again.
+    """
+    import subprocess
+
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("  skipped: needs GOOGLE_API_KEY (makes real API calls)")
+        return
+
+    script = (
+        "import sys, time, logging\n"
+        "logging.disable(logging.CRITICAL)\n"
+        "import llm\n"
+        "if sys.argv[1] == 'warm':\n"
+        "    t = time.perf_counter(); llm.warm_up(); warm = time.perf_counter() - t\n"
+        "else:\n"
+        "    warm = 0.0\n"
+        "t = time.perf_counter()\n"
+        "result = llm.call_llm('Mild cough and runny nose for two days, no fever.')\n"
+        "print(warm, time.perf_counter() - t, 'error' in result)\n"
+    )
+    for mode in ("cold", "warm"):
+        firsts, warmups, failed = [], [], 0
+        for _ in range(runs):
+            proc = subprocess.run([sys.executable, "-c", script, mode], capture_output=True, text=True)
+            try:
+                warm, first, error = proc.stdout.split()[-3:]
+            except ValueError:
+                print(f"  ❌ {mode} run failed: {proc.stderr.strip().splitlines()[-1:]}")
+                return
+            warmups.append(float(warm))
+            firsts.append(float(first))
+            failed += error == "True"
+        firsts.sort()
+        print(f"  {mode:<5} first call_llm median {firsts[len(firsts) // 2] * 1000:7.0f} ms  "
+              f"min {firsts[0] * 1000:7.0f} ms"
+              + (f"  (warm-up itself {sum(warmups) / runs * 1000:5.0f} ms, off the request path)" if mode == "warm" else "")
+              + (f"  [{failed} error responses]" if failed else ""))
+
+
+# ==================== RESPONSE VALIDATION ====================
+def bench_parse(iterations: int = 100000):
+    """
+    Per-call cost of turning model output into a triage dict: the old
+    json.loads + field check vs the compiled TypeAdapter (parse + validate)
+    """
+    import json
+    from schemas import parse_triage_result
+
+    raw = json.dumps({
+        "risk": "MODERATE",
+        "doctor_summary": "Patient reports fever for three days with dry cough and body ache. No breathlessness.",
+        "advice": "Rest, drink fluids and take paracetamol for fever. See a doctor if fever persists beyond 3 days."
+    })
+
+    def legacy(text):
+        parsed = json.loads(text)
+        missing = [f for f in ("risk", "doctor_summary", "advice") if f not in parsed]
+        risk = parsed.get("risk", "MODERATE").upper()
+        if risk not in ("LOW", "MODERATE", "HIGH"):
+            risk = "MODERATE"
+        return parsed, missing, risk
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        legacy(raw)
+    report("json.loads + manual checks", iterations, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        parse_triage_result(raw)
+    report("TypeAdapter.validate_json", iterations, time.perf_counter() - start)
+
+
+# ==================== MODEL ROUTING ====================
+def bench_router(requests: int = 20000, image_share: float = 0.1):
+    """
+    Simulated tier routing (no API calls): cost, end-to-end latency and
+    escalation rate of a single strong model vs cheap-first routing, and
+    of routing while the cheap tier is failing for the middle third
+    """
+    import math
+    import random
+    from metrics import percentile
+    from model_router import Attempt, ModelRouter
+
+    # name: (median latency s, invalid output rate, MODERATE rate)
+    profiles = {
+        "gemini-2.0-flash-lite": (0.55, 0.03, 0.22),
+        "gemini-2.5-flash": (1.40, 0.01, 0.15),
+    }
+    cheap, strong = list(profiles)
+
+    def simulate(tiers, degraded=False, seed=7):
+        rng = random.Random(seed)
+        router = ModelRouter(tiers)
+        latencies, failures = [], 0
+        for i in range(requests):
+            has_image = rng.random() < image_share
+            outage = degraded and requests // 3 <= i < 2 * requests // 3
+
+            def attempt(name):
+                median, invalid, moderate = profiles[name]
+                if outage and name == cheap:
+                    invalid = 0.7
+                seconds = rng.lognormvariate(math.log(median), 0.35)
+                if rng.random() < invalid:
+                    result = {"error": "AI response failed schema validation"}
+                else:
+                    result = {"risk": "MODERATE" if rng.random() < moderate else "LOW"}
+                return Attempt(result, seconds, 350 + (258 if has_image else 0), 180)
+
+            result, info = router.run(attempt, has_image)
+            latencies.append(info["seconds"])
+            failures += "error" in result
+        latencies.sort()
+        snapshot = router.snapshot()
+        print(f"  {' → '.join(tiers)}{' (cheap tier failing)' if degraded else ''}")
+        print(f"      cost ${snapshot['cost_usd'] / requests * 1000:.4f}/1k requests  "
+              f"latency mean {sum(latencies) / requests * 1000:6.0f} ms  "
+              f"p95 {percentile(latencies, 0.95) * 1000:6.0f} ms  "
+              f"escalated {snapshot['escalation_rate'] * 100:5.1f}%  failed {failures / requests * 100:4.2f}%")
+
+    simulate([strong])
+    simulate([cheap, strong])
+    simulate([cheap, strong], degraded=True)
+
+
+# ==================== SINGLE-FLIGHT ====================
+def bench_single_flight(requests: int = 2000, distinct: int = 50, upstream_ms: float = 800):
+    """
+    Burst of concurrent requests where many carry the same text (outbreak
+    traffic) against a simulated upstream: calls issued with and without
+    coalescing, and overhead of the in-flight table on unique keys
+    """
+    import asyncio
+    import random
+    from single_flight import SingleFlight, flight_key
+
+    rng = random.Random(3)
+    # Zipf-like: a few messages dominate
+    weights = [1 / (k + 1) for k in range(distinct)]
+    texts = [f"fever and body ache since {k} days" for k in rng.choices(range(distinct), weights, k=requests)]
+
+    async def run(coalesce: bool):
+        flight = SingleFlight("bench")
+        upstream = 0
+
+        async def call(text):
+            nonlocal upstream
+            upstream += 1
+            await asyncio.sleep(upstream_ms / 1000)
+            return {"risk": "MODERATE", "text": text}
+
+        async def one(text):
+            await asyncio.sleep(rng.random() * upstream_ms / 1000)
+            if coalesce:
+                return await flight.do(flight_key(text), lambda: call(text))
+            return await call(text)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(text) for text in texts))
+        seconds = time.perf_counter() - start
+        label = "coalesced" if coalesce else "independent"
+        print(f"  {label:<12} upstream calls {upstream:>6} / {requests}  wall {seconds:6.2f}s"
+              + (f"  coalesce rate {flight.snapshot()['coalesce_rate'] * 100:5.1f}%" if coalesce else ""))
+
+    async def overhead(n: int = 100000):
+        flight = SingleFlight("bench")
+
+        async def call():
+            return 1
+
+        start = time.perf_counter()
+        for i in range(n):
+            await flight.do(str(i), call)
+        report("do() unique keys", n, time.perf_counter() - start)
+
+    asyncio.run(run(False))
+    asyncio.run(run(True))
+    asyncio.run(overhead())
+
+
+# ==================== CACHE ====================
+def bench_cache(lookups: int = 60000, keys: int = 20000, near_entries: int = 10000):
+    """
+    Hit ratio as uvicorn workers are added: each simulated worker has its
+    own near LRU, with and without a shared far tier (mmap table), over a
+    Zipf-like key stream. Then per-operation cost of each backend,
+    including the Redis client against the local stand-in.
+    """
+    import random
+    import asyncio
+    import threading
+    from cache_backend import Cache, LocalLRU, RedisCache, SharedMemoryTable, serve_standin
+
+    rng = random.Random(11)
+    stream = [int(keys * rng.paretovariate(1.2)) % keys for _ in range(lookups)]
+    value = {"risk": "MODERATE", "doctor_summary": "Fever and cough for three days.", "advice": "Rest and fluids."}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in (1, 2, 4, 8):
+            for label, shared in (("per-worker only", False), ("near + shared mmap", True)):
+                far = SharedMemoryTable(os.path.join(tmp, f"bench-{workers}-{shared}.mmap"), slots=32768, slot_bytes=512) if shared else None
+                caches = [Cache(LocalLRU(near_entries), far) for _ in range(workers)]
+                hits = 0
+                for i, key in enumerate(stream):
+                    worker = caches[i % workers]
+                    if worker.get("triage", str(key)) is not None:
+                        hits += 1
+                    else:
+                        worker.set("triage", str(key), value)
+                print(f"  {workers} worker(s)  {label:<20} hit ratio {hits / lookups * 100:5.1f}%")
+                if far is not None:
+                    far.close()
+
+        port = 6390
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_until_complete, args=(serve_standin("127.0.0.1", port),), daemon=True).start()
+        time.sleep(0.2)
+        data = b"x" * 300
+        backends = [
+            ("LocalLRU", LocalLRU()),
+            ("SharedMemoryTable", SharedMemoryTable(os.path.join(tmp, "ops.mmap"), slots=16384, slot_bytes=512)),
+            ("RedisCache (stand-in)", RedisCache(f"redis://127.0.0.1:{port}/0", timeout=1.0)),
+        ]
+        for label, backend in backends:
+            n = 5000 if isinstance(backend, RedisCache) else 100000
+            start = time.perf_counter()
+            for i in range(n):
+                backend.set(b"k%d" % (i % 5000), data, 60)
+            report(f"{label} set", n, time.perf_counter() - start)
+            start = time.perf_counter()
+            for i in range(n):
+                backend.get(b"k%d" % (i % 5000))
+            report(f"{label} get", n, time.perf_counter() - start)
+            backend.close()
+
+
+# ==================== SERIALIZATION ====================
+def bench_serialization(iterations: int = 1000):
+    """
+    Response serialization per endpoint: FastAPI's default path
+    (jsonable_encoder walk + json.dumps) against the current one
+    (declared response model + orjson render, or orjson directly)
+    """
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from schemas import ConsentResponse, HistoryPage
+    from serialization import FastJSONResponse
+
+    summary = ("╔══════════════════════════════╗\n║ रोगी: 45 वर्ष, पुरुष          ║\n╚══════════════════════════════╝\n"
+               "Chest tightness for 2 days, breathlessness on exertion. " * 4)
+    analyze = {
+        "success": True, "request_id": "20250101_101500_123456", "risk": "MODERATE",
+        "doctor_summary": summary, "advice": "कृपया 24 घंटे के भीतर डॉक्टर से मिलें। " * 6,
+        "original_text": "मुझे दो दिन से सीने में जकड़न है", "english_text": "I have chest tightness for two days",
+        "language": "hi-IN", "whatsapp_ready": True, "processing_time_ms": 812.4,
+        "disclaimer": "AI-assisted triage. Not a substitute for professional medical advice."
+    }
+    record = {"user_id": "u-1", "request_id": "20250101_101500_123456", "timestamp": "2025-01-01T10:15:00",
+              "risk": "LOW", "language": "ta-IN", "summary": summary, "advice": "ஓய்வு எடுத்து நீர் அருந்தவும்."}
+    history = {"success": True, "records": [dict(record, request_id=f"req-{i}") for i in range(100)],
+               "count": 100, "next_cursor": "MTczNTcyNjUwMC4wfHJlcS05OQ"}
+    metrics = {f"/endpoint-{i}": {"count": 1000 + i, "p50_ms": 12.5, "p95_ms": 80.1, "p99_ms": 240.0,
+                                   "by_status": {200: 990, 503: 10}} for i in range(20)}
+    consent = {"success": True, "message": "Consent recorded", "consent_id": "20250101_101500_123456"}
+
+    def via(model):
+        adapter = TypeAdapter(model)
+        return lambda payload: adapter.dump_python(adapter.validate_python(payload))
+
+    cases = [
+        ("/analyze", analyze, jsonable_encoder),
+        ("/history (100 records)", history, via(HistoryPage)),
+        ("/consent", consent, via(ConsentResponse)),
+        ("/metrics", metrics, lambda payload: payload),
+    ]
+    default = JSONResponse(None)
+    fast = FastJSONResponse(None)
+    for label, payload, prepare in cases:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            default_body = default.render(jsonable_encoder(payload))
+        before = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fast_body = fast.render(prepare(payload))
+        after = time.perf_counter() - start
+        report(f"{label} default", iterations, before)
+        report(f"{label} fast path", iterations, after)
+        print(f"  → {before / after:4.1f}x faster, body {len(default_body):,} → {len(fast_body):,} bytes")
+
+    # Fixed /analyze answers: dict built and encoded per call vs bytes encoded once
+    from serialization import StaticBody
+    incomplete = {"risk": "LOW", "doctor_summary": "Insufficient symptom detail provided.",
+                  "advice": "Please add more details for better guidance.", "status": "incomplete_input"}
+    static = StaticBody(incomplete)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        FastJSONResponse(dict(incomplete))
+    report("incomplete_input per-call dict", iterations, time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        static.response()
+    report("incomplete_input StaticBody", iterations, time.perf_counter() - start)
+
+
+# ==================== WIRE SIZE ====================
+def bench_wire_size():
+    """
+    Bytes on the wire for one /analyze answer per language: full vs
+    ?compact=1, each uncompressed, gzip and brotli (the real app through
+    ASGI, with Gemini and Sarvam stubbed by the offline phrase tables)
+    """
+    import json
+    import asyncio
+    import httpx
+
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("  skipped: GOOGLE_API_KEY is required to import the API (no calls are made)")
+        return
+    import main_multilanguage as api
+    import sarvam_translator
+    from offline_triage import PHRASES, OFFLINE_TRANSLATIONS_PATH
+
+    with open(OFFLINE_TRANSLATIONS_PATH, encoding="utf-8") as f:
+        translations = json.load(f)
+    english_keys = {text: key for key, text in PHRASES.items()}
+    summary = " ".join(PHRASES[key] for key in ("summary_moderate", "summary_high", "summary_unknown"))
+
+    async def stub_llm(text, image=None, history=None):
+        return {"risk": "MODERATE", "doctor_summary": summary, "advice": PHRASES["advice_fever"]}
+
+    def sentences(text):
+        parts, current = [], []
+        for word in text.split(" "):
+            current.append(word)
+            if word.endswith("."):
+                parts.append(" ".join(current))
+                current = []
+        return parts + ([" ".join(current)] if current else [])
+
+    async def stub_translate(text, language):
+        table = translations.get(language, {})
+        return {"success": True, "translated_text": " ".join(
+            table.get(english_keys.get(sentence, ""), sentence) for sentence in sentences(text)
+        )}
+
+    async def stub_to_english(text, language):
+        return {"success": True, "translated_text": "fever and body ache for three days"}
+
+    api.call_llm_shared = stub_llm
+    api.translate_to_english = stub_to_english
+    sarvam_translator.translate_from_english = stub_translate
+    api.CONSENT_REQUIRED = False
+
+    async def run():
+        transport = httpx.ASGITransport(app=api.app)
+        async with api.lifespan(api.app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"  {'language':<10} {'full':>7} {'gzip':>7} {'br':>7} │ {'compact':>7} {'gzip':>7} {'br':>7}  saved")
+            for language in ["English"] + list(translations):
+                sizes = []
+                for query in ("", "?compact=1"):
+                    for encoding in ("identity", "gzip", "br"):
+                        response = await client.post(
+                            "/analyze" + query, headers={"Accept-Encoding": encoding},
+                            data={"symptom_text": "fever and body ache for three days", "user_language": language}
+                        )
+                        assert response.status_code == 200
+                        sizes.append(int(response.headers["content-length"]))
+                full, compact_br = sizes[0], sizes[5]
+                print(f"  {language:<10} {sizes[0]:>7,} {sizes[1]:>7,} {sizes[2]:>7,} │ "
+                      f"{sizes[3]:>7,} {sizes[4]:>7,} {sizes[5]:>7,}  {(1 - compact_br / full) * 100:4.0f}%")
+
+    asyncio.run(run())
+
+
+# ==================== IMAGE UPLOAD ====================
+def bench_image_upload():
+    """
+    Image upload over throttled mobile links: the raw camera photo (old
+    path: PIL image handed to Gemini, re-encoded as lossless WebP), the raw
+    photo downscaled on the server, and the photo downscaled on the device
+    (PIL standing in for the browser canvas) then forwarded as-is.
+    Encode/decode times are measured; link time is modelled as
+    RTT + bytes / uplink bandwidth.
+    """
+    import io
+    import numpy as np
+    from PIL import Image
+    from image_policy import IMAGE_JPEG_QUALITY, IMAGE_MAX_DIMENSION, prepare_image
+
+    links = (("2G EDGE", 100_000, 0.8), ("3G", 750_000, 0.3), ("weak 4G", 2_000_000, 0.15))
+
+    # A 12 MP photo: smooth shading plus sensor noise, as a phone saves it
+    rng = np.random.default_rng(5)
+    y, x = np.mgrid[0:3000, 0:4000]
+    base = np.stack([(x / 16) % 256, (y / 12) % 256, ((x + y) / 28) % 256], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "JPEG", quality=92)
+    photo = out.getvalue()
+
+    def old_server(data):
+        image = Image.open(io.BytesIO(data))
+        out = io.BytesIO()
+        image.save(out, "webp", lossless=True)
+        return out.getvalue()
+
+    def client_canvas(data):
+        image = Image.open(io.BytesIO(data))
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=IMAGE_JPEG_QUALITY)
+        return out.getvalue()
+
+    def timed(fn, data):
+        start = time.perf_counter()
+        result = fn(data)
+        return result, time.perf_counter() - start
+
+    strategies = []
+    to_gemini, server_s = timed(old_server, photo)
+    strategies.append(("raw upload, lossless WebP", photo, 0.0, to_gemini, server_s))
+    (blob, _), server_s = timed(prepare_image, photo)
+    strategies.append(("raw upload, server downscale", photo, 0.0, blob["data"], server_s))
+    upload, client_s = timed(client_canvas, photo)
+    (blob, info), server_s = timed(prepare_image, upload)
+    assert info["path"] == "as_is"
+    strategies.append(("client downscale, fast path", upload, client_s, blob["data"], server_s))
+
+    print(f"  photo: 4000x3000 JPEG, {len(photo) / 1024:,.0f} KB")
+    print(f"  {'strategy':<30} {'upload':>9} {'gemini':>9} {'client':>7} {'server':>7}  "
+          + "  ".join(f"{name:>8}" for name, _, _ in links))
+    for label, sent, client_s, gemini, server_s in strategies:
+        e2e = [client_s + rtt + len(sent) * 8 / bandwidth + server_s for _, bandwidth, rtt in links]
+        print(f"  {label:<30} {len(sent) / 1024:>7,.0f}KB {len(gemini) / 1024:>7,.0f}KB "
+              f"{client_s * 1000:>5.0f}ms {server_s * 1000:>5.0f}ms  "
+              + "  ".join(f"{seconds:>7.1f}s" for seconds in e2e))
+
+
+BENCHMARKS = {
+    "outbox": bench_outbox,
+    "anonymizer": bench_anonymizer,
+    "audit": bench_audit,
+    "consent": bench_consent,
+    "history": bench_history,
+    "analyze_latency": bench_analyze_latency,
+    "prompt": bench_prompt,
+    "ttft": bench_ttft,
+    "warmup": bench_warmup,
+    "parse": bench_parse,
+    "router": bench_router,
+    "single_flight": bench_single_flight,
+    "cache": bench_cache,
+    "serialization": bench_serialization,
+    "wire_size": bench_wire_size,
+    "image_upload": bench_image_upload,
+}
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        if name not in BENCHMARKS:
+            print(f"❌ Unknown benchmark: {name} (available: {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+        print("=" * 70)
+        print(f"BENCHMARK: {name}")
+        print("=" * 70)
+        BENCHMARKS[name]()
@@ -0,0 +1,638 @@
+"""
+Cache Backends
+Pluggable key/value caches shared by the translation, triage and consent paths
+
+Three backends behind one small interface (get/set/delete on bytes):
+    LocalLRU           - in-process, per worker
+    SharedMemoryTable  - mmap-backed hash table shared by workers on one host
+    RedisCache         - minimal Redis (RESP) client, for workers across hosts
+
+`Cache` puts a short-lived LocalLRU (near) in front of the shared backend
+(far), serializes values and applies per-namespace TTLs. Every cache call
+is best effort: a broken backend counts an error and behaves as a miss.
+
+Configuration (env):
+    CACHE_BACKEND=local|shared|redis   CACHE_REDIS_URL=redis://host:6379/0
+    CACHE_SERIALIZER=orjson|msgpack    CACHE_TTL_<NAMESPACE>=seconds (0 disables)
+
+For development without Redis: python nidaan.py cache-server
+"""
+
+import os
+import json
+import mmap
+import time
+import socket
+import struct
+import zlib
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from circuit_breaker import CircuitBreaker
+from serialization import dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process file locks, shared tier unavailable
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Cache Configuration
+DATA_DIR = os.getenv("NIDAAN_DATA_DIR", "data")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "orjson")
+CACHE_LOCAL_ENTRIES = int(os.getenv("CACHE_LOCAL_ENTRIES", "10000"))
+# Near entries in front of a shared backend live at most this long, so
+# writes/deletes made by other workers are seen soon
+CACHE_NEAR_TTL = float(os.getenv("CACHE_NEAR_TTL", "30"))
+CACHE_SHARED_PATH = os.getenv("CACHE_SHARED_PATH", os.path.join(DATA_DIR, "cache.mmap"))
+CACHE_SHARED_SLOTS = int(os.getenv("CACHE_SHARED_SLOTS", "8192"))
+CACHE_SHARED_SLOT_BYTES = int(os.getenv("CACHE_SHARED_SLOT_BYTES", "4096"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+# A cache answer slower than this is not worth waiting for
+CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", "0.1"))
+CACHE_KEY_PREFIX = "nidaan:"
+
+# Default TTL per namespace (seconds)
+NAMESPACE_TTLS = {
+    "translation": 7 * 86400,   # Sarvam output for the same text does not change
+    "triage": 600,              # identical complaints in a burst (outbreaks)
+    "consent": 3600,            # written through on every /consent call
+}
+
+
+def namespace_ttl(namespace: str) -> float:
+    return float(os.getenv(f"CACHE_TTL_{namespace.upper()}", NAMESPACE_TTLS.get(namespace, 300)))
+
+
+# ==================== SERIALIZATION ====================
+class Serializer:
+    """Values to bytes and back: orjson or msgpack when installed, json otherwise"""
+
+    def __init__(self, name: str = CACHE_SERIALIZER):
+        if name == "msgpack" and msgpack is not None:
+            self.name = "msgpack"
+            self.dumps = lambda value: msgpack.packb(value, use_bin_type=True)
+            self.loads = lambda data: msgpack.unpackb(data, raw=False)
+        elif name in ("orjson", "msgpack") and orjson is not None:
+            self.name = "orjson"
+            self.dumps = dumps
+            self.loads = loads
+        else:
+            self.name = "json"
+            self.dumps = lambda value: json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self.loads = json.loads
+        if self.name != name:
+            logger.warning(f"⚠️ Cache serializer {name} not installed, using {self.name}")
+
+
+# ==================== BACKENDS ====================
+class CacheBackend:
+    """Byte-level cache: keys and values are bytes, ttl in seconds"""
+
+    name = "backend"
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: bytes, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: bytes):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def snapshot(self) -> Dict:
+        return {"backend": self.name}
+
+
+class LocalLRU(CacheBackend):
+    """In-process LRU with per-entry expiry (thread-safe)"""
+
+    name = "local"
+
+    def __init__(self, capacity: int = CACHE_LOCAL_ENTRIES):
+        self.capacity = capacity
+        self._entries: "OrderedDict[bytes, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: bytes, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: bytes):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def snapshot(self) -> Dict:
+        return {"backend": self.name, "entries": len(self._entries), "evictions": self.evictions}
+
+
+# Slot header: seq, crc32(key + value), key hash, expires_at, key length, value length
+SLOT_HEADER = struct.Struct("<IIQdHI")
+SLOT_HEADER_BYTES = 32
+FILE_HEADER = struct.Struct("<8sII")
+FILE_HEADER_BYTES = 64
+TABLE_MAGIC = b"NDCACHE1"
+# Open addressing: a key lives in one of this many consecutive slots
+MAX_PROBES = 8
+
+
+class SharedMemoryTable(CacheBackend):
+    """
+    Fixed-size hash table in a memory-mapped file, shared by every worker
+    process on the host
+
+    Each slot holds one entry (header + key + value) of at most
+    slot_bytes; larger values are not cached. Writers serialize on an
+    flock of the file. Readers take no lock: a slot's sequence number is
+    odd while it is being written and changes with every write, and the
+    stored crc32 must match, so a reader never returns a torn entry -
+    it sees a miss instead.
+    """
+
+    name = "shared"
+
+    def __init__(self, path: str = CACHE_SHARED_PATH, slots: int = CACHE_SHARED_SLOTS,
+                 slot_bytes: int = CACHE_SHARED_SLOT_BYTES):
+        if fcntl is None:
+            raise RuntimeError("Shared cache needs fcntl (not available on this platform)")
+        self.path = path
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.payload_bytes = slot_bytes - SLOT_HEADER_BYTES
+        size = FILE_HEADER_BYTES + slots * slot_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = threading.Lock()
+        with self._write_lock():
+            header = os.pread(self._fd, FILE_HEADER.size, 0)
+            if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header) != (TABLE_MAGIC, slots, slot_bytes):
+                # New file or different geometry: start empty
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, FILE_HEADER.pack(TABLE_MAGIC, slots, slot_bytes), 0)
+        self._map = mmap.mmap(self._fd, size)
+        self.stats = {"torn_reads": 0, "oversize": 0, "evictions": 0}
+        logger.info(f"✓ Shared cache mapped: {path} ({slots} x {slot_bytes} bytes)")
+
+    @contextmanager
+    def _write_lock(self):
+        """Excludes writers in this process (thread lock) and in other workers (flock)"""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _hash(key: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+    def _offset(self, index: int) -> int:
+        return FILE_HEADER_BYTES + (index % self.slots) * self.slot_bytes
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        key_hash = self._hash(key)
+        start = key_hash % self.slots
+        for probe in range(MAX_PROBES):
+            offset = self._offset(start + probe)
+            seq, crc, slot_hash, expires_at, key_len, value_len = SLOT_HEADER.unpack_from(self._map, offset)
+            if slot_hash == 0:
+                return None
+            if slot_hash != key_hash or key_len != len(key):
+                continue
+            body = offset + SLOT_HEADER_BYTES
+            data = self._map[body:body + key_len + value_len]
+            if seq & 1 or SLOT_HEADER.unpack_from(self._map, offset)[0] != seq or zlib.crc32(data) != crc:
+                self.stats["torn_reads"] += 1
+                return None
+            if data[:key_len] != key:
+                continue
+            if expires_at <= time.time():
+                return None
+            return data[key_len:]
+        return None
+
+    def set(self, key: bytes, value: bytes, ttl: float):
+        if len(key) + len(value) > self.payload_bytes:
+            self.stats["oversize"] += 1
+            return
+        self._store(key, value, time.time() + ttl)
+
+    def delete(self, key: bytes):
+        # Expire in place: the hash stays so probing past the slot still works
+        self._store(key, b"", 0.0, only_existing=True)
+
+    def _store(self, key: bytes, value: bytes, expires_at: float, only_existing: bool = False):
+        key_hash = self._hash(key)
+        start = key_hash % self.slots
+        now = time.time()
+        with self._write_lock():
+            # Same key if present, else the first free/expired slot, else evict the oldest
+            existing = free = oldest = None
+            oldest_expiry = float("inf")
+            for probe in range(MAX_PROBES):
+                offset = self._offset(start + probe)
+                _, _, slot_hash, slot_expires, key_len, _ = SLOT_HEADER.unpack_from(self._map, offset)
+                if slot_hash == key_hash and key_len == len(key):
+                    body = offset + SLOT_HEADER_BYTES
+                    if self._map[body:body + key_len] == key:
+                        existing = offset
+                        break
+                if free is None and (slot_hash == 0 or slot_expires <= now):
+                    free = offset
+                if slot_hash == 0:
+                    break
+                if slot_expires < oldest_expiry:
+                    oldest, oldest_expiry = offset, slot_expires
+            if only_existing and existing is None:
+                return
+            target = existing or free
+            if target is None:
+                target = oldest
+                self.stats["evictions"] += 1
+
+            seq = SLOT_HEADER.unpack_from(self._map, target)[0]
+            data = key + value
+            struct.pack_into("<I", self._map, target, (seq + 1) | 1)
+            self._map[target + SLOT_HEADER_BYTES:target + SLOT_HEADER_BYTES + len(data)] = data
+            SLOT_HEADER.pack_into(
+                self._map, target, ((seq + 1) | 1) + 1, zlib.crc32(data), key_hash, expires_at, len(key), len(value)
+            )
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def snapshot(self) -> Dict:
+        return {"backend": self.name, "slots": self.slots, "slot_bytes": self.slot_bytes, **self.stats}
+
+
+class RedisError(Exception):
+    """Error reply from the server"""
+
+
+class RedisCache(CacheBackend):
+    """
+    Minimal Redis client (RESP2 over a small socket pool): GET, SET PX, DEL
+
+    Calls are synchronous with a short timeout; a circuit breaker stops
+    calling a server that keeps failing so requests never wait on it.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_REDIS_URL, timeout: float = CACHE_REDIS_TIMEOUT, pool_size: int = 8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool: List[Tuple[socket.socket, Any]] = []
+        self._lock = threading.Lock()
+        self.circuit = CircuitBreaker("redis_cache")
+        logger.info(f"✓ Redis cache: {self.host}:{self.port}/{self.db}")
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    @staticmethod
+    def read_reply(rfile) -> Any:
+        line = rfile.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = rfile.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by server")
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [RedisCache.read_reply(rfile) for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply: {line[:20]!r}")
+
+    def _connect(self) -> Tuple[socket.socket, Any]:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile("rb"))
+        if self.password:
+            self._roundtrip(conn, "AUTH", self.password)
+        if self.db:
+            self._roundtrip(conn, "SELECT", self.db)
+        return conn
+
+    def _roundtrip(self, conn, *args) -> Any:
+        conn[0].sendall(self.encode(*args))
+        return self.read_reply(conn[1])
+
+    def command(self, *args) -> Any:
+        if not self.circuit.allow():
+            raise ConnectionError("Redis circuit open")
+        with self._lock:
+            conn = self._pool.pop() if self._pool else None
+        try:
+            if conn is None:
+                conn = self._connect()
+            reply = self._roundtrip(conn, *args)
+        except RedisError:
+            self._release(conn)
+            self.circuit.record_success()
+            raise
+        except (OSError, ConnectionError, ValueError):
+            if conn is not None:
+                conn[0].close()
+            self.circuit.record_failure()
+            raise
+        self._release(conn)
+        self.circuit.record_success()
+        return reply
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(conn)
+                return
+        conn[0].close()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        return self.command("GET", key)
+
+    def set(self, key: bytes, value: bytes, ttl: float):
+        self.command("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    def delete(self, key: bytes):
+        self.command("DEL", key)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for sock, _ in pool:
+            sock.close()
+
+    def snapshot(self) -> Dict:
+        return {"backend": self.name, "server": f"{self.host}:{self.port}", "circuit": self.circuit.snapshot()}
+
+
+# ==================== TIERED CACHE ====================
+class Cache:
+    """
+    Namespaced object cache: near (in-process LRU) in front of far (shared)
+
+    Lookups try near, then far; a far hit is copied into near for at most
+    CACHE_NEAR_TTL. Writes go to both. With `local=False` only the far
+    tier is used (callers that keep their own per-process cache).
+
+    Far-tier calls block (socket I/O, flock), so coroutines use aget() and
+    aset(), which answer near hits inline and run far-tier access in a
+    worker thread.
+    """
+
+    def __init__(self, near: Optional[LocalLRU], far: Optional[CacheBackend] = None,
+                 serializer: Optional[Serializer] = None):
+        self.near = near
+        self.far = far
+        self.serializer = serializer or Serializer()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, event: str):
+        counters = self.stats.setdefault(
+            namespace, {"near_hits": 0, "far_hits": 0, "misses": 0, "sets": 0, "errors": 0}
+        )
+        counters[event] += 1
+
+    def get(self, namespace: str, key: str, local: bool = True) -> Any:
+        """Cached value or None"""
+        if namespace_ttl(namespace) <= 0:
+            return None
+        full_key = (CACHE_KEY_PREFIX + namespace + ":" + key).encode("utf-8")
+        try:
+            if local and self.near is not None:
+                data = self.near.get(full_key)
+                if data is not None:
+                    self._count(namespace, "near_hits")
+                    return self.serializer.loads(data)
+            if self.far is not None:
+                data = self.far.get(full_key)
+                if data is not None:
+                    self._count(namespace, "far_hits")
+                    if local and self.near is not None:
+                        self.near.set(full_key, data, min(CACHE_NEAR_TTL, namespace_ttl(namespace)))
+                    return self.serializer.loads(data)
+        except Exception as e:
+            self._count(namespace, "errors")
+            logger.debug(f"Cache get failed ({namespace}): {e}")
+            return None
+        self._count(namespace, "misses")
+        return None
+
+    async def aget(self, namespace: str, key: str, local: bool = True) -> Any:
+        """get() for the event loop"""
+        if self.far is None or namespace_ttl(namespace) <= 0:
+            return self.get(namespace, key, local)
+        if local and self.near is not None:
+            full_key = (CACHE_KEY_PREFIX + namespace + ":" + key).encode("utf-8")
+            try:
+                data = self.near.get(full_key)
+                if data is not None:
+                    self._count(namespace, "near_hits")
+                    return self.serializer.loads(data)
+            except Exception as e:
+                self._count(namespace, "errors")
+                logger.debug(f"Cache get failed ({namespace}): {e}")
+                return None
+        return await asyncio.to_thread(self.get, namespace, key, local)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None, local: bool = True):
+        """set() for the event loop"""
+        if self.far is None:
+            self.set(namespace, key, value, ttl, local)
+            return
+        await asyncio.to_thread(self.set, namespace, key, value, ttl, local)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None, local: bool = True):
+        ttl = namespace_ttl(namespace) if ttl is None else ttl
+        if ttl <= 0:
+            return
+        full_key = (CACHE_KEY_PREFIX + namespace + ":" + key).encode("utf-8")
+        try:
+            data = self.serializer.dumps(value)
+            if local and self.near is not None:
+                self.near.set(full_key, data, min(ttl, CACHE_NEAR_TTL) if self.far is not None else ttl)
+            if self.far is not None:
+                self.far.set(full_key, data, ttl)
+            self._count(namespace, "sets")
+        except Exception as e:
+            self._count(namespace, "errors")
+            logger.debug(f"Cache set failed ({namespace}): {e}")
+
+    def delete(self, namespace: str, key: str):
+        full_key = (CACHE_KEY_PREFIX + namespace + ":" + key).encode("utf-8")
+        try:
+            if self.near is not None:
+                self.near.delete(full_key)
+            if self.far is not None:
+                self.far.delete(full_key)
+        except Exception as e:
+            self._count(namespace, "errors")
+            logger.debug(f"Cache delete failed ({namespace}): {e}")
+
+    def close(self):
+        if self.far is not None:
+            self.far.close()
+
+    def snapshot(self) -> Dict:
+        namespaces = {}
+        for namespace, counters in self.stats.items():
+            lookups = counters["near_hits"] + counters["far_hits"] + counters["misses"]
+            hits = counters["near_hits"] + counters["far_hits"]
+            namespaces[namespace] = {**counters, "hit_ratio": round(hits / lookups, 4) if lookups else 0.0}
+        return {
+            "serializer": self.serializer.name,
+            "near": self.near.snapshot() if self.near is not None else None,
+            "far": self.far.snapshot() if self.far is not None else None,
+            "namespaces": namespaces
+        }
+
+
+def build_cache(backend: str = CACHE_BACKEND) -> Cache:
+    """Cache for CACHE_BACKEND; falls back to local-only if the shared tier cannot start"""
+    near = LocalLRU()
+    try:
+        if backend == "shared":
+            return Cache(near, SharedMemoryTable())
+        if backend == "redis":
+            return Cache(near, RedisCache())
+    except Exception as e:
+        logger.warning(f"⚠️ Cache backend {backend} unavailable ({e}); using in-process cache only")
+    return Cache(near)
+
+
+# Process-wide cache (one per uvicorn worker, sharing the far tier)
+cache = build_cache()
+
+
+# ==================== LOCAL STAND-IN ====================
+async def serve_standin(host: str = "127.0.0.1", port: int = 6379):
+    """
+    Tiny in-memory Redis stand-in (PING, GET, SET [EX|PX], DEL, EXISTS,
+    DBSIZE, FLUSHALL) for development and testing without a Redis server
+    """
+    store: Dict[bytes, Tuple[bytes, float]] = {}
+
+    def lookup(key: bytes) -> Optional[bytes]:
+        entry = store.get(key)
+        if entry is None:
+            return None
+        if entry[1] and entry[1] <= time.time():
+            del store[key]
+            return None
+        return entry[0]
+
+    def execute(args: List[bytes]) -> bytes:
+        name = args[0].upper()
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"SELECT", b"AUTH"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            value = lookup(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            expires_at = 0.0
+            if len(args) >= 5 and args[3].upper() == b"PX":
+                expires_at = time.time() + int(args[4]) / 1000
+            elif len(args) >= 5 and args[3].upper() == b"EX":
+                expires_at = time.time() + int(args[4])
+            store[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            return b":%d\r\n" % sum(store.pop(key, None) is not None for key in args[1:])
+        if name == b"EXISTS":
+            return b":%d\r\n" % sum(lookup(key) is not None for key in args[1:])
+        if name == b"DBSIZE":
+            return b":%d\r\n" % len(store)
+        if name == b"FLUSHALL":
+            store.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    writer.write(b"-ERR protocol error\r\n")
+                    break
+                args = []
+                for _ in range(int(line[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.warning(f"Redis stand-in listening on {host}:{port} (in-memory, not persistent)")
+    async with server:
+        await server.serve_forever()
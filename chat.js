@@ -5,10 +5,27 @@ const sendBtn = document.getElementById("sendBtn");
 const imageInput = document.getElementById("imageInput");
 const micBtn = document.getElementById("micBtn");
 
+/* ================= API ================= */
+// Same origin when served by the backend (/app/); the local server when opened from disk
+const API_BASE = window.location.protocol === "file:" ? "http://localhost:8000" : "";
+
 /* ================= STATE ================= */
 let selectedLanguage = null;
 let pendingImage = null; // Store image until text is sent
 
+// Anonymous id for this browser: the backend keys consent and visit history on it
+function getUserId() {
+  let id = localStorage.getItem("nidaan_user_id");
+  if (!id) {
+    id = window.crypto?.randomUUID ? crypto.randomUUID() : `web-${Date.now()}-${Math.random().toString(16).slice(2)}`;
+    localStorage.setItem("nidaan_user_id", id);
+  }
+  return id;
+}
+const userId = getUserId();
+// Set once /consent has recorded the user's agreement (ABDM: no triage without it)
+let consentGiven = localStorage.getItem("nidaan_consent") === "granted";
+
 textInput.disabled = true; 
 sendBtn.disabled = true;
 
@@ -146,10 +163,18 @@ function getBotText(type) {
   const data = {
     English: {
       languageSelected: "Great 👍 You can now describe your symptoms or upload an image.",
+      consentPrompt: "Before we start: your symptoms are anonymized, analysed by AI and deleted after 90 days. Do you agree to this data collection?",
+      consentAccept: "I agree",
+      consentDecline: "No",
+      consentDeclined: "Without your consent I cannot analyse symptoms. You can agree at any time below.",
       error: "⚠️ Connection error. Is the backend running?",
     },
     हिंदी: {
       languageSelected: "बहुत बढ़िया 👍 अब आप अपने लक्षण बताइए या कोई तस्वीर अपलोड करें।",
+      consentPrompt: "शुरू करने से पहले: आपके लक्षण गुमनाम किए जाते हैं, AI द्वारा जांचे जाते हैं और 90 दिनों बाद हटा दिए जाते हैं। क्या आप इस डेटा संग्रह के लिए सहमत हैं?",
+      consentAccept: "मैं सहमत हूँ",
+      consentDecline: "नहीं",
+      consentDeclined: "आपकी सहमति के बिना मैं लक्षणों की जांच नहीं कर सकता। आप नीचे कभी भी सहमति दे सकते हैं।",
       error: "⚠️ संपर्क त्रुटि। क्या सर्वर चल रहा है?",
     },
     // Add other languages as needed...
@@ -160,6 +185,110 @@ function getBotText(type) {
   return text;
 }
 
+/* ================= IMAGE DOWNSCALING ================= */
+// Used when /upload-policy cannot be fetched; same values as the server defaults
+const DEFAULT_UPLOAD_POLICY = {
+  max_dimension: 1024,
+  max_bytes: 307200,
+  accepted_types: ["image/jpeg", "image/webp"],
+  preferred_type: "image/jpeg",
+  jpeg_quality: 0.82
+};
+let uploadPolicyPromise = null;
+
+function getUploadPolicy() {
+  if (!uploadPolicyPromise) {
+    uploadPolicyPromise = fetch(`${API_BASE}/upload-policy`)
+      .then(response => response.ok ? response.json() : DEFAULT_UPLOAD_POLICY)
+      .catch(() => DEFAULT_UPLOAD_POLICY);
+  }
+  return uploadPolicyPromise;
+}
+
+function canvasToBlob(canvas, type, quality) {
+  return new Promise(resolve => canvas.toBlob(resolve, type, quality));
+}
+
+// Shrink a photo to the server's budget before it crosses the mobile link.
+// Photos already within budget are sent unchanged (the server forwards them as-is).
+async function downscaleImage(file, policy) {
+  const bitmap = await createImageBitmap(file, { imageOrientation: "from-image" });
+  const longest = Math.max(bitmap.width, bitmap.height);
+  if (policy.accepted_types.includes(file.type) && file.size <= policy.max_bytes && longest <= policy.max_dimension) {
+    bitmap.close();
+    return file;
+  }
+
+  const scale = Math.min(1, policy.max_dimension / longest);
+  const canvas = document.createElement("canvas");
+  canvas.width = Math.round(bitmap.width * scale);
+  canvas.height = Math.round(bitmap.height * scale);
+  const context = canvas.getContext("2d");
+  context.fillStyle = "#ffffff"; // JPEG has no transparency
+  context.fillRect(0, 0, canvas.width, canvas.height);
+  context.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+  bitmap.close();
+
+  let blob = null;
+  for (const quality of [policy.jpeg_quality, 0.7, 0.55]) {
+    blob = await canvasToBlob(canvas, policy.preferred_type, quality);
+    if (!blob || blob.size <= policy.max_bytes) break;
+  }
+  if (!blob) return file;
+  const name = file.name.replace(/\.[^.]+$/, "") + ".jpg";
+  return new File([blob], name, { type: blob.type });
+}
+
+/* ================= CONSENT ================= */
+function enableChat() {
+  textInput.disabled = false;
+  textInput.placeholder = "Describe your symptoms...";
+  debugLog('CONSENT', 'Text input enabled');
+  addBotMessage(getBotText("languageSelected"));
+  textInput.focus();
+}
+
+function showConsentPrompt() {
+  debugLog('CONSENT', 'Asking for data collection consent');
+  const div = addBotMessage(getBotText("consentPrompt"));
+  const options = document.createElement("div");
+  options.className = "language-options consent-options";
+  options.innerHTML = `
+      <button type="button" data-consent="accept">${getBotText("consentAccept")}</button>
+      <button type="button" data-consent="decline">${getBotText("consentDecline")}</button>
+  `;
+  div.querySelector(".content").appendChild(options);
+  scrollBottom();
+}
+
+async function handleConsent(accepted) {
+  document.querySelectorAll(".consent-options").forEach(el => el.remove());
+  addUserMessage(getBotText(accepted ? "consentAccept" : "consentDecline"));
+  if (!accepted) {
+    addBotMessage(getBotText("consentDeclined"));
+    showConsentPrompt();
+    return;
+  }
+
+  const formData = new FormData();
+  formData.append("user_id", userId);
+  formData.append("consent_type", "data_collection");
+  formData.append("consent_given", "true");
+  try {
+    const response = await fetch(`${API_BASE}/consent`, { method: "POST", body: formData });
+    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+    debugLog('CONSENT', '✓ Consent recorded');
+  } catch (error) {
+    debugError('CONSENT', 'Consent could not be recorded', error);
+    addBotMessage(getBotText("error"));
+    showConsentPrompt();
+    return;
+  }
+  consentGiven = true;
+  localStorage.setItem("nidaan_consent", "granted");
+  enableChat();
+}
+
 /* ================= API CALL (THE INTEGRATION) ================= */
 async function sendToBackend(text, imageFile) {
   const requestId = Date.now();
@@ -179,24 +308,34 @@ async function sendToBackend(text, imageFile) {
   debugLog('API', 'Step 1: Preparing FormData');
   const formData = new FormData();
   formData.append('symptom_text', text);
+  formData.append('user_language', selectedLanguage || 'English');
+  formData.append('user_id', userId);
+  formData.append('consent_given', String(consentGiven));
   
   if (imageFile) {
-    formData.append('image', imageFile);
+    let uploadFile = imageFile;
+    try {
+      uploadFile = await downscaleImage(imageFile, await getUploadPolicy());
+    } catch (error) {
+      debugError('API', 'Image downscaling failed, sending the original', error);
+    }
+    formData.append('image', uploadFile);
     debugLog('API', '✓ Image attached to FormData', {
-      name: imageFile.name,
-      type: imageFile.type,
-      size: imageFile.size
+      name: uploadFile.name,
+      type: uploadFile.type,
+      size: uploadFile.size,
+      originalSize: imageFile.size
     });
   }
 
   try {
     // Call the Python Backend
     debugLog('API', 'Step 2: Sending POST request to backend');
-    debugLog('API', 'Backend URL: http://localhost:8000/analyze');
+    debugLog('API', `Backend URL: ${API_BASE || window.location.origin}/analyze`);
     
     const startTime = performance.now();
     
-    const response = await fetch('http://localhost:8000/analyze', {
+    const response = await fetch(`${API_BASE}/analyze`, {
       method: 'POST',
       body: formData
     });
@@ -227,6 +366,16 @@ async function sendToBackend(text, imageFile) {
     
     removeLoading(loadingId);
 
+    // Consent missing on the server (e.g. expired or revoked): ask again
+    if (data.status === 'consent_required') {
+      debugLog('API', '⚠️ Backend requires consent');
+      consentGiven = false;
+      localStorage.removeItem("nidaan_consent");
+      textInput.disabled = true;
+      showConsentPrompt();
+      return;
+    }
+
     // Step 4: Display response
     if (data.doctor_summary) {
       debugLog('API', 'Step 4: Formatting and displaying response');
@@ -279,7 +428,7 @@ async function sendToBackend(text, imageFile) {
     // Check if it's a network error
     if (error.message.includes('fetch')) {
       debugError('API', 'Network error - backend may not be running');
-      addBotMessage("⚠️ Cannot connect to backend server. Please make sure it's running on http://localhost:8000");
+      addBotMessage(`⚠️ Cannot connect to backend server. Please make sure it's running on ${API_BASE || window.location.origin}`);
     } else {
       addBotMessage(getBotText("error"));
     }
@@ -298,6 +447,11 @@ chat.addEventListener("click", (e) => {
   const btn = e.target.closest("button");
   if (!btn) return;
 
+  if (btn.dataset.consent) {
+    handleConsent(btn.dataset.consent === "accept");
+    return;
+  }
+
   const lang = btn.innerText.trim();
   debugLog('EVENT', `Language button clicked: ${lang}`);
   
@@ -309,10 +463,6 @@ chat.addEventListener("click", (e) => {
 
   selectedLanguage = lang;
   debugLog('EVENT', `✓ Language selected: ${selectedLanguage}`);
-  
-  textInput.disabled = false;
-  textInput.placeholder = "Describe your symptoms...";
-  debugLog('EVENT', 'Text input enabled');
 
   // Remove language buttons
   const languageMessages = document.querySelectorAll(".message.ai");
@@ -327,9 +477,11 @@ chat.addEventListener("click", (e) => {
 
   addUserMessage(lang);
   setTimeout(() => {
-    addBotMessage(getBotText("languageSelected"));
-    textInput.focus();
-    debugLog('EVENT', 'Input focused for user');
+    if (consentGiven) {
+      enableChat();
+    } else {
+      showConsentPrompt();
+    }
   }, 400);
 });
 
@@ -354,6 +506,7 @@ imageInput.addEventListener("change", () => {
   }
 
   pendingImage = file; // Store for sending later
+  getUploadPolicy(); // Fetched now so the upload does not wait for it
   debugLog('EVENT', '✓ Image stored as pending', {
     name: file.name,
     type: file.type,
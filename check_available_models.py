@@ -52,6 +52,8 @@ try:
             # Extract just the model name without 'models/' prefix
             clean_name = model.name.replace('models/', '')
             print(f'  model_name="{clean_name}"')
+        print("\n💡 To route across several models (cheapest first, strongest last), set in .env:")
+        print('  LLM_MODEL_TIERS=gemini-2.0-flash-lite,gemini-2.5-flash')
     else:
         print("\n⚠️ No models with generateContent found!")
         print("This might be an API key permissions issue.")
@@ -0,0 +1,98 @@
+"""
+Circuit Breaker
+Stop calling an unreachable upstream for a while instead of waiting on every request
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Circuit Breaker Configuration
+# Consecutive failures that open the circuit
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+# How long an open circuit rejects calls before letting one trial call through
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open once `reset_seconds` have passed, admitting a single
+    trial call; its outcome closes or re-opens the circuit.
+
+    Thread-safe: LLM calls run in worker threads.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # monotonic time of the last successful call (0 = never)
+        self.last_success = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0, "failures": 0, "successes": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now (claims the trial slot when half-open)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def is_open(self) -> bool:
+        """Open and still cooling down (callers should not even try)"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_seconds
+
+    def record_success(self):
+        with self._lock:
+            self.stats["successes"] += 1
+            self.failures = 0
+            self.last_success = time.monotonic()
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                logger.info(f"✓ Circuit {self.name} closed: upstream reachable again")
+            self.state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.stats["failures"] += 1
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.stats["opened"] += 1
+                logger.warning(
+                    f"⚠️ Circuit {self.name} opened after {self.failures} failure(s); "
+                    f"retrying in {self.reset_seconds:.0f}s"
+                )
+
+    def release(self):
+        """End a call that reached no verdict (cancelled, local error): frees the half-open trial slot"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, **self.stats}
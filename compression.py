@@ -0,0 +1,128 @@
+"""
+Response Compression
+Negotiated brotli/gzip encoding of API responses for 2G/3G clients
+
+JSON with Indic text compresses 3-5x. Responses below COMPRESSION_MIN_BYTES
+are sent as-is: the encoding overhead outweighs the saving on a single
+small packet. Brotli is used when installed and accepted, gzip otherwise.
+"""
+
+import os
+import gzip
+import logging
+from typing import Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Compression Configuration
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "512"))
+# Middle levels: nearly the best ratio at a fraction of the CPU of the maximum
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+stats = {"responses": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0, "br": 0, "gzip": 0}
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the response encoding from an Accept-Encoding header
+
+    Args:
+        accept_encoding: Header value, e.g. "gzip, deflate, br;q=0.9"
+
+    Returns:
+        "br", "gzip" or None (identity)
+    """
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def snapshot() -> Dict:
+    ratio = stats["bytes_in"] / stats["bytes_out"] if stats["bytes_out"] else 0.0
+    return {**stats, "brotli_available": brotli is not None, "ratio": round(ratio, 2)}
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete (non-streaming) responses of compressible types
+
+    Streaming bodies and responses that already carry a Content-Encoding
+    (e.g. precompressed static files) pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        start: Optional[Message] = None
+
+        async def send_compressed(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=start)
+            content_type = headers.get("content-type", "")
+            body = message.get("body", b"")
+            if content_type.startswith(COMPRESSIBLE_TYPES) and "content-encoding" not in headers:
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                stats["responses"] += 1
+                if encoding and not message.get("more_body", False) and len(body) >= self.minimum_size:
+                    compressed = compress(body, encoding)
+                    stats["compressed"] += 1
+                    stats[encoding] += 1
+                    stats["bytes_in"] += len(body)
+                    stats["bytes_out"] += len(compressed)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(compressed))
+                    message = {**message, "body": compressed}
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
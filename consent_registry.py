@@ -0,0 +1,274 @@
+"""
+Consent Registry
+Persistent ABDM consent records with an in-memory read-through cache
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from write_behind import WriteBehindQueue, REJECT
+from cache_backend import Cache, namespace_ttl
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Consent Registry Configuration
+DATA_DIR = os.getenv("NIDAAN_DATA_DIR", "data")
+CONSENT_DB_PATH = os.path.join(DATA_DIR, "consent.db")
+# Upper bound on how long a worker may serve a cached decision; keeps
+# revocations made through another uvicorn worker visible within this window
+CONSENT_CACHE_TTL = float(os.getenv("CONSENT_CACHE_TTL", "60"))
+# Decisions kept per worker; least recently used ones are evicted beyond this
+CONSENT_CACHE_ENTRIES = int(os.getenv("CONSENT_CACHE_ENTRIES", "65536"))
+CONSENT_FLUSH_INTERVAL = float(os.getenv("CONSENT_FLUSH_INTERVAL", "0.5"))
+CONSENT_QUEUE_CAPACITY = int(os.getenv("CONSENT_QUEUE_CAPACITY", "10000"))
+CONSENT_VALIDITY_DAYS = 365
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS consent (
+    user_hash TEXT NOT NULL,
+    consent_type TEXT NOT NULL,
+    consent_given INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (user_hash, consent_type)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_consent_expiry ON consent (expires_at);
+"""
+
+
+@lru_cache(maxsize=65536)
+def hash_user_id(user_id: str) -> str:
+    """Pseudonymous user key stored instead of the raw user id (memoized: hot path)"""
+    return hashlib.sha256(user_id.encode()).hexdigest()[:16]
+
+
+class ConsentRegistry:
+    """
+    Consent store keyed by (hashed user_id, consent_type)
+
+    Writes update the local cache immediately and are persisted in batches
+    through a write-behind queue (which rejects, never drops, when full).
+    Reads are an LRU lookup (at most `cache_entries` decisions); misses read
+    through to SQLite (WAL mode, shared by all workers) and are cached until
+    the earlier of the consent's expiry and CONSENT_CACHE_TTL. Async
+    handlers use check_async(), which runs misses in a worker thread.
+
+    With a `shared` cache, decisions are also written through to its far
+    tier (mmap table / Redis), so a worker's miss is usually answered by a
+    record another worker made, before SQLite is consulted. Only record()
+    writes the far tier: a read-through miss may see a SQLite row that a
+    queued revocation has not yet replaced, and must not copy that stale
+    grant over the revocation already in the far tier.
+    """
+
+    def __init__(self, path: str = CONSENT_DB_PATH, cache_ttl: float = CONSENT_CACHE_TTL,
+                 shared: Optional[Cache] = None, cache_entries: int = CONSENT_CACHE_ENTRIES):
+        self.path = path
+        self.cache_ttl = cache_ttl
+        self.cache_entries = cache_entries
+        self.shared = shared
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        # (user_hash, consent_type) -> (consent_given, cache_until), least recently used first
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[bool, float]]" = OrderedDict()
+        # Misses fill the cache from worker threads while handlers read it
+        self._cache_lock = threading.Lock()
+        # One thread, so far-tier writes from record_async() land in call order
+        self._share_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="consent-share")
+        self.writes = WriteBehindQueue(
+            "consent", self._write_batch,
+            capacity=CONSENT_QUEUE_CAPACITY,
+            flush_interval=CONSENT_FLUSH_INTERVAL,
+            overflow=REJECT
+        )
+        self.stats = {"hits": 0, "misses": 0, "shared_hits": 0, "writes": 0, "evictions": 0}
+        logger.info(f"✓ Consent registry opened: {path}")
+
+    async def start(self):
+        """Start the batched writer (called from app lifespan)"""
+        await self.writes.start()
+
+    async def stop(self):
+        """Stop the writer and persist outstanding records"""
+        await self.writes.stop()
+        await asyncio.to_thread(self._share_executor.shutdown)
+
+    def record(
+        self,
+        user_id: str,
+        consent_type: str,
+        consent_given: bool,
+        validity_days: int = CONSENT_VALIDITY_DAYS,
+        share: bool = True
+    ) -> Dict:
+        """
+        Record (or revoke) consent; visible to this worker immediately
+
+        Args:
+            share: Also write the shared far tier (blocking; record_async()
+                passes False and writes it off the event loop)
+
+        Returns:
+            The consent record as persisted (hashed user id, epoch timestamps)
+
+        Raises:
+            QueueFull: If the write queue is saturated (nothing is recorded)
+        """
+        user_hash = hash_user_id(user_id)
+        now = time.time()
+        expires_at = now + validity_days * 86400
+        self.writes.put_nowait((user_hash, consent_type, int(consent_given), now, expires_at))
+        self._cache_put((user_hash, consent_type), consent_given, min(expires_at, now + self.cache_ttl))
+        if share:
+            self._share(user_hash, consent_type, consent_given, expires_at)
+        return {
+            "user_id": user_hash,
+            "consent_type": consent_type,
+            "consent_given": consent_given,
+            "recorded_at": now,
+            "expires_at": expires_at
+        }
+
+    async def record_async(
+        self,
+        user_id: str,
+        consent_type: str,
+        consent_given: bool,
+        validity_days: int = CONSENT_VALIDITY_DAYS
+    ) -> Dict:
+        """record() for the event loop: the far-tier write runs in a worker thread"""
+        record = self.record(user_id, consent_type, consent_given, validity_days, share=False)
+        if self.shared is not None:
+            # Submitted before any await, so decisions reach the far tier in order
+            await asyncio.get_running_loop().run_in_executor(
+                self._share_executor, self._share, record["user_id"], consent_type, consent_given, record["expires_at"]
+            )
+        return record
+
+    def _share(self, user_hash: str, consent_type: str, consent_given: bool, expires_at: float):
+        if self.shared is not None:
+            ttl = min(expires_at - time.time(), namespace_ttl("consent"))
+            self.shared.set("consent", f"{user_hash}:{consent_type}", [consent_given, expires_at], ttl=ttl, local=False)
+
+    def flush(self):
+        """Persist all queued records"""
+        self.writes.flush()
+
+    def _write_batch(self, batch: List[Tuple]):
+        """Write-behind sink: one transaction per batch"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO consent "
+                    "(user_hash, consent_type, consent_given, recorded_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    batch
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.stats["writes"] += len(batch)
+
+    def _cache_get(self, key: Tuple[str, str], now: float) -> Optional[bool]:
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                return None
+            if cached[1] <= now:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return cached[0]
+
+    def _cache_put(self, key: Tuple[str, str], consent_given: bool, cache_until: float):
+        with self._cache_lock:
+            self._cache[key] = (consent_given, cache_until)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def check(self, user_id: str, consent_type: str) -> bool:
+        """
+        True if the user has an unexpired, granted consent of this type
+
+        Blocks on SQLite for a miss; async handlers use check_async().
+        """
+        key = (hash_user_id(user_id), consent_type)
+        now = time.time()
+        cached = self._cache_get(key, now)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+        return self._read_through(key, now)
+
+    async def check_async(self, user_id: str, consent_type: str) -> bool:
+        """check() for the event loop: hits answered inline, misses read in a worker thread"""
+        key = (hash_user_id(user_id), consent_type)
+        now = time.time()
+        cached = self._cache_get(key, now)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+        return await asyncio.to_thread(self._read_through, key, now)
+
+    def _read_through(self, key: Tuple[str, str], now: float) -> bool:
+        """Cache miss: shared far tier, then SQLite"""
+        consent_type = key[1]
+        self.stats["misses"] += 1
+        if self.shared is not None:
+            shared = self.shared.get("consent", f"{key[0]}:{consent_type}", local=False)
+            if shared is not None and shared[1] > now:
+                self.stats["shared_hits"] += 1
+                self._cache_put(key, shared[0], min(shared[1], now + self.cache_ttl))
+                return shared[0]
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT consent_given, expires_at FROM consent WHERE user_hash = ? AND consent_type = ?",
+                key
+            ).fetchone()
+        if row is None or row[1] <= now:
+            # Cache the negative answer briefly so a consent granted through
+            # another worker is picked up soon (the LRU bound keeps lookups of
+            # arbitrary user ids from growing the cache)
+            self._cache_put(key, False, now + min(self.cache_ttl, 5.0))
+            return False
+        given = bool(row[0])
+        self._cache_put(key, given, min(row[1], now + self.cache_ttl))
+        return given
+
+    def purge_expired(self, before: Optional[float] = None, limit: int = 1000) -> int:
+        """Delete up to `limit` consent records that expired before `before` (default: now)"""
+        cutoff = before if before is not None else time.time()
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM consent WHERE (user_hash, consent_type) IN "
+                "(SELECT user_hash, consent_type FROM consent WHERE expires_at < ? LIMIT ?)",
+                (cutoff, limit)
+            ).rowcount
+        with self._cache_lock:
+            for key in [k for k, v in self._cache.items() if v[1] <= cutoff]:
+                del self._cache[key]
+        return deleted
+
+
+logger.info("Consent registry module loaded")
@@ -0,0 +1,27 @@
+"""
+Emergency Keyword Check
+Rule-based red-flag detection that runs before (and instead of) the LLM
+"""
+
+from typing import List
+
+# English phrases; non-English input is checked after translation
+EMERGENCY_KEYWORDS = (
+    "chest pain", "breathless", "unconscious", "bleeding heavily",
+    "severe headache", "can't breathe", "heart attack", "stroke",
+    "poisoning", "severe burn", "seizure", "suicide", "overdose"
+)
+
+
+def find_emergency_keywords(english_text: str) -> List[str]:
+    """
+    Emergency keywords present in the (English) symptom text
+
+    Args:
+        english_text: Symptom description, already translated to English
+
+    Returns:
+        Matched keywords in EMERGENCY_KEYWORDS order (empty if none)
+    """
+    text = english_text.lower()
+    return [kw for kw in EMERGENCY_KEYWORDS if kw in text]
@@ -0,0 +1,153 @@
+"""
+Google Translate Service
+Pooled, batched client for the /translate endpoint
+"""
+
+import os
+import asyncio
+import httpx
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from sarvam_translator import LANGUAGE_CODES
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Google Translate Configuration
+GOOGLE_TRANSLATE_API_KEY = os.getenv("GOOGLE_TRANSLATE_API_KEY", "")
+GOOGLE_TRANSLATE_API_URL = "https://translation.googleapis.com/language/translate/v2"
+
+# The v2 API accepts at most 128 `q` segments per request
+MAX_SEGMENTS_PER_REQUEST = 128
+
+# Number of (target, text) pairs kept in the translation cache
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "4096"))
+
+
+def resolve_target_code(target_language: str) -> str:
+    """
+    Normalize a target language to a Google Translate code
+
+    Args:
+        target_language: ISO code ("hi"), locale ("hi-IN") or UI name ("हिंदी")
+
+    Returns:
+        Two-letter code like "hi"
+    """
+    code = LANGUAGE_CODES.get(target_language, target_language)
+    return code.split("-")[0].lower()
+
+
+class GoogleTranslator:
+    """
+    Google Translate v2 client with a shared connection pool and LRU cache
+    """
+
+    def __init__(self):
+        self.api_key = GOOGLE_TRANSLATE_API_KEY
+        self.api_url = GOOGLE_TRANSLATE_API_URL
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self.cache_size = TRANSLATION_CACHE_SIZE
+
+        if not self.api_key:
+            logger.warning("⚠️ GOOGLE_TRANSLATE_API_KEY not found - /translate will fall back to original text")
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared pooled client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+            logger.debug("Google Translate connection pool created")
+        return self._client
+
+    async def aclose(self):
+        """Close the shared client (called on app shutdown)"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.debug("Google Translate connection pool closed")
+        self._client = None
+
+    def _cache_get(self, key: tuple) -> Optional[str]:
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+        return value
+
+    def _cache_put(self, key: tuple, value: str):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _request_batch(self, segments: List[str], target: str) -> List[str]:
+        """Translate up to MAX_SEGMENTS_PER_REQUEST strings in one round trip"""
+        client = self._get_client()
+        response = await client.post(
+            self.api_url,
+            params={"key": self.api_key},
+            json={"q": segments, "target": target, "format": "text"},
+        )
+        response.raise_for_status()
+        translations = response.json()["data"]["translations"]
+        return [t["translatedText"] for t in translations]
+
+    async def translate_batch(self, texts: List[str], target_language: str) -> Dict:
+        """
+        Translate a list of strings, deduplicating and serving repeats from cache
+
+        Args:
+            texts: Strings to translate (order is preserved in the result)
+            target_language: Target language code or UI name
+
+        Returns:
+            Dict with translated strings aligned to `texts`
+        """
+        target = resolve_target_code(target_language)
+
+        # Dedupe within the batch, then split into cached and pending strings
+        unique = list(dict.fromkeys(texts))
+        resolved: Dict[str, str] = {}
+        pending: List[str] = []
+        for text in unique:
+            cached = self._cache_get((target, text))
+            if cached is not None:
+                resolved[text] = cached
+            else:
+                pending.append(text)
+
+        logger.debug(
+            f"Translate batch: {len(texts)} texts, {len(unique)} unique, "
+            f"{len(unique) - len(pending)} cached, {len(pending)} to fetch"
+        )
+
+        if pending:
+            chunks = [
+                pending[i:i + MAX_SEGMENTS_PER_REQUEST]
+                for i in range(0, len(pending), MAX_SEGMENTS_PER_REQUEST)
+            ]
+            results = await asyncio.gather(*(self._request_batch(chunk, target) for chunk in chunks))
+            for chunk, translated in zip(chunks, results):
+                for text, out in zip(chunk, translated):
+                    resolved[text] = out
+                    self._cache_put((target, text), out)
+
+        return {
+            "success": True,
+            "translations": [resolved[text] for text in texts],
+            "target_language": target,
+            "unique_count": len(unique),
+            "cache_hits": len(unique) - len(pending),
+        }
+
+
+# Singleton instance
+google_translator = GoogleTranslator()
+
+logger.info("Google Translate module loaded")
@@ -0,0 +1,266 @@
+"""
+Triage History Store
+Compact per-patient triage records with indexed retrieval for repeat visits
+"""
+
+import os
+import time
+import base64
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from consent_registry import hash_user_id
+from schemas import RISK_LEVELS
+from write_behind import WriteBehindQueue, REJECT
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# History Store Configuration
+DATA_DIR = os.getenv("NIDAAN_DATA_DIR", "data")
+HISTORY_DB_PATH = os.path.join(DATA_DIR, "history.db")
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+HISTORY_QUEUE_CAPACITY = int(os.getenv("HISTORY_QUEUE_CAPACITY", "50000"))
+# Stored summaries/advice are clipped; history is context, not the full report
+HISTORY_TEXT_MAX_CHARS = 280
+# Bounds on what is fed back into the LLM prompt
+HISTORY_CONTEXT_VISITS = int(os.getenv("HISTORY_CONTEXT_VISITS", "3"))
+HISTORY_CONTEXT_MAX_CHARS = int(os.getenv("HISTORY_CONTEXT_MAX_CHARS", "600"))
+
+# Risk is stored as a small integer (index into RISK_LEVELS)
+RISK_CODES = {level: code for code, level in enumerate(RISK_LEVELS)}
+
+# Clustered on (user_hash, ts): one patient's visits are contiguous on disk, so
+# a history page is a single B-tree seek plus a short range scan.
+# user_hash is the 8-byte binary form of hash_user_id(); ts is epoch millis.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS triage (
+    user_hash BLOB NOT NULL,
+    ts INTEGER NOT NULL,
+    request_id TEXT NOT NULL,
+    risk INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    advice TEXT NOT NULL,
+    PRIMARY KEY (user_hash, ts, request_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_triage_ts ON triage (ts, request_id);
+CREATE INDEX IF NOT EXISTS idx_triage_risk ON triage (risk, ts, request_id);
+"""
+
+COLUMNS = ("user_hash", "ts", "request_id", "risk", "lang", "summary", "advice")
+
+
+def _clip(text: str, limit: int = HISTORY_TEXT_MAX_CHARS) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def encode_cursor(ts: int, request_id: str) -> str:
+    """Opaque keyset cursor pointing just past the last returned record"""
+    return base64.urlsafe_b64encode(f"{ts}:{request_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    """
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor()
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, request_id = raw.split(":", 1)
+        return int(ts), request_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class HistoryStore:
+    """
+    Triage records keyed by hashed user id
+
+    record() only queues the row; the write-behind queue writes queued rows
+    in one transaction per batch, so new records become visible to reads
+    within HISTORY_FLUSH_INTERVAL. Reads go straight to SQLite (WAL, so they never wait
+    on the writer) and use keyset pagination, which costs one index seek
+    per page regardless of how deep the client has paged.
+    """
+
+    def __init__(self, path: str = HISTORY_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.writes = WriteBehindQueue(
+            "history", self._write_batch,
+            capacity=HISTORY_QUEUE_CAPACITY,
+            flush_interval=HISTORY_FLUSH_INTERVAL,
+            overflow=REJECT
+        )
+        logger.info(f"✓ History store opened: {path}")
+
+    async def start(self):
+        """Start the batched writer (called from app lifespan)"""
+        await self.writes.start()
+
+    async def stop(self):
+        """Stop the writer and persist outstanding records"""
+        await self.writes.stop()
+
+    # ==================== WRITE PATH ====================
+    def record(
+        self,
+        user_id: str,
+        request_id: str,
+        risk: str,
+        summary: str,
+        advice: str,
+        lang: str = "en"
+    ):
+        """
+        Queue one triage outcome
+
+        Args:
+            user_id: Patient identifier (stored hashed)
+            request_id: /analyze request id
+            risk: LOW / MODERATE / HIGH (anything else is stored as MODERATE)
+            summary: English doctor summary (clipped)
+            advice: English advice (clipped)
+            lang: Language the patient used
+
+        Raises:
+            QueueFull: If the write queue is saturated
+        """
+        self.writes.put_nowait((
+            bytes.fromhex(hash_user_id(user_id)),
+            int(time.time() * 1000),
+            request_id,
+            RISK_CODES.get((risk or "").upper(), RISK_CODES["MODERATE"]),
+            lang,
+            _clip(summary),
+            _clip(advice)
+        ))
+
+    def flush(self):
+        """Persist all queued records"""
+        self.writes.flush()
+
+    def _write_batch(self, batch: List[Tuple]):
+        """Write-behind sink: one transaction per batch"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO triage ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    batch
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # ==================== READ PATH ====================
+    def history(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        risk: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of triage records, newest first
+
+        With user_id the (user_hash, ts) primary key is used; without it the
+        (risk, ts) or (ts) index. Either way a page is one seek plus `limit` rows.
+
+        Returns:
+            (records, next_cursor) - next_cursor is None on the last page
+
+        Raises:
+            ValueError: On an invalid cursor or risk level
+        """
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append("user_hash = ?")
+            params.append(bytes.fromhex(hash_user_id(user_id)))
+        if risk is not None:
+            if risk.upper() not in RISK_CODES:
+                raise ValueError(f"Unknown risk level: {risk}")
+            # Unary + keeps SQLite on the per-user primary key when user_id is given
+            clauses.append("+risk = ?" if user_id is not None else "risk = ?")
+            params.append(RISK_CODES[risk.upper()])
+        if cursor is not None:
+            clauses.append("(ts, request_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM triage {where}"
+                "ORDER BY ts DESC, request_id DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][1], rows[-1][2])
+        return [self._public(row) for row in rows], next_cursor
+
+    def _public(self, row) -> Dict:
+        user_hash, ts, request_id, risk, lang, summary, advice = row
+        return {
+            "user_id": user_hash.hex(),
+            "request_id": request_id,
+            "timestamp": datetime.fromtimestamp(ts / 1000).isoformat(),
+            "risk": RISK_LEVELS[risk],
+            "language": lang,
+            "summary": summary,
+            "advice": advice
+        }
+
+    def recent_summary(
+        self,
+        user_id: str,
+        visits: int = HISTORY_CONTEXT_VISITS,
+        max_chars: int = HISTORY_CONTEXT_MAX_CHARS
+    ) -> Optional[str]:
+        """
+        Bounded plain-text digest of the patient's last visits for the LLM prompt
+
+        Returns:
+            One line per visit (newest first), or None for a new patient
+        """
+        records, _ = self.history(user_id, limit=visits)
+        if not records:
+            return None
+        lines = []
+        used = 0
+        for record in records:
+            line = f"- {record['timestamp'][:10]} ({record['risk']}): {record['summary']}"
+            if used + len(line) > max_chars:
+                line = line[:max(0, max_chars - used - 1)] + "…"
+            lines.append(line)
+            used += len(line) + 1
+            if used >= max_chars:
+                break
+        return "\n".join(lines)
+
+    def purge_before(self, cutoff: float, limit: int = 1000) -> int:
+        """Delete up to `limit` records older than `cutoff` (epoch seconds) via the ts index"""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM triage WHERE (user_hash, ts, request_id) IN "
+                "(SELECT user_hash, ts, request_id FROM triage WHERE ts < ? ORDER BY ts LIMIT ?)",
+                (int(cutoff * 1000), limit)
+            ).rowcount
+
+
+logger.info("History store module loaded")
@@ -0,0 +1,147 @@
+"""
+Image Upload Policy
+The size budget clients downscale photos to before upload, and the
+server-side preparation of uploaded images for Gemini
+
+Clients fetch the budget from /upload-policy and shrink camera photos
+(often 3-8 MB) on the device, so only a few hundred KB cross the mobile
+link. Uploads that already fit the budget as JPEG/WebP are forwarded to
+Gemini without re-encoding; only their metadata segments (EXIF with GPS
+position, device and time, XMP, IPTC, comments) are cut out, losslessly.
+Anything else (PNG, oversized, other formats, rotated or metadata-carrying
+WebP) is downscaled and re-encoded to JPEG here, which drops metadata too.
+"""
+
+import io
+import os
+import logging
+from typing import Dict, Optional, Tuple
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Upload Budget Configuration
+# Longest side in pixels; more detail than this does not change the triage
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1024"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", "307200"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+# Lower qualities tried in turn when an image still exceeds IMAGE_MAX_BYTES
+FALLBACK_QUALITIES = (70, 55)
+# Formats forwarded as-is when within budget (PIL format -> MIME type)
+FAST_PATH_FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# JPEG markers dropped on the fast path: APP1 (EXIF/XMP), APP13 (IPTC), COM
+STRIPPED_JPEG_MARKERS = (0xE1, 0xED, 0xFE)
+EXIF_ORIENTATION = 0x0112
+
+stats = {"as_is": 0, "reencoded": 0, "metadata_stripped": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def upload_policy() -> Dict:
+    """The budget served by /upload-policy (quality in the 0-1 scale of canvas.toBlob)"""
+    return {
+        "max_dimension": IMAGE_MAX_DIMENSION,
+        "max_bytes": IMAGE_MAX_BYTES,
+        "accepted_types": list(FAST_PATH_FORMATS.values()),
+        "preferred_type": "image/jpeg",
+        "jpeg_quality": IMAGE_JPEG_QUALITY / 100,
+    }
+
+
+def _strip_jpeg_metadata(data: bytes) -> Optional[bytes]:
+    """
+    JPEG without metadata segments, entropy-coded data untouched
+
+    Returns:
+        The stripped bytes, or None if the marker structure is not understood
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    kept = [data[:2]]
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xDA:  # start of scan: the rest is image data
+            kept.append(data[pos:])
+            return b"".join(kept)
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        if length < 2:
+            return None
+        if marker not in STRIPPED_JPEG_MARKERS:
+            kept.append(data[pos:pos + 2 + length])
+        pos += 2 + length
+    return None
+
+
+def prepare_image(image_bytes: bytes) -> Tuple[Dict, Dict]:
+    """
+    Gemini inline blob for an uploaded image
+
+    Args:
+        image_bytes: The upload as received
+
+    Returns:
+        (blob, info): blob is {"mime_type", "data"}; info describes the
+        path taken ("as_is" or "reencoded") and the sizes
+
+    Raises:
+        PIL.UnidentifiedImageError: If the bytes are not an image
+    """
+    # Only the header is parsed here; pixels are decoded on the slow path only
+    image = Image.open(io.BytesIO(image_bytes))
+    info = {"format": image.format, "size": image.size, "bytes_in": len(image_bytes)}
+    stats["bytes_in"] += len(image_bytes)
+
+    if (image.format in FAST_PATH_FORMATS and max(image.size) <= IMAGE_MAX_DIMENSION
+            and len(image_bytes) <= IMAGE_MAX_BYTES):
+        # Rotation lives in EXIF, so rotated photos are re-encoded upright
+        # instead of losing their orientation with the metadata
+        data = None
+        if image.getexif().get(EXIF_ORIENTATION, 1) == 1:
+            if image.format == "JPEG":
+                data = _strip_jpeg_metadata(image_bytes)
+            elif not (image.info.get("exif") or image.info.get("xmp")):
+                data = image_bytes
+        if data is not None:
+            stats["as_is"] += 1
+            stats["bytes_out"] += len(data)
+            if len(data) < len(image_bytes):
+                stats["metadata_stripped"] += 1
+            return {"mime_type": FAST_PATH_FORMATS[image.format], "data": data}, {
+                **info, "path": "as_is", "metadata_bytes_removed": len(image_bytes) - len(data)
+            }
+
+    # Camera photos store rotation in EXIF; apply it before EXIF is dropped
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.LANCZOS)
+    if image.mode != "RGB":
+        # JPEG has no alpha: flatten transparent areas onto white
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+
+    for quality in (IMAGE_JPEG_QUALITY,) + FALLBACK_QUALITIES:
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True)
+        if out.tell() <= IMAGE_MAX_BYTES:
+            break
+    data = out.getvalue()
+
+    stats["reencoded"] += 1
+    stats["bytes_out"] += len(data)
+    return {"mime_type": "image/jpeg", "data": data}, {
+        **info, "path": "reencoded", "resized_to": image.size, "quality": quality, "bytes_out": len(data)
+    }
+
+
+def snapshot() -> Dict:
+    return dict(stats)
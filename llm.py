@@ -1,10 +1,20 @@
 import os
-import json
+import time
+import threading
 import google.generativeai as genai
+from google.generativeai import caching
+from google.api_core import retry as api_retry
 from dotenv import load_dotenv
-from PIL import Image
-import io
-from prompts import TRIAGE_PROMPT
+import asyncio
+import hashlib
+from prompt_builder import build_triage_prompt, get_template
+from model_router import Attempt, ModelRouter, configured_tiers
+from circuit_breaker import CircuitBreaker
+from single_flight import SingleFlight, flight_key, normalize_text
+from cache_backend import cache
+from pydantic import ValidationError
+from schemas import TRIAGE_RESPONSE_SCHEMA, parse_triage_result
+from image_policy import prepare_image
 import logging
 from datetime import datetime
 
@@ -37,13 +47,45 @@ except Exception as e:
     logger.error(f"❌ Failed to configure Gemini API: {e}")
     raise
 
-# Configuration to force JSON output directly from the model
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+
+# Explicit context caching of the system instruction. Needs a versioned model
+# (e.g. gemini-2.0-flash-001) and a minimum cached size; below that the
+# provider rejects the cache and the plain system_instruction model is used.
+LLM_CONTEXT_CACHE = os.getenv("LLM_CONTEXT_CACHE", "0") == "1"
+LLM_CONTEXT_CACHE_TTL = int(os.getenv("LLM_CONTEXT_CACHE_TTL", "3600"))
+# Extend the cache this long before it expires
+CONTEXT_CACHE_REFRESH_MARGIN = 300
+# After a failed create/refresh, serve without the cache this long before retrying
+CONTEXT_CACHE_RETRY_SECONDS = 600
+
+# The response is three short JSON fields (~150-300 tokens); the cap bounds
+# worst-case generation time instead of allowing 8192 tokens
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "512"))
+
+# Per-call timeout passed to the API so a hung connection fails instead of
+# holding a worker thread; repeated transport failures open gemini_circuit
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "30"))
+# Total time the SDK may spend retrying transient errors (its default retry
+# keeps going for up to 600s, so an unreachable API would never reach the circuit)
+LLM_RETRY_SECONDS = float(os.getenv("LLM_RETRY_SECONDS", "5"))
+LLM_REQUEST_OPTIONS = {
+    "timeout": LLM_REQUEST_TIMEOUT_SECONDS,
+    "retry": api_retry.Retry(
+        predicate=api_retry.if_transient_error, initial=0.25, maximum=2.0, multiplier=2.0,
+        timeout=LLM_RETRY_SECONDS
+    ),
+}
+gemini_circuit = CircuitBreaker("gemini")
+
+# Configuration to force schema-conforming JSON directly from the model
 generation_config = {
     "temperature": 1,
     "top_p": 0.95,
     "top_k": 64,
-    "max_output_tokens": 8192,
+    "max_output_tokens": LLM_MAX_OUTPUT_TOKENS,
     "response_mime_type": "application/json",
+    "response_schema": TRIAGE_RESPONSE_SCHEMA,
 }
 
 logger.debug("Generation Config:")
@@ -53,26 +95,150 @@ logger.debug(f"  - Top K: {generation_config['top_k']}")
 logger.debug(f"  - Max Tokens: {generation_config['max_output_tokens']}")
 logger.debug(f"  - Response Type: {generation_config['response_mime_type']}")
 
+
+class TriageModel:
+    """
+    Gemini model with the triage instructions as system_instruction
+
+    With LLM_CONTEXT_CACHE=1 the instructions are stored once per process
+    as cached content and requests reference the cache, so only the
+    patient text and image travel per request. The cache TTL is extended
+    shortly before it expires.
+    """
+
+    def __init__(self, model_name: str, instructions: str):
+        self.model_name = model_name
+        self.instructions = instructions
+        self.base = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config,
+            system_instruction=instructions
+        )
+        self._cache = None
+        self._cached_model = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._cache_enabled = LLM_CONTEXT_CACHE
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Model to use for the next request (cached-content model when available)"""
+        if not self._cache_enabled or time.time() < self._retry_at:
+            return self.base
+        with self._lock:
+            try:
+                if self._cache is None:
+                    self._create_cache()
+                elif time.time() >= self._expires_at - CONTEXT_CACHE_REFRESH_MARGIN:
+                    self._cache.update(ttl=LLM_CONTEXT_CACHE_TTL)
+                    self._expires_at = time.time() + LLM_CONTEXT_CACHE_TTL
+                    logger.info(f"✓ Context cache refreshed: {self._cache.name}")
+            except Exception as e:
+                logger.warning(f"⚠️ Context caching unavailable, using system_instruction only: {e}")
+                self._retry_at = time.time() + CONTEXT_CACHE_RETRY_SECONDS
+                self._cache = self._cached_model = None
+                return self.base
+            return self._cached_model
+
+    def _create_cache(self):
+        name = self.model_name if self.model_name.startswith("models/") else f"models/{self.model_name}"
+        self._cache = caching.CachedContent.create(
+            model=name,
+            display_name="nidaan-triage-instructions",
+            system_instruction=self.instructions,
+            ttl=LLM_CONTEXT_CACHE_TTL
+        )
+        self._cached_model = genai.GenerativeModel.from_cached_content(
+            self._cache, generation_config=generation_config
+        )
+        self._expires_at = time.time() + LLM_CONTEXT_CACHE_TTL
+        logger.info(f"✓ Context cache created: {self._cache.name} (ttl {LLM_CONTEXT_CACHE_TTL}s)")
+
+    def close(self):
+        """Delete the cached content (called on shutdown)"""
+        with self._lock:
+            if self._cache is not None:
+                try:
+                    self._cache.delete()
+                    logger.info("Context cache deleted")
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not delete context cache: {e}")
+                self._cache = self._cached_model = None
+
+
 try:
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-exp",
-        generation_config=generation_config,
-    )
-    logger.info("✓ Gemini Model Initialized: gemini-2.0-flash-exp")
+    # One model (with its own context cache) per router tier, cheapest first
+    model_router = ModelRouter(configured_tiers(GEMINI_MODEL))
+    triage_models = {
+        name: TriageModel(name, get_template().instructions) for name in model_router.tiers
+    }
+    # Strongest tier; kept for callers that use a single model (token counting, scripts)
+    triage_model = triage_models[model_router.tiers[-1]]
+    model = triage_model.base
+    logger.info(f"✓ Gemini Models Initialized: {' → '.join(model_router.tiers)} (system instruction: {get_template().version})")
 except Exception as e:
     logger.error(f"❌ Failed to initialize model: {e}")
     raise
 
+# Counts the fixed prompt text on its own (no system instruction attached)
+_counting_model = genai.GenerativeModel(model_name=GEMINI_MODEL)
+
 logger.info("=" * 70)
 
 
-def call_llm(symptom_text: str, image_bytes: bytes = None):
+def close_models():
+    """Delete every tier's context cache (called on shutdown)"""
+    for triage in triage_models.values():
+        triage.close()
+
+
+def warm_up():
+    """
+    Open the Gemini channel ahead of real traffic (blocking; run in a thread)
+    A count_tokens round trip (free, same client as generate_content)
+    opens the connection; once it answers, the template's fixed tokens are
+    counted and every tier's context cache is created or refreshed, so the
+    first request does neither. Raises on failure.
+    """
+    try:
+        _counting_model.count_tokens("ping", request_options=LLM_REQUEST_OPTIONS)
+    except Exception:
+        gemini_circuit.record_failure()
+        raise
+    gemini_circuit.record_success()
+    get_template().fixed_tokens(_counting_model, LLM_REQUEST_OPTIONS)
+    for triage in triage_models.values():
+        triage.get()
+
+
+# Running totals reported by /metrics: tokens (from response.usage_metadata)
+# and response validation
+llm_stats = {
+    "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "truncated_inputs": 0,
+    "validated": 0, "invalid_outputs": 0, "parse_ms_total": 0.0
+}
+
+
+def llm_stats_snapshot() -> dict:
+    """Totals plus per-call averages"""
+    calls = llm_stats["calls"] or 1
+    parsed = (llm_stats["validated"] + llm_stats["invalid_outputs"]) or 1
+    return {
+        **llm_stats,
+        "avg_prompt_tokens": round(llm_stats["prompt_tokens"] / calls, 1),
+        "avg_output_tokens": round(llm_stats["output_tokens"] / calls, 1),
+        "avg_parse_ms": round(llm_stats["parse_ms_total"] / parsed, 4)
+    }
+
+
+def call_llm(symptom_text: str, image_bytes: bytes = None, history: str = None):
     """
     Main LLM calling function with comprehensive debugging
     
     Args:
         symptom_text: Patient's symptom description
         image_bytes: Optional image data
+        history: Optional bounded summary of the patient's previous visits
     
     Returns:
         dict: Parsed JSON response from LLM
@@ -82,39 +248,47 @@ def call_llm(symptom_text: str, image_bytes: bytes = None):
     logger.info("=" * 70)
     logger.info(f"LLM CALL STARTED - ID: {call_id}")
     logger.info("=" * 70)
+
+    if not gemini_circuit.allow():
+        logger.warning(f"[{call_id}] ⚠️ Gemini circuit open - skipping the call")
+        return {"error": "Gemini unavailable (circuit open)", "circuit_open": True}
     
     # Step 1: Prepare prompt
     logger.debug(f"[{call_id}] Step 1: Preparing Prompt")
-    prompt = f"""
-    {TRIAGE_PROMPT}
-
-    Patient Symptoms:
-    {symptom_text}
-    """
+    # Fixed template tokens are counted exactly once (API), then cached
+    get_template().fixed_tokens(_counting_model, LLM_REQUEST_OPTIONS)
+    prompt, prompt_info = build_triage_prompt(symptom_text, history)
+    if prompt_info["truncated"]:
+        llm_stats["truncated_inputs"] += 1
+        logger.warning(f"[{call_id}] ⚠️ Symptom text truncated to fit the input token budget")
+    if history:
+        logger.debug(f"[{call_id}] Visit history included: {len(history)} chars")
     
-    logger.debug(f"[{call_id}] Prompt Length: {len(prompt)} chars")
+    logger.debug(f"[{call_id}] Prompt {prompt_info['version']}: {len(prompt)} chars, ~{prompt_info['estimated_tokens']} tokens")
     logger.debug(f"[{call_id}] Symptom Text: '{symptom_text}'")
     logger.debug(f"[{call_id}] Full Prompt Preview:\n{prompt[:200]}...")
     
     content = [prompt]
     logger.debug(f"[{call_id}] Initial content list: [prompt]")
 
-    # Step 2: Handle image safely using PIL
+    # Step 2: Handle image safely (budget-compliant JPEG/WebP pass through untouched)
     if image_bytes:
         logger.debug(f"[{call_id}] Step 2: Processing Image")
         logger.debug(f"[{call_id}] Image bytes received: {len(image_bytes)} bytes ({len(image_bytes)/1024:.2f} KB)")
         
         try:
-            logger.debug(f"[{call_id}] Opening image with PIL...")
-            image = Image.open(io.BytesIO(image_bytes))
+            blob, image_info = prepare_image(image_bytes)
             
-            logger.info(f"[{call_id}] ✓ Image opened successfully")
-            logger.debug(f"[{call_id}] Image Format: {image.format}")
-            logger.debug(f"[{call_id}] Image Size: {image.size}")
-            logger.debug(f"[{call_id}] Image Mode: {image.mode}")
+            logger.info(f"[{call_id}] ✓ Image accepted ({image_info['path']})")
+            logger.debug(f"[{call_id}] Image Format: {image_info['format']}")
+            logger.debug(f"[{call_id}] Image Size: {image_info['size']}")
+            if image_info["path"] == "reencoded":
+                logger.debug(
+                    f"[{call_id}] Re-encoded to {image_info['resized_to']} JPEG q{image_info['quality']}: "
+                    f"{image_info['bytes_in'] / 1024:.1f} KB → {image_info['bytes_out'] / 1024:.1f} KB"
+                )
             
-            content.append(image)
-            logger.debug(f"[{call_id}] Image added to content list")
+            content.append(blob)
             logger.debug(f"[{call_id}] Content list now: [prompt, image]")
             
         except Exception as e:
@@ -125,50 +299,123 @@ def call_llm(symptom_text: str, image_bytes: bytes = None):
     else:
         logger.debug(f"[{call_id}] Step 2: No image provided - text-only analysis")
 
-    # Step 3: Generate content
-    logger.debug(f"[{call_id}] Step 3: Calling Gemini API")
+    # Step 3: Generate content (cheapest healthy tier first, escalating on uncertainty)
+    logger.debug(f"[{call_id}] Step 3: Routing across model tiers: {' → '.join(model_router.tiers)}")
+    result, route = model_router.run(
+        lambda model_name: _generate(model_name, content, call_id),
+        has_image=len(content) > 1
+    )
+    if route["escalations"]:
+        logger.info(
+            f"[{call_id}] Answered by {route['model']} after escalation "
+            f"({', '.join(route['escalations'])}; tried {' → '.join(route['tried'])})"
+        )
+
+    # Only transport/API exceptions count against the circuit; an invalid
+    # answer still means Gemini is reachable
+    if "exception_type" in result:
+        gemini_circuit.record_failure()
+    else:
+        gemini_circuit.record_success()
+    
+    if "error" not in result:
+        logger.info(f"[{call_id}] LLM CALL COMPLETED SUCCESSFULLY ({route['model']}, {route['seconds']:.2f}s)")
+        logger.info("=" * 70)
+    return result
+
+
+# Identical concurrent requests (e.g. many patients sending the same text
+# during an outbreak) share one Gemini call
+llm_flight = SingleFlight("llm")
+
+
+async def call_llm_shared(symptom_text: str, image_bytes: bytes = None, history: str = None) -> dict:
+    """
+    call_llm in a worker thread, coalesced with identical in-flight requests
+
+    The key covers everything that shapes the answer: prompt version,
+    normalized symptom text, image hash and visit history. Valid answers
+    are also kept in the "triage" cache namespace, shared across workers.
+    """
+    key = flight_key(
+        get_template().version,
+        normalize_text(symptom_text).casefold(),
+        hashlib.sha256(image_bytes).hexdigest() if image_bytes else "",
+        history or ""
+    )
+    cached = await cache.aget("triage", key)
+    if cached is not None:
+        return cached
+
+    async def fetch():
+        result = await asyncio.to_thread(call_llm, symptom_text, image_bytes, history)
+        if "error" not in result:
+            await cache.aset("triage", key, result)
+        return result
+
+    return await llm_flight.do(key, fetch)
+
+
+def _generate(model_name: str, content: list, call_id: str) -> Attempt:
+    """
+    One Gemini call on one router tier: generate, then parse and validate
+    
+    Returns:
+        Attempt with the parsed response (or an error dict), duration and token counts
+    """
+    logger.debug(f"[{call_id}] Calling Gemini API ({model_name})")
     logger.debug(f"[{call_id}] Content items to send: {len(content)}")
     
+    prompt_tokens = output_tokens = 0
+    start_time = datetime.now()
     try:
-        logger.info(f"[{call_id}] 🧠 Sending request to Gemini...")
-        start_time = datetime.now()
+        logger.info(f"[{call_id}] 🧠 Sending request to {model_name}...")
         
-        response = model.generate_content(content)
+        response = triage_models[model_name].get().generate_content(
+            content, request_options=LLM_REQUEST_OPTIONS
+        )
         
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         
-        logger.info(f"[{call_id}] ✓ Response received from Gemini")
+        logger.info(f"[{call_id}] ✓ Response received from {model_name}")
         logger.debug(f"[{call_id}] Response time: {duration:.2f} seconds")
         
-        # Step 4: Parse response
-        logger.debug(f"[{call_id}] Step 4: Parsing JSON Response")
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = usage.prompt_token_count or 0
+            output_tokens = usage.candidates_token_count or 0
+            llm_stats["calls"] += 1
+            llm_stats["prompt_tokens"] += usage.prompt_token_count or 0
+            llm_stats["output_tokens"] += usage.candidates_token_count or 0
+            llm_stats["cached_tokens"] += getattr(usage, "cached_content_token_count", 0) or 0
+            logger.info(
+                f"[{call_id}] Tokens: prompt {usage.prompt_token_count} "
+                f"(cached {getattr(usage, 'cached_content_token_count', 0) or 0}), "
+                f"output {usage.candidates_token_count}, total {usage.total_token_count}"
+            )
+        
+        logger.debug(f"[{call_id}] Parsing JSON Response")
         
         if not response.text:
             logger.error(f"[{call_id}] ❌ Empty response text received")
-            return {
+            return Attempt({
                 "error": "Empty response from AI",
                 "raw_error": "Response text was empty or None"
-            }
+            }, duration, prompt_tokens, output_tokens)
         
         logger.debug(f"[{call_id}] Response text length: {len(response.text)} chars")
         logger.debug(f"[{call_id}] Raw response preview: {response.text[:200]}...")
         
-        # Since we used 'response_mime_type': 'application/json', 
-        # response.text is GUARANTEED to be valid JSON.
-        parsed_response = json.loads(response.text)
-        
-        logger.info(f"[{call_id}] ✓ JSON parsed successfully")
-        logger.debug(f"[{call_id}] Parsed keys: {list(parsed_response.keys())}")
-        
-        # Validate expected fields
-        expected_fields = ['risk', 'doctor_summary', 'advice']
-        missing_fields = [f for f in expected_fields if f not in parsed_response]
+        # response_schema constrains generation; parsing and validation
+        # (risk enum, required non-empty fields) is one compiled pass
+        parse_started = time.perf_counter()
+        parsed_response = parse_triage_result(response.text)
+        parse_ms = (time.perf_counter() - parse_started) * 1000
+        llm_stats["validated"] += 1
+        llm_stats["parse_ms_total"] += parse_ms
         
-        if missing_fields:
-            logger.warning(f"[{call_id}] ⚠️ Missing expected fields: {missing_fields}")
-        else:
-            logger.debug(f"[{call_id}] ✓ All expected fields present")
+        logger.info(f"[{call_id}] ✓ Response parsed and validated ({parse_ms:.3f} ms)")
         
         # Log field contents
         logger.debug(f"[{call_id}] Response Fields:")
@@ -179,20 +426,18 @@ def call_llm(symptom_text: str, image_bytes: bytes = None):
             else:
                 logger.debug(f"[{call_id}]   - {key}: {value}")
         
-        logger.info(f"[{call_id}] LLM CALL COMPLETED SUCCESSFULLY")
-        logger.info("=" * 70)
-        
-        return parsed_response
+        return Attempt(parsed_response, duration, prompt_tokens, output_tokens)
 
-    except json.JSONDecodeError as e:
-        logger.error(f"[{call_id}] ❌ JSON parsing failed: {str(e)}")
+    except ValidationError as e:
+        llm_stats["invalid_outputs"] += 1
+        logger.error(f"[{call_id}] ❌ Response failed schema validation: {e.error_count()} error(s)")
         logger.error(f"[{call_id}] Raw response text: {response.text}")
-        logger.exception(e)
-        return {
-            "error": "Failed to parse AI response as JSON", 
+        logger.debug(f"[{call_id}] Validation errors: {e.errors(include_url=False)}")
+        return Attempt({
+            "error": "AI response failed schema validation", 
             "raw_error": str(e),
             "raw_text": response.text[:500] if hasattr(response, 'text') else "No text"
-        }
+        }, duration, prompt_tokens, output_tokens)
         
     except Exception as e:
         logger.error(f"[{call_id}] ❌ LLM call failed: {str(e)}")
@@ -200,11 +445,11 @@ def call_llm(symptom_text: str, image_bytes: bytes = None):
         logger.exception(e)
         
         # FAIL SAFE: Must be a DICT, not a Set
-        return {
+        return Attempt({
             "error": "Failed to fetch the details", 
             "raw_error": str(e),
             "exception_type": type(e).__name__
-        }
+        }, (datetime.now() - start_time).total_seconds(), prompt_tokens, output_tokens)
 
 
 # ==================== MODULE INITIALIZATION COMPLETE ====================
@@ -1,8 +1,10 @@
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from contextlib import asynccontextmanager
+from pydantic import BaseModel
+from typing import List, Optional
 from llm import call_llm
-import httpx
+from google_translator import google_translator
 import os
 from dotenv import load_dotenv
 import logging
@@ -21,10 +23,20 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks for shared resources"""
+    yield
+    # Release pooled upstream connections
+    await google_translator.aclose()
+
+
 app = FastAPI(
     title="NIDAAN-AI Medical Triage API",
     description="AI-powered medical triage system for rural India",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS for frontend integration
@@ -162,24 +174,15 @@ async def analyze(
     # 6. Safe variable extraction with defaults
     logger.debug(f"[{request_id}] Step 6: Extracting Response Fields")
     doc_sum = result.get('doctor_summary', 'No detailed summary available')
-    risk_level = result.get('risk', 'MODERATE').upper()
+    risk_level = result['risk']  # validated against the response schema in call_llm
     advice_text = result.get('advice', 'Please consult a medical professional.')
     
     logger.debug(f"[{request_id}] Extracted Risk Level: {risk_level}")
     logger.debug(f"[{request_id}] Summary Length: {len(doc_sum)} chars")
     logger.debug(f"[{request_id}] Advice Length: {len(advice_text)} chars")
 
-    # 7. Validate risk level
-    logger.debug(f"[{request_id}] Step 7: Risk Level Validation")
-    valid_risks = ["LOW", "MODERATE", "HIGH"]
-    if risk_level not in valid_risks:
-        logger.warning(f"[{request_id}] ⚠️ Invalid risk level '{risk_level}', defaulting to MODERATE")
-        risk_level = "MODERATE"
-    else:
-        logger.debug(f"[{request_id}] ✓ Valid risk level: {risk_level}")
-
-    # 8. Construct formatted doctor summary
-    logger.debug(f"[{request_id}] Step 8: Formatting Final Response")
+    # 7. Construct formatted doctor summary
+    logger.debug(f"[{request_id}] Step 7: Formatting Final Response")
     doctor_summary = f"""
 AI TRIAGE SUMMARY
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -247,55 +250,34 @@ async def send_whatsapp(
     }
 
 
+class TranslateRequest(BaseModel):
+    texts: List[str]
+    target_language: str = "hi"
+
+
 @app.post("/translate")
-async def translate_to_hindi(text: str = Form(...)):
+async def translate_texts(payload: TranslateRequest):
     """
-    Optional: Translate medical advice to Hindi using external API
-    Uses httpx for async HTTP requests
+    Translate a batch of texts (e.g. report sections) using Google Translate
+    Repeated strings are deduplicated and served from cache, so a whole
+    report costs a single round trip
     """
     
     request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     logger.info(f"[{request_id}] Translation Request")
-    logger.debug(f"[{request_id}] Text to translate: {text[:100]}...")
-    
-    # Example: Google Translate API or custom translation service
-    translate_api_url = "https://translation.googleapis.com/language/translate/v2"
+    logger.debug(f"[{request_id}] Texts: {len(payload.texts)}, target: {payload.target_language}")
     
     try:
         logger.debug(f"[{request_id}] Calling Google Translate API...")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                translate_api_url,
-                params={
-                    "key": os.getenv("GOOGLE_TRANSLATE_API_KEY", ""),
-                    "q": text,
-                    "target": "hi",
-                    "format": "text"
-                },
-                timeout=10.0
-            )
-            
-            logger.debug(f"[{request_id}] Translation API Status: {response.status_code}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                translated_text = data['data']['translations'][0]['translatedText']
-                logger.info(f"[{request_id}] ✓ Translation successful")
-                return {
-                    "success": True,
-                    "original": text,
-                    "translated": translated_text,
-                    "language": "hindi",
-                    "request_id": request_id
-                }
-            else:
-                logger.warning(f"[{request_id}] Translation API error: {response.status_code}")
-                return {
-                    "success": False,
-                    "error": "Translation service unavailable",
-                    "original": text,
-                    "request_id": request_id
-                }
+        result = await google_translator.translate_batch(payload.texts, payload.target_language)
+        logger.info(f"[{request_id}] ✓ Translation successful ({result['cache_hits']} cache hits)")
+        return {
+            "success": True,
+            "original": payload.texts,
+            "translated": result["translations"],
+            "language": result["target_language"],
+            "request_id": request_id
+        }
                 
     except Exception as e:
         logger.error(f"[{request_id}] Translation failed: {str(e)}")
@@ -303,7 +285,8 @@ async def translate_to_hindi(text: str = Form(...)):
         return {
             "success": False,
             "error": str(e),
-            "original": text,
+            "original": payload.texts,
+            "translated": payload.texts,
             "note": "Fallback to original text",
             "request_id": request_id
         }
@@ -1,36 +1,102 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Optional
-from llm import call_llm
-from sarvam_translator import bidirectional_translate, translate_to_english
-import httpx
-import os
-from dotenv import load_dotenv
 import logging
-from datetime import datetime, timedelta
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
-import hashlib
-import json
+from logging.handlers import TimedRotatingFileHandler
 
 # ==================== SETUP LOGGING ====================
+# Configured before the app modules are imported: llm.py calls basicConfig
+# at import time, which would otherwise leave only a console handler (and
+# force=True replaces that one if llm was imported first anyway)
 logging.basicConfig(
     level=logging.DEBUG,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('nidaan_debug.log'),
+        # Daily files (nidaan_debug.log.YYYY-MM-DD) so retention can drop whole days
+        TimedRotatingFileHandler('nidaan_debug.log', when='midnight', encoding='utf-8'),
         logging.StreamHandler()
-    ]
+    ],
+    force=True
 )
+
+from fastapi import FastAPI, Request, UploadFile, File, Form, Header, HTTPException, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from pydantic import BaseModel
+from typing import List, Optional
+from llm import call_llm_shared, close_models, gemini_circuit, llm_flight, llm_stats_snapshot, model_router
+from llm import warm_up as warm_up_gemini
+from sarvam_translator import bidirectional_translate, translate_to_english, translate_from_english, translator
+from whatsapp_queue import WhatsAppQueue
+from outbox import Outbox
+from anonymizer import anonymize
+from emergency import find_emergency_keywords
+from audit_store import AuditStore
+from consent_registry import ConsentRegistry
+from history_store import HistoryStore
+from risk_classifier import RiskClassifier, TrainingLog
+from offline_triage import OfflineTriage
+from reanalysis_queue import ReanalysisQueue
+from schemas import RISK_LEVELS, AnalyzeResponse, ConsentResponse, HistoryPage, ReanalysisStatus, compact_analyze
+from serialization import FastJSONResponse, StaticBody
+from compression import CompressionMiddleware, snapshot as compression_snapshot
+from static_assets import StaticAssets
+from image_policy import upload_policy, snapshot as image_snapshot
+from retention import RetentionSweeper, DailyFilePartitions, RowPurge
+from write_behind import DEAD_LETTER_DIR, QueueFull
+from metrics import registry as metrics
+from cache_backend import cache
+from warmup import Warmer
+import httpx
+import os
+from dotenv import load_dotenv
+from datetime import datetime, timedelta
+from twilio.rest import Client
+import hashlib
+import hmac
+import asyncio
+import uuid
+import time
+
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and drain background subsystems"""
+    await audit_store.start()
+    await consent_registry.start()
+    await history_store.start()
+    await risk_training_log.start()
+    await reanalysis_queue.start()
+    if whatsapp_queue:
+        await whatsapp_queue.start()
+    await retention_sweeper.start()
+    await warmer.start()
+    # Precompress and fingerprint the frontend (AVIF encoding takes a moment)
+    await asyncio.to_thread(static_assets.build)
+    yield
+    await warmer.stop()
+    await retention_sweeper.stop()
+    if whatsapp_queue:
+        await whatsapp_queue.stop()
+    await reanalysis_queue.stop()
+    await risk_training_log.stop()
+    await history_store.stop()
+    await consent_registry.stop()
+    await audit_store.stop()
+    await translator.aclose()
+    await asyncio.to_thread(close_models)
+    cache.close()
+
+
 app = FastAPI(
     title="NIDAAN-AI Medical Triage API",
     description="AI-powered medical triage system with multi-language support and healthcare compliance",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    # orjson rendering for every endpoint (see serialization.py)
+    default_response_class=FastJSONResponse
 )
 
 # Enable CORS for frontend integration
@@ -41,6 +107,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# brotli/gzip for responses above COMPRESSION_MIN_BYTES (see compression.py)
+app.add_middleware(CompressionMiddleware)
+
+# Endpoints whose latency is tracked in /metrics
+TIMED_PATHS = {"/analyze", "/consent", "/history", "/send-whatsapp", "/send-whatsapp/bulk"}
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    """Feed request durations of the main endpoints into /metrics"""
+    started = time.perf_counter()
+    response = await call_next(request)
+    if request.url.path in TIMED_PATHS:
+        metrics.latency(request.url.path).observe(time.perf_counter() - started)
+    return response
 
 logger.info("=" * 70)
 logger.info("NIDAAN-AI Backend Server Starting...")
@@ -67,9 +148,233 @@ else:
     twilio_client = None
     TWILIO_ENABLED = False
 
+
+def send_twilio_whatsapp(to: str, body: str) -> str:
+    """Blocking Twilio send, executed by the queue workers in an executor"""
+    message = twilio_client.messages.create(
+        from_=TWILIO_WHATSAPP_NUMBER,
+        body=body,
+        to=to
+    )
+    return message.sid
+
+
+def on_whatsapp_result(job: dict):
+    """Audit final delivery outcome of a queued WhatsApp job"""
+    phone_prefix = job["recipient"].replace("whatsapp:+", "")[:4]
+    log_audit_trail("whatsapp_" + job["status"], job["request_id"], {"phone": phone_prefix}, job["status"])
+
+
+whatsapp_queue = (
+    WhatsAppQueue(send_twilio_whatsapp, Outbox(), on_result=on_whatsapp_result)
+    if TWILIO_ENABLED else None
+)
+
+
+def _probe_twilio():
+    """Account lookup over the Twilio client's pooled session (sends nothing)"""
+    twilio_client.api.v2010.accounts(TWILIO_ACCOUNT_SID).fetch()
+
+
+# Connections are opened during startup and kept warm while idle, so the
+# first request after a deploy or a quiet night skips channel setup and TLS
+warmer = Warmer()
+warmer.add("gemini", lambda: asyncio.to_thread(warm_up_gemini), last_used=lambda: gemini_circuit.last_success)
+if translator.enabled:
+    warmer.add("sarvam", translator.warm_up, last_used=lambda: translator.circuit.last_success)
+if TWILIO_ENABLED:
+    warmer.add("twilio", lambda: asyncio.to_thread(_probe_twilio))
+
+# Upper bound on recipients accepted by one /send-whatsapp/bulk call
+MAX_BULK_RECIPIENTS = 1000
+
+
+def format_whatsapp_number(phone_number: str) -> str:
+    """
+    Normalize a user-entered phone number to Twilio's WhatsApp address format
+    """
+    clean_phone = ''.join(filter(str.isdigit, phone_number))
+    if not clean_phone.startswith('91') and len(clean_phone) == 10:
+        clean_phone = '91' + clean_phone
+    return f"whatsapp:+{clean_phone}"
+
 # ==================== DATA RETENTION SETTINGS ====================
 DATA_RETENTION_DAYS = 90  # DISHA Act compliance
 CONSENT_REQUIRED = True  # ABDM compliance
+# When set, /analyze only accepts consent recorded via /consent (user_id required)
+CONSENT_REGISTRY_ONLY = os.getenv("CONSENT_REGISTRY_ONLY", "0") == "1"
+
+# Append-only audit store (data/audit), separate from nidaan_debug.log
+audit_store = AuditStore()
+consent_registry = ConsentRegistry(shared=cache)
+# Per-patient triage records (data/history.db) for repeat visits
+history_store = HistoryStore()
+MAX_HISTORY_PAGE = 100
+# Local first-pass risk model (None until trained: python nidaan.py risk-train)
+risk_classifier = RiskClassifier.load()
+# Anonymized (english_symptoms, risk) pairs from the LLM, the classifier's training data
+risk_training_log = TrainingLog()
+# Advice used when the risk comes from the local model instead of the LLM
+LOW_RISK_ADVICE = (
+    "Rest, drink plenty of fluids and watch your symptoms. "
+    "See a doctor if they get worse or last more than 3 days."
+)
+FALLBACK_ADVICE = {
+    "LOW": LOW_RISK_ADVICE,
+    "MODERATE": "Please consult a medical professional within 24 hours.",
+    "HIGH": "Please seek medical attention immediately. Call 108 in an emergency."
+}
+
+# ==================== STATIC RESPONSES ====================
+# Fixed payloads are encoded once here; handlers send the bytes and only
+# encode their per-request fields (see serialization.StaticBody)
+EMERGENCY_CONTACTS = {"ambulance": "108", "police": "100", "fire": "101"}
+EMERGENCY_SUMMARY = "⚠️ EMERGENCY: Severe symptoms detected requiring IMMEDIATE medical attention."
+EMERGENCY_ADVICE = "🚨 CALL 108 NOW or visit nearest emergency room immediately. Do not delay."
+
+CONSENT_REQUIRED_BODY = StaticBody({
+    "risk": "ERROR",
+    "doctor_summary": "Consent required to proceed",
+    "advice": "Please accept the terms and conditions to use this service.",
+    "status": "consent_required"
+}, compact=compact_analyze)
+INCOMPLETE_INPUT_BODY = StaticBody({
+    "risk": "LOW",
+    "doctor_summary": "Insufficient symptom detail provided.",
+    "advice": "Please add more details for better guidance.",
+    "status": "incomplete_input"
+}, compact=compact_analyze)
+PARTIAL_FAILURE_BODY = StaticBody({
+    "risk": "MODERATE",
+    "doctor_summary": "Analysis incomplete",
+    "advice": "Please consult a medical professional.",
+    "status": "ai_partial_failure"
+}, compact=compact_analyze)
+# English emergency answer; debug_keywords is added per request
+EMERGENCY_BODY = StaticBody({
+    "risk": "HIGH",
+    "doctor_summary": EMERGENCY_SUMMARY,
+    "advice": EMERGENCY_ADVICE,
+    "status": "emergency_detected",
+    "emergency_contacts": EMERGENCY_CONTACTS
+}, compact=compact_analyze)
+ROOT_BODY = StaticBody({
+    "status": "healthy",
+    "service": "NIDAAN-AI Triage API",
+    "version": "2.0.0",
+    "features": {
+        "whatsapp": TWILIO_ENABLED,
+        "multilanguage": True,
+        "compliance": {
+            "abdm_ready": True,
+            "disha_compliant": True,
+            "data_retention_days": DATA_RETENTION_DAYS
+        }
+    },
+    "disclaimer": "AI-assisted triage. Not a substitute for professional medical advice."
+})
+HEALTH_FEATURES = {
+    "whatsapp": TWILIO_ENABLED,
+    "multilanguage": True,
+    "languages": ["English", "हिंदी", "தமிழ்", "తెలుగు", "मराठी", "ಕನ್ನಡ"]
+}
+# Image budget clients downscale to before upload (see image_policy.py)
+UPLOAD_POLICY_BODY = StaticBody(upload_policy())
+# Web frontend, served same-origin under /app/ and /assets/ (see static_assets.py)
+static_assets = StaticAssets()
+
+# ==================== OFFLINE MODE ====================
+# Time budget for one /analyze call (a client may send a shorter X-Deadline-Ms)
+ANALYZE_DEADLINE_SECONDS = float(os.getenv("ANALYZE_DEADLINE_SECONDS", "30"))
+# Below this much remaining time the LLM is not attempted at all
+OFFLINE_MIN_LLM_SECONDS = float(os.getenv("OFFLINE_MIN_LLM_SECONDS", "3"))
+# Rule-based triage used when Gemini is unreachable or the deadline is short
+offline_triage = OfflineTriage()
+
+
+async def reanalyze(row: dict) -> dict:
+    """
+    Full online triage of a request that was answered offline
+    Raises on failure so the queue retries it later
+    """
+    english_symptoms = row["symptom_text"]
+    if row["user_language"] != "English":
+        translation_result = await translate_to_english(english_symptoms, row["user_language"])
+        if not translation_result.get("success"):
+            raise RuntimeError(f"Translation failed: {translation_result.get('error')}")
+        english_symptoms = translation_result.get("translated_text", english_symptoms)
+
+    # Images are not kept, so the re-analysis is text-only
+    result = await call_llm_shared(english_symptoms)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+    if row["user_id"]:
+        record_history(
+            row["user_id"], row["request_id"], result["risk"],
+            anonymize_data(result["doctor_summary"]), anonymize_data(result["advice"]), row["user_language"]
+        )
+    log_audit_trail(
+        "reanalysis_complete", row["request_id"],
+        {"risk": result["risk"], "offline_risk": row["offline_risk"]}, "success"
+    )
+    return result
+
+
+# Offline answers (anonymized text) are re-run once Gemini is reachable again
+reanalysis_queue = ReanalysisQueue(reanalyze, ready=lambda: not gemini_circuit.is_open())
+
+
+def _forget_audit_segment(path: str):
+    if path.endswith(".seg"):
+        audit_store.forget_segment(path)
+
+
+# Every store registers how its expired data is dropped
+retention_sweeper = RetentionSweeper(DATA_RETENTION_DAYS)
+retention_sweeper.add_partitions(DailyFilePartitions(
+    "audit", audit_store.directory, r"audit-(\d{8})-(?:\d+-)?\d{4}\.(?:seg|idx)", on_drop=_forget_audit_segment
+))
+retention_sweeper.add_partitions(DailyFilePartitions(
+    "debug_log", ".", r"nidaan_debug\.log\.(\d{4}-\d{2}-\d{2})", date_format="%Y-%m-%d"
+))
+retention_sweeper.add_partitions(DailyFilePartitions(
+    "risk_training", risk_training_log.directory, r"risk-pairs-(\d{8})\.jsonl"
+))
+retention_sweeper.add_partitions(DailyFilePartitions(
+    "dead_letter", DEAD_LETTER_DIR, r"[a-z_]+-(\d{8})\.jsonl"
+))
+retention_sweeper.add_rows(RowPurge("consent", consent_registry.purge_expired))
+retention_sweeper.add_rows(RowPurge("triage_history", history_store.purge_before))
+retention_sweeper.add_rows(RowPurge("reanalysis", reanalysis_queue.purge_before))
+
+# Write-behind queues keep storage off the request path; their depth,
+# drops and rejections are the first thing to check under load
+metrics.register("write_behind", lambda: {
+    q.name: q.snapshot() for q in (
+        audit_store.writes, consent_registry.writes, history_store.writes, risk_training_log.writes
+    )
+})
+metrics.register("consent_cache", lambda: dict(consent_registry.stats))
+metrics.register("llm", llm_stats_snapshot)
+metrics.register("model_router", model_router.snapshot)
+metrics.register("warmup", warmer.snapshot)
+metrics.register("cache", cache.snapshot)
+metrics.register("compression", compression_snapshot)
+metrics.register("static_assets", static_assets.snapshot)
+metrics.register("images", image_snapshot)
+metrics.register("single_flight", lambda: {
+    "llm": llm_flight.snapshot(), "sarvam": translator.flight.snapshot()
+})
+metrics.register("offline", lambda: {
+    "triage": offline_triage.snapshot(),
+    "circuits": {"gemini": gemini_circuit.snapshot(), "sarvam": translator.circuit.snapshot()},
+    "reanalysis": reanalysis_queue.snapshot()
+})
+if risk_classifier:
+    metrics.register("risk_classifier", risk_classifier.snapshot)
+if whatsapp_queue:
+    retention_sweeper.add_rows(RowPurge("whatsapp_outbox", whatsapp_queue.outbox.purge_before))
 
 logger.info("=" * 70)
 
@@ -77,16 +382,9 @@ logger.info("=" * 70)
 def anonymize_data(text: str) -> str:
     """
     Anonymize personal information for privacy compliance
+    (phones, emails, Aadhaar, ABHA, PAN, vehicle numbers, PIN codes)
     """
-    # Remove phone numbers (basic pattern)
-    import re
-    text = re.sub(r'\b\d{10}\b', '[PHONE]', text)
-    text = re.sub(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', '[PHONE]', text)
-    
-    # Remove email addresses
-    text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]', text)
-    
-    return text
+    return anonymize(text)
 
 
 def log_audit_trail(
@@ -97,41 +395,122 @@ def log_audit_trail(
 ):
     """
     Audit logging for compliance (DISHA Act requirement)
+    Buffered in memory and flushed to audit segments in the background
     """
-    audit_entry = {
-        "timestamp": datetime.now().isoformat(),
+    audit_store.append({
+        "ts": time.time(),
         "action": action,
         "request_id": request_id,
-        "user_hash": hashlib.sha256(str(user_data).encode()).hexdigest()[:16],
+        "user_hash": hashlib.blake2b(repr(user_data).encode(), digest_size=8).hexdigest(),
         "status": status
+    })
+
+
+def record_history(user_id: str, request_id: str, risk: str, summary: str, advice: str, lang: str):
+    """
+    Queue a triage record for the patient's history
+    Best effort: a saturated history queue must not fail the triage itself
+    """
+    try:
+        history_store.record(user_id, request_id, risk, summary, advice, lang)
+    except QueueFull as e:
+        logger.warning(f"[{request_id}] ⚠️ Triage history not recorded: {e}")
+
+
+async def offline_response(
+    request_id: str,
+    symptom_text: str,
+    user_language: str,
+    english_symptoms: Optional[str],
+    risk_prediction: Optional[dict],
+    reason: str,
+    user_id: Optional[str] = None,
+    has_image: bool = False
+) -> dict:
+    """
+    Answer from the offline rule engine and queue the request for a full
+    re-analysis; no network calls, the answer is already in the user's language
+    """
+    fallback_risk = risk_classifier.fallback_risk(risk_prediction) if risk_prediction else None
+    result = offline_triage.triage(symptom_text, user_language, english_symptoms, fallback_risk)
+    logger.warning(
+        f"[{request_id}] 📴 Offline triage ({reason}): {result['risk']} "
+        f"matched {result['matched'] or 'nothing'}"
+    )
+
+    reanalysis = "queued"
+    try:
+        await asyncio.to_thread(
+            reanalysis_queue.enqueue, request_id, anonymize_data(symptom_text), user_language,
+            result["risk"], reason, user_id, has_image
+        )
+    except Exception as e:
+        logger.error(f"[{request_id}] ⚠️ Re-analysis not queued: {str(e)}")
+        reanalysis = "unavailable"
+
+    log_audit_trail("analyze_offline", request_id, {"risk": result["risk"], "reason": reason}, "offline")
+
+    response = {
+        "risk": result["risk"],
+        "doctor_summary": f"{result['doctor_summary']}\n\n{result['notice']}",
+        "advice": result["advice"],
+        "status": "offline_triage",
+        "request_id": request_id,
+        "user_language": user_language,
+        "whatsapp_enabled": TWILIO_ENABLED,
+        "translation_used": False,
+        "offline": {
+            "reason": reason,
+            "matched": result["matched"],
+            "reanalysis": reanalysis
+        },
+        "compliance": {
+            "data_retention_days": DATA_RETENTION_DAYS,
+            "anonymized": True,
+            "audit_logged": True
+        }
     }
-    
-    # In production, save to secure audit database
-    logger.info(f"AUDIT: {json.dumps(audit_entry)}")
+    if result["emergency"]:
+        response["emergency_contacts"] = EMERGENCY_CONTACTS
+    return response
+
+
+def analyze_reply(response: dict, compact: bool):
+    """
+    The /analyze response, or its short-key form for ?compact=1
+    The compact form is sent directly: it does not match AnalyzeResponse.
+    """
+    return FastJSONResponse(compact_analyze(response)) if compact else response
 
 
 @app.get("/")
 async def root():
     """Health check endpoint with feature flags"""
     logger.debug("Root endpoint accessed")
-    return {
-        "status": "healthy",
-        "service": "NIDAAN-AI Triage API",
-        "version": "2.0.0",
-        "features": {
-            "whatsapp": TWILIO_ENABLED,
-            "multilanguage": True,
-            "compliance": {
-                "abdm_ready": True,
-                "disha_compliant": True,
-                "data_retention_days": DATA_RETENTION_DAYS
-            }
-        },
-        "disclaimer": "AI-assisted triage. Not a substitute for professional medical advice."
-    }
+    return ROOT_BODY.response()
+
+
+@app.get("/upload-policy")
+async def get_upload_policy():
+    """
+    Image size budget for /analyze uploads
+    Photos downscaled to this as JPEG/WebP go to Gemini without re-encoding.
+    """
+    return UPLOAD_POLICY_BODY.response()
+
+
+@app.get("/app/", include_in_schema=False)
+@app.get("/app/{page}", include_in_schema=False)
+@app.get("/assets/{path:path}", include_in_schema=False)
+async def frontend(request: Request):
+    """Web frontend: pages revalidated via ETag, fingerprinted assets cached as immutable"""
+    response = static_assets.response(request.url.path, request)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return response
 
 
-@app.post("/consent")
+@app.post("/consent", response_model=ConsentResponse)
 async def record_consent(
     user_id: str = Form(...),
     consent_type: str = Form(...),  # data_collection, data_sharing, whatsapp_sharing
@@ -143,17 +522,19 @@ async def record_consent(
     request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     logger.info(f"[{request_id}] Consent recording: {consent_type} = {consent_given}")
     
-    consent_record = {
-        "user_id": hashlib.sha256(user_id.encode()).hexdigest()[:16],
-        "consent_type": consent_type,
-        "consent_given": consent_given,
-        "timestamp": datetime.now().isoformat(),
-        "ip_address": "anonymized",  # In production, get from request
-        "expires_at": (datetime.now() + timedelta(days=365)).isoformat()
-    }
-    
-    # In production, save to database
-    logger.info(f"CONSENT: {json.dumps(consent_record)}")
+    # Persisted by the consent registry (batched), visible to checks immediately
+    try:
+        consent_record = await consent_registry.record_async(user_id, consent_type, consent_given)
+    except QueueFull as e:
+        # Backpressure: consent must never be dropped, so ask the client to retry
+        logger.warning(f"[{request_id}] ⚠️ Consent not recorded: {e}")
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": "1"},
+            content={"success": False, "message": "Server busy, please retry", "consent_id": request_id}
+        )
+    log_audit_trail("consent_recorded", request_id, {"consent": consent_type}, str(consent_given).lower())
+    logger.debug(f"[{request_id}] Consent stored for user {consent_record['user_id']}")
     
     return {
         "success": True,
@@ -162,18 +543,35 @@ async def record_consent(
     }
 
 
-@app.post("/analyze")
+@app.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(
     symptom_text: str = Form(...),
     user_language: str = Form("English"),
     image: Optional[UploadFile] = File(None),
-    consent_given: bool = Form(False)
+    consent_given: bool = Form(False),
+    user_id: Optional[str] = Form(None),
+    include_history: bool = Form(False),
+    x_deadline_ms: Optional[int] = Header(None),
+    compact: bool = Query(False)
 ):
     """
     Main triage endpoint with multi-language support and compliance
+    Consent is looked up in the consent registry when user_id is sent;
+    the consent_given flag is only honoured for legacy clients.
+    With user_id, results are kept in the triage history; include_history
+    feeds a short summary of the last visits to the LLM.
+    When Gemini is unreachable or too little of the deadline (X-Deadline-Ms
+    header, default ANALYZE_DEADLINE_SECONDS) is left, the offline rule
+    engine answers and the request is queued for re-analysis.
+    ?compact=1 returns the short-key form (schemas.COMPACT_KEYS) for
+    low-bandwidth clients.
     """
     
     request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    deadline_seconds = ANALYZE_DEADLINE_SECONDS
+    if x_deadline_ms and x_deadline_ms > 0:
+        deadline_seconds = min(deadline_seconds, x_deadline_ms / 1000)
+    deadline = time.monotonic() + deadline_seconds
     logger.info("=" * 70)
     logger.info(f"NEW ANALYSIS REQUEST - ID: {request_id}")
     logger.info(f"User Language: {user_language}")
@@ -183,15 +581,14 @@ async def analyze(
     log_audit_trail("analyze_request", request_id, {"lang": user_language}, "started")
     
     # Check consent (ABDM requirement)
-    if CONSENT_REQUIRED and not consent_given:
+    if user_id:
+        has_consent = await consent_registry.check_async(user_id, "data_collection")
+    else:
+        has_consent = consent_given and not CONSENT_REGISTRY_ONLY
+    
+    if CONSENT_REQUIRED and not has_consent:
         logger.warning(f"[{request_id}] ⚠️ Consent not provided")
-        return {
-            "risk": "ERROR",
-            "doctor_summary": "Consent required to proceed",
-            "advice": "Please accept the terms and conditions to use this service.",
-            "status": "consent_required",
-            "request_id": request_id
-        }
+        return CONSENT_REQUIRED_BODY.response(compact=compact, request_id=request_id)
     
     # 1. Input validation
     logger.debug(f"[{request_id}] Step 1: Input Validation")
@@ -200,12 +597,7 @@ async def analyze(
     
     if len(symptom_text.strip()) < 5:
         logger.warning(f"[{request_id}] ⚠️ Insufficient symptom detail")
-        return {
-            "risk": "LOW",
-            "doctor_summary": "Insufficient symptom detail provided.",
-            "advice": "Please add more details for better guidance.",
-            "status": "incomplete_input"
-        }
+        return INCOMPLETE_INPUT_BODY.response(compact=compact)
     
     # 2. Anonymize data (DISHA Act compliance)
     logger.debug(f"[{request_id}] Step 2: Data Anonymization")
@@ -240,47 +632,44 @@ async def analyze(
     
     # 4. Emergency keyword check
     logger.debug(f"[{request_id}] Step 4: Emergency Keyword Check")
-    urgent_keywords = [
-        "chest pain", "breathless", "unconscious", "bleeding heavily",
-        "severe headache", "can't breathe", "heart attack", "stroke",
-        "poisoning", "severe burn", "seizure", "suicide", "overdose"
-    ]
-    
-    symptom_lower = english_symptoms.lower()
-    found_urgent = [kw for kw in urgent_keywords if kw in symptom_lower]
+    found_urgent = find_emergency_keywords(english_symptoms)
     
     if found_urgent:
         logger.warning(f"[{request_id}] 🚨 EMERGENCY KEYWORDS DETECTED: {found_urgent}")
         log_audit_trail("emergency_detected", request_id, {"keywords": found_urgent}, "alert")
+        if user_id:
+            record_history(
+                user_id, request_id, "HIGH",
+                f"Emergency keywords detected: {', '.join(found_urgent)}",
+                "Call 108 / visit emergency room", user_language
+            )
+        
+        if user_language == "English":
+            return EMERGENCY_BODY.response(compact=compact, debug_keywords=found_urgent)
         
         emergency_response = {
             "risk": "HIGH",
-            "doctor_summary": "⚠️ EMERGENCY: Severe symptoms detected requiring IMMEDIATE medical attention.",
-            "advice": "🚨 CALL 108 NOW or visit nearest emergency room immediately. Do not delay.",
+            "doctor_summary": EMERGENCY_SUMMARY,
+            "advice": EMERGENCY_ADVICE,
             "status": "emergency_detected",
             "debug_keywords": found_urgent,
-            "emergency_contacts": {
-                "ambulance": "108",
-                "police": "100",
-                "fire": "101"
-            }
+            "emergency_contacts": EMERGENCY_CONTACTS
         }
         
-        # Translate emergency response if needed
-        if user_language != "English":
-            try:
-                from sarvam_translator import translate_from_english
-                trans = await translate_from_english(emergency_response["doctor_summary"], user_language)
-                if trans.get("success"):
-                    emergency_response["doctor_summary"] = trans.get("translated_text")
-                
-                trans = await translate_from_english(emergency_response["advice"], user_language)
-                if trans.get("success"):
-                    emergency_response["advice"] = trans.get("translated_text")
-            except:
-                pass  # Keep English if translation fails
+        # Translate emergency response
+        try:
+            from sarvam_translator import translate_from_english
+            trans = await translate_from_english(emergency_response["doctor_summary"], user_language)
+            if trans.get("success"):
+                emergency_response["doctor_summary"] = trans.get("translated_text")
+            
+            trans = await translate_from_english(emergency_response["advice"], user_language)
+            if trans.get("success"):
+                emergency_response["advice"] = trans.get("translated_text")
+        except:
+            pass  # Keep English if translation fails
         
-        return emergency_response
+        return analyze_reply(emergency_response, compact)
 
     # 5. Process image if provided
     logger.debug(f"[{request_id}] Step 5: Image Processing")
@@ -292,42 +681,105 @@ async def analyze(
         except Exception as e:
             logger.error(f"[{request_id}] ⚠️ Image read error: {str(e)}")
 
-    # 6. Call Gemini AI for analysis
-    logger.debug(f"[{request_id}] Step 6: Calling Gemini AI")
+    # 6. Local risk model: clearly LOW text-only complaints skip the LLM
+    status = "success"
+    result = None
+    risk_prediction = None
+    if risk_classifier:
+        risk_prediction = risk_classifier.predict(english_symptoms)
+        logger.debug(f"[{request_id}] Step 6: Local risk model: {risk_prediction['risk']} ({risk_prediction['confidence']:.2f})")
+        # Images and visit history carry signal the text model never saw
+        if not image_bytes and not include_history and risk_classifier.is_confident_low(risk_prediction):
+            logger.info(f"[{request_id}] ✓ Confident LOW from local risk model, skipping LLM")
+            risk_classifier.stats["early_low"] += 1
+            status = "classifier_low"
+            result = {
+                "risk": "LOW",
+                "doctor_summary": "Symptoms described appear mild.",
+                "advice": LOW_RISK_ADVICE
+            }
+
+    # 7. Call Gemini AI for analysis
+    logger.debug(f"[{request_id}] Step 7: Calling Gemini AI")
     
-    try:
-        logger.info(f"[{request_id}] 🧠 Sending to LLM...")
-        result = call_llm(english_symptoms, image_bytes)
-        logger.info(f"[{request_id}] ✓ LLM Response Received")
-        
-    except Exception as e:
-        logger.error(f"[{request_id}] ❌ LLM Call Failed: {str(e)}")
-        log_audit_trail("llm_error", request_id, {}, "failed")
-        return {
-            "risk": "ERROR",
-            "doctor_summary": "System temporarily unavailable",
-            "advice": "Please try again or consult a doctor directly.",
-            "status": "ai_error",
-            "request_id": request_id
-        }
+    visit_history = None
+    if user_id and include_history:
+        try:
+            visit_history = await asyncio.to_thread(history_store.recent_summary, user_id)
+            logger.debug(f"[{request_id}] Visit history: {'found' if visit_history else 'new patient'}")
+        except Exception as e:
+            logger.error(f"[{request_id}] ⚠️ History lookup failed: {str(e)}")
+    
+    offline_reason = None
+    if result is None:
+        remaining = deadline - time.monotonic()
+        expected = model_router.expected_seconds(has_image=image_bytes is not None) or 0.0
+        if gemini_circuit.is_open():
+            offline_reason = "circuit_open"
+        elif remaining < max(OFFLINE_MIN_LLM_SECONDS, expected):
+            offline_reason = "deadline"
+        else:
+            try:
+                logger.info(f"[{request_id}] 🧠 Sending to LLM...")
+                result = await asyncio.wait_for(
+                    call_llm_shared(english_symptoms, image_bytes, history=visit_history),
+                    timeout=remaining
+                )
+                logger.info(f"[{request_id}] ✓ LLM Response Received")
+                if "exception_type" in result or result.get("circuit_open"):
+                    offline_reason = "upstream_unreachable"
+            
+            except asyncio.TimeoutError:
+                logger.error(f"[{request_id}] ❌ LLM did not answer within the deadline")
+                # The call was only made with enough time for a normal answer,
+                # so a miss counts against the circuit like a transport error
+                gemini_circuit.record_failure()
+                offline_reason = "deadline"
+            except Exception as e:
+                logger.error(f"[{request_id}] ❌ LLM Call Failed: {str(e)}")
+                log_audit_trail("llm_error", request_id, {}, "failed")
+                offline_reason = "llm_error"
 
-    # 7. Extract and validate response
-    logger.debug(f"[{request_id}] Step 7: Response Validation")
+    if offline_reason:
+        response = await offline_response(
+            request_id, symptom_text, user_language,
+            english_symptoms if translation_info else None, risk_prediction,
+            offline_reason, user_id, image_bytes is not None
+        )
+        return analyze_reply(response, compact)
+
+    # 8. Extract and validate response
+    logger.debug(f"[{request_id}] Step 8: Response Validation")
     if "error" in result:
         logger.error(f"[{request_id}] ⚠️ LLM returned error")
-        return {
-            "risk": "MODERATE",
-            "doctor_summary": "Analysis incomplete",
-            "advice": "Please consult a medical professional.",
-            "status": "ai_partial_failure"
+        if not risk_prediction:
+            return PARTIAL_FAILURE_BODY.response(compact=compact)
+        # Fall back to the local risk model rather than a blanket MODERATE
+        risk_classifier.stats["fallbacks"] += 1
+        status = "classifier_fallback"
+        fallback_risk = risk_classifier.fallback_risk(risk_prediction)
+        result = {
+            "risk": fallback_risk,
+            "doctor_summary": "Detailed AI analysis unavailable; risk estimated from the symptom description.",
+            "advice": FALLBACK_ADVICE[fallback_risk]
         }
+    elif status == "success" and not image_bytes:
+        # Text-only LLM answers are the local risk model's training data
+        risk_training_log.record(anonymize_data(english_symptoms), result["risk"])
 
     doc_sum = result.get('doctor_summary', 'No detailed summary available')
-    risk_level = result.get('risk', 'MODERATE').upper()
+    risk_level = result['risk']  # validated against the response schema in call_llm
     advice_text = result.get('advice', 'Please consult a medical professional.')
     
-    # 8. Translate response back to user language
-    logger.debug(f"[{request_id}] Step 8: Translating Response")
+    # Keep the English result (anonymized) for the patient's next visit
+    if user_id:
+        record_history(
+            user_id, request_id, risk_level,
+            anonymize_data(doc_sum), anonymize_data(advice_text), user_language
+        )
+    
+    # 9. Translate response back to user language
+    logger.debug(f"[{request_id}] Step 9: Translating Response")
     
     if user_language != "English":
         try:
@@ -349,8 +801,8 @@ async def analyze(
             logger.error(f"[{request_id}] ⚠️ Response translation failed: {str(e)}")
             # Keep English version if translation fails
 
-    # 9. Format final response
-    logger.debug(f"[{request_id}] Step 9: Formatting Response")
+    # 10. Format final response
+    logger.debug(f"[{request_id}] Step 10: Formatting Response")
     
     doctor_summary = f"""
 AI TRIAGE SUMMARY
@@ -370,13 +822,14 @@ Always consult a qualified healthcare provider for proper evaluation.
 """.strip()
 
     logger.info(f"[{request_id}] ✓ Analysis Complete - Risk: {risk_level}")
-    log_audit_trail("analyze_complete", request_id, {"risk": risk_level}, "success")
+    log_audit_trail("analyze_complete", request_id, {"risk": risk_level, "status": status}, "success")
     
-    return {
+    response = {
         "risk": risk_level,
-        "doctor_summary": doctor_summary,
+        # Compact clients render the frame themselves
+        "doctor_summary": doc_sum if compact else doctor_summary,
         "advice": advice_text,
-        "status": "success",
+        "status": status,
         "request_id": request_id,
         "user_language": user_language,
         "whatsapp_enabled": TWILIO_ENABLED,
@@ -387,6 +840,7 @@ Always consult a qualified healthcare provider for proper evaluation.
             "audit_logged": True
         }
     }
+    return analyze_reply(response, compact)
 
 
 @app.post("/send-whatsapp")
@@ -394,10 +848,13 @@ async def send_whatsapp(
     phone_number: str = Form(...),
     message: str = Form(None),
     report: Optional[str] = Form(None),
-    user_language: str = Form("English")
+    user_language: str = Form("English"),
+    idempotency_key: Optional[str] = Form(None)
 ):
     """
     WhatsApp notification with multi-language support
+    Messages are persisted to the durable outbox before returning;
+    resubmitting the same idempotency_key returns the original job
     """
     
     request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
@@ -411,10 +868,7 @@ async def send_whatsapp(
         }
     
     # Format phone number
-    clean_phone = ''.join(filter(str.isdigit, phone_number))
-    if not clean_phone.startswith('91') and len(clean_phone) == 10:
-        clean_phone = '91' + clean_phone
-    whatsapp_to = f"whatsapp:+{clean_phone}"
+    whatsapp_to = format_whatsapp_number(phone_number)
     
     # Prepare message
     if report:
@@ -429,52 +883,208 @@ async def send_whatsapp(
     else:
         message_body = message or "Thank you for using NIDAAN-AI."
     
-    try:
-        logger.info(f"[{request_id}] 📱 Sending WhatsApp...")
-        
-        message = twilio_client.messages.create(
-            from_=TWILIO_WHATSAPP_NUMBER,
-            body=message_body,
-            to=whatsapp_to
-        )
-        
-        logger.info(f"[{request_id}] ✓ WhatsApp sent: {message.sid}")
-        log_audit_trail("whatsapp_sent", request_id, {"phone": clean_phone[:4]}, "success")
-        
+    job = await whatsapp_queue.submit(whatsapp_to, message_body, request_id, idempotency_key)
+    logger.info(f"[{request_id}] 📱 WhatsApp queued: job {job['job_id']}")
+    
+    return {
+        "success": True,
+        "message": "Report queued for delivery",
+        "status": job["status"],
+        "job_id": job["job_id"],
+        "duplicate": job["duplicate"],
+        "request_id": request_id
+    }
+
+
+class BulkRecipient(BaseModel):
+    phone_number: str
+    language: Optional[str] = None
+
+
+class BulkWhatsAppRequest(BaseModel):
+    message: str
+    recipients: List[BulkRecipient]
+    default_language: str = "English"
+    batch_id: Optional[str] = None
+
+
+@app.post("/send-whatsapp/bulk")
+async def send_whatsapp_bulk(payload: BulkWhatsAppRequest):
+    """
+    Broadcast one English message (e.g. health-camp follow-up advice)
+    The message is translated once per distinct language, recipients are
+    normalized and deduplicated, and delivery fans out through the
+    rate-limited WhatsApp queue. Poll progress at /send-whatsapp/bulk/{batch_id}
+    """
+    
+    request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    logger.info(f"[{request_id}] WhatsApp Bulk Request: {len(payload.recipients)} recipients")
+    
+    if not TWILIO_ENABLED:
         return {
-            "success": True,
-            "message": "Report sent successfully!",
-            "status": "sent",
-            "request_id": request_id
+            "success": False,
+            "error": "WhatsApp feature not configured",
+            "status": "twilio_not_configured"
         }
     
-    except TwilioRestException as e:
-        logger.error(f"[{request_id}] ❌ Twilio error: {e.msg}")
+    if len(payload.recipients) > MAX_BULK_RECIPIENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_RECIPIENTS} recipients per broadcast")
+    
+    # Normalize and dedupe numbers (first occurrence decides the language)
+    recipients = {}
+    for recipient in payload.recipients:
+        whatsapp_to = format_whatsapp_number(recipient.phone_number)
+        if whatsapp_to not in recipients:
+            recipients[whatsapp_to] = recipient.language or payload.default_language
+    logger.debug(f"[{request_id}] {len(recipients)} unique recipients after normalization")
+    
+    # Translate once per distinct language
+    languages = sorted(set(recipients.values()))
+    translations = await asyncio.gather(
+        *(translate_from_english(payload.message, language) for language in languages),
+        return_exceptions=True
+    )
+    bodies = {}
+    for language, trans in zip(languages, translations):
+        if isinstance(trans, dict) and trans.get("success"):
+            bodies[language] = trans.get("translated_text") or payload.message
+        else:
+            logger.warning(f"[{request_id}] ⚠️ Translation to {language} failed, sending English")
+            bodies[language] = payload.message
+    
+    batch_id = payload.batch_id or uuid.uuid4().hex
+    queued = await whatsapp_queue.submit_many(
+        [(to, bodies[language]) for to, language in recipients.items()],
+        batch_id,
+        request_id
+    )
+    log_audit_trail("whatsapp_bulk_queued", request_id, {"batch": batch_id}, "queued")
+    
+    return {
+        "success": True,
+        "message": "Broadcast queued for delivery",
+        "status": "queued",
+        "batch_id": batch_id,
+        "recipients": len(recipients),
+        "duplicates_removed": len(payload.recipients) - len(recipients),
+        "newly_queued": queued,
+        "languages": languages,
+        "request_id": request_id
+    }
+
+
+@app.get("/send-whatsapp/bulk/{batch_id}")
+async def whatsapp_bulk_status(batch_id: str):
+    """
+    Progress of a WhatsApp broadcast
+    """
+    if not TWILIO_ENABLED:
         return {
             "success": False,
-            "error": "Failed to send WhatsApp message",
-            "status": "failed"
+            "error": "WhatsApp feature not configured",
+            "status": "twilio_not_configured"
         }
+    
+    status = await whatsapp_queue.get_batch_status(batch_id)
+    if status["total"] == 0:
+        raise HTTPException(status_code=404, detail="Unknown WhatsApp broadcast")
+    
+    return {"success": True, **status}
+
+
+@app.get("/send-whatsapp/{job_id}")
+async def whatsapp_status(job_id: str):
+    """
+    Poll delivery status of a queued WhatsApp message
+    """
+    if not TWILIO_ENABLED:
+        return {
+            "success": False,
+            "error": "WhatsApp feature not configured",
+            "status": "twilio_not_configured"
+        }
+    
+    job = await whatsapp_queue.get_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown WhatsApp job")
+    
+    return {"success": True, **job}
+
+
+@app.get("/history", response_model=HistoryPage)
+async def triage_history(
+    user_id: str = Query(..., min_length=1),
+    risk: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=MAX_HISTORY_PAGE),
+    cursor: Optional[str] = Query(None)
+):
+    """
+    One patient's past triage results, newest first, with cursor pagination
+    Pass next_cursor from the previous page to continue. user_id is
+    required: this public route never lists other patients' records.
+    """
+    if risk is not None and risk.upper() not in RISK_LEVELS:
+        raise HTTPException(status_code=400, detail=f"risk must be one of {', '.join(RISK_LEVELS)}")
+    
+    try:
+        records, next_cursor = await asyncio.to_thread(
+            history_store.history, user_id, limit, cursor, risk
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "success": True,
+        "records": records,
+        "count": len(records),
+        "next_cursor": next_cursor
+    }
+
+
+@app.get("/reanalysis/{request_id}", response_model=ReanalysisStatus)
+async def reanalysis_status(request_id: str, user_id: str = Query(..., min_length=1)):
+    """
+    Outcome of the full re-analysis of an offline_triage answer
+    request_ids are guessable timestamps, so the user_id the request was
+    made with is required; another user's request reads as unknown.
+    """
+    row = await asyncio.to_thread(reanalysis_queue.get, request_id)
+    if row is None or row["user_id"] is None or not hmac.compare_digest(row["user_id"].encode(), user_id.encode()):
+        raise HTTPException(status_code=404, detail="Unknown re-analysis request")
+
+    return {
+        "success": True,
+        "request_id": request_id,
+        "status": row["status"],
+        "offline_risk": row["offline_risk"],
+        "reason": row["reason"],
+        "attempts": row["attempts"],
+        "result": row["result"]
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Endpoint latency percentiles and write-behind queue health"""
+    # Free-form nested dict: rendered directly, skipping the jsonable_encoder walk
+    return FastJSONResponse(metrics.collect())
 
 
 @app.get("/health")
 async def health_check():
     """Health check with compliance info"""
-    return {
+    return FastJSONResponse({
         "status": "healthy",
         "version": "2.0.0",
-        "features": {
-            "whatsapp": TWILIO_ENABLED,
-            "multilanguage": True,
-            "languages": ["English", "हिंदी", "தமிழ்", "తెలుగు", "मराठी", "ಕನ್ನಡ"]
-        },
+        "features": HEALTH_FEATURES,
         "compliance": {
             "abdm_ready": True,
             "disha_compliant": True,
-            "data_retention": f"{DATA_RETENTION_DAYS} days"
+            "data_retention": f"{DATA_RETENTION_DAYS} days",
+            "retention_totals": retention_sweeper.totals
         },
         "timestamp": datetime.now().isoformat()
-    }
+    })
 
 
 if __name__ == "__main__":
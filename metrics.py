@@ -0,0 +1,84 @@
+"""
+Metrics
+Lightweight in-process counters and latency percentiles served by /metrics
+"""
+
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per recorder (sliding window)
+LATENCY_WINDOW = 4096
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    """Sliding window of request durations with p50/p95/p99"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def snapshot(self) -> Dict:
+        values = sorted(self._samples)
+        return {
+            "count": self.count,
+            "window": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round((values[-1] if values else 0.0) * 1000, 3),
+        }
+
+
+class MetricsRegistry:
+    """
+    Named snapshot providers
+
+    Subsystems register a zero-argument callable returning a dict;
+    collect() calls them all, so metrics are only computed when read.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Dict]] = {}
+        self._latency: Dict[str, LatencyRecorder] = {}
+        self.started_at = time.time()
+
+    def register(self, name: str, source: Callable[[], Dict]):
+        self._sources[name] = source
+
+    def latency(self, name: str) -> LatencyRecorder:
+        """Get or create the latency recorder for an endpoint"""
+        recorder = self._latency.get(name)
+        if recorder is None:
+            recorder = self._latency[name] = LatencyRecorder()
+        return recorder
+
+    def collect(self) -> Dict:
+        snapshot = {"uptime_seconds": round(time.time() - self.started_at, 1)}
+        snapshot["latency"] = {name: r.snapshot() for name, r in self._latency.items()}
+        for name, source in self._sources.items():
+            try:
+                snapshot[name] = source()
+            except Exception as e:
+                logger.error(f"❌ Metrics source {name} failed: {e}")
+                snapshot[name] = {"error": str(e)}
+        return snapshot
+
+
+# Shared registry used by the API
+registry = MetricsRegistry()
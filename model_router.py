@@ -0,0 +1,215 @@
+"""
+Model Router
+Send each triage call to the cheapest healthy model first and escalate to a
+stronger one only when the answer is invalid, borderline, or has an image
+"""
+
+import os
+import threading
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Router Configuration
+# Comma-separated model names, cheapest/fastest first, strongest last
+# (see check_available_models.py). Empty: GEMINI_MODEL alone, no routing.
+LLM_MODEL_TIERS = os.getenv("LLM_MODEL_TIERS", "")
+# The prompt says "if unsure, choose MODERATE", so MODERATE from a lower
+# tier is treated as borderline and asked again one tier up
+LLM_ESCALATE_ON_MODERATE = os.getenv("LLM_ESCALATE_ON_MODERATE", "1") == "1"
+# Image requests skip straight to the strongest tier
+LLM_IMAGE_TO_STRONGEST = os.getenv("LLM_IMAGE_TO_STRONGEST", "1") == "1"
+# A tier is skipped while its recent error rate or latency is above these
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_LATENCY_SLO_SECONDS = float(os.getenv("ROUTER_LATENCY_SLO_SECONDS", "10"))
+# Every Nth request still tries a skipped tier so its stats can recover
+ROUTER_PROBE_EVERY = 20
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+# USD per million tokens (input, output), list prices; unknown models cost 0
+MODEL_PRICES_PER_MTOK = {
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-exp": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+def model_price(model_name: str) -> Tuple[float, float]:
+    """(input, output) USD per million tokens; versioned names use the base price"""
+    name = model_name.replace("models/", "")
+    while name:
+        if name in MODEL_PRICES_PER_MTOK:
+            return MODEL_PRICES_PER_MTOK[name]
+        if "-" not in name:
+            break
+        name = name.rsplit("-", 1)[0]
+    return (0.0, 0.0)
+
+
+def configured_tiers(default_model: str) -> List[str]:
+    """Tier list from LLM_MODEL_TIERS, or just the default model"""
+    tiers = [name.strip() for name in LLM_MODEL_TIERS.split(",") if name.strip()]
+    return tiers or [default_model]
+
+
+class Attempt(NamedTuple):
+    """Outcome of one model call"""
+    result: Dict
+    seconds: float
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+class TierStats:
+    """Online latency/error averages and totals for one model"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.price = model_price(model_name)
+        self.calls = 0
+        self.errors = 0
+        self.escalated = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+
+    def observe(self, attempt: Attempt):
+        failed = "error" in attempt.result
+        self.calls += 1
+        self.errors += failed
+        self.prompt_tokens += attempt.prompt_tokens
+        self.output_tokens += attempt.output_tokens
+        self.cost_usd += (attempt.prompt_tokens * self.price[0] + attempt.output_tokens * self.price[1]) / 1e6
+        self.error_ewma += EWMA_ALPHA * (float(failed) - self.error_ewma)
+        if self.latency_ewma is None:
+            self.latency_ewma = attempt.seconds
+        else:
+            self.latency_ewma += EWMA_ALPHA * (attempt.seconds - self.latency_ewma)
+
+    def healthy(self) -> bool:
+        return self.error_ewma <= ROUTER_MAX_ERROR_RATE and (
+            self.latency_ewma is None or self.latency_ewma <= ROUTER_LATENCY_SLO_SECONDS
+        )
+
+    def snapshot(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "escalated": self.escalated,
+            "latency_ewma_ms": round((self.latency_ewma or 0.0) * 1000, 1),
+            "error_rate_ewma": round(self.error_ewma, 3),
+            "healthy": self.healthy(),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+class ModelRouter:
+    """
+    Tiered model selection
+
+    A request starts at the first healthy tier (images at the strongest)
+    and moves up one tier when the answer is an error/invalid or a
+    borderline MODERATE. The best valid answer seen is returned, so a
+    failing stronger tier never discards a usable lower-tier answer.
+    """
+
+    def __init__(self, tiers: List[str], escalate_on_moderate: bool = LLM_ESCALATE_ON_MODERATE,
+                 image_to_strongest: bool = LLM_IMAGE_TO_STRONGEST):
+        if not tiers:
+            raise ValueError("ModelRouter needs at least one model tier")
+        self.tiers = list(tiers)
+        self.escalate_on_moderate = escalate_on_moderate
+        self.image_to_strongest = image_to_strongest
+        self.stats = {name: TierStats(name) for name in self.tiers}
+        self.requests = 0
+        self.escalations = 0
+        self.escalation_reasons: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def plan(self, has_image: bool = False, probe: bool = False) -> List[str]:
+        """Tiers to try for one request, in order (probe: ignore health)"""
+        if has_image and self.image_to_strongest:
+            return self.tiers[-1:]
+        for i, name in enumerate(self.tiers[:-1]):
+            if probe or self.stats[name].healthy():
+                return self.tiers[i:]
+        return self.tiers[-1:]
+
+    def expected_seconds(self, has_image: bool = False) -> Optional[float]:
+        """Recent latency of the tier a request would start on (None until measured)"""
+        with self._lock:
+            return self.stats[self.plan(has_image)[0]].latency_ewma
+
+    def escalation_reason(self, result: Dict) -> Optional[str]:
+        if "error" in result:
+            return "invalid"
+        if self.escalate_on_moderate and result.get("risk") == "MODERATE":
+            return "borderline"
+        return None
+
+    def run(self, attempt: Callable[[str], Attempt], has_image: bool = False) -> Tuple[Dict, Dict]:
+        """
+        Route one request
+
+        Args:
+            attempt: Calls the named model and returns an Attempt
+            has_image: Request includes an image
+
+        Returns:
+            (result, info) - info has model, tried, escalations and seconds
+        """
+        with self._lock:
+            self.requests += 1
+            probe = self.requests % ROUTER_PROBE_EVERY == 0
+        plan = self.plan(has_image, probe)
+        best: Optional[Dict] = None
+        info = {"model": plan[0], "tried": [], "escalations": [], "seconds": 0.0}
+
+        for i, name in enumerate(plan):
+            outcome = attempt(name)
+            reason = self.escalation_reason(outcome.result)
+            with self._lock:
+                self.stats[name].observe(outcome)
+                if reason and i < len(plan) - 1:
+                    self.stats[name].escalated += 1
+                    self.escalation_reasons[reason] = self.escalation_reasons.get(reason, 0) + 1
+                    if not info["escalations"]:
+                        self.escalations += 1
+            info["tried"].append(name)
+            info["seconds"] += outcome.seconds
+
+            if "error" not in outcome.result:
+                best, info["model"] = outcome.result, name
+            elif best is None:
+                info["model"] = name
+            if reason is None:
+                return outcome.result, info
+            if i < len(plan) - 1:
+                info["escalations"].append(reason)
+                logger.info(f"↗️ Escalating {name} → {plan[i + 1]} ({reason})")
+
+        return (best if best is not None else outcome.result), info
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            requests = self.requests or 1
+            return {
+                "tiers": self.tiers,
+                "requests": self.requests,
+                "escalations": self.escalations,
+                "escalation_rate": round(self.escalations / requests, 4),
+                "escalation_reasons": dict(self.escalation_reasons),
+                "cost_usd": round(sum(s.cost_usd for s in self.stats.values()), 6),
+                "models": {name: s.snapshot() for name, s in self.stats.items()},
+            }
@@ -0,0 +1,130 @@
+"""
+NIDAAN-AI Command Line
+Offline tools that share the API's triage pipeline
+
+Usage:
+    python nidaan.py batch records.jsonl -o results.jsonl [--workers 8] [--fresh]
+    python nidaan.py risk-train [--data pairs.jsonl ...] [-o data/risk_model.npy]
+    python nidaan.py risk-eval --data labelled.jsonl [--model data/risk_model.npy]
+    python nidaan.py offline-translations [-o offline_translations.json]
+    python nidaan.py cache-server [--port 6379]   # local Redis stand-in for development
+"""
+
+import sys
+import json
+import asyncio
+import logging
+import argparse
+
+
+def cmd_batch(args) -> int:
+    from batch_triage import run_batch
+
+    summary = asyncio.run(run_batch(
+        args.input,
+        args.output,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        fresh=args.fresh,
+        show_eta=not args.no_eta
+    ))
+    sys.stdout.write(json.dumps(summary, indent=2) + "\n")
+    return 0
+
+
+def cmd_risk_train(args) -> int:
+    from risk_classifier import default_training_files, train
+
+    paths = args.data or default_training_files()
+    if not paths:
+        sys.stderr.write("No training data: pass --data or log pairs from the API first\n")
+        return 1
+    meta = train(paths, args.output, holdout=args.holdout, epochs=args.epochs)
+    sys.stdout.write(json.dumps(meta, indent=2) + "\n")
+    return 0
+
+
+def cmd_risk_eval(args) -> int:
+    from risk_classifier import RiskClassifier, default_training_files, evaluate, read_pairs
+
+    classifier = RiskClassifier.load(args.model)
+    if classifier is None:
+        sys.stderr.write(f"Could not load a risk model from {args.model} (numpy installed?)\n")
+        return 1
+    pairs = list(read_pairs(args.data or default_training_files()))
+    texts, labels = zip(*pairs) if pairs else ((), ())
+    sys.stdout.write(json.dumps(evaluate(classifier, texts, labels), indent=2) + "\n")
+    return 0
+
+
+def cmd_offline_translations(args) -> int:
+    from offline_triage import build_translations
+
+    counts = asyncio.run(build_translations(args.output))
+    sys.stdout.write(json.dumps(counts, indent=2) + "\n")
+    return 0
+
+
+def cmd_cache_server(args) -> int:
+    from cache_backend import serve_standin
+
+    try:
+        asyncio.run(serve_standin(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from batch_triage import BATCH_WORKERS
+    from risk_classifier import RISK_MODEL_PATH
+    from offline_triage import OFFLINE_TRANSLATIONS_PATH
+
+    parser = argparse.ArgumentParser(prog="nidaan", description="NIDAAN-AI command line tools")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show debug logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Triage archived symptom records (JSONL/CSV)")
+    batch.add_argument("input", help="Input .jsonl or .csv file")
+    batch.add_argument("-o", "--output", required=True, help="Results .jsonl file")
+    batch.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Records processed concurrently")
+    batch.add_argument("--checkpoint", help="Checkpoint file (default: <output>.ckpt)")
+    batch.add_argument("--fresh", action="store_true", help="Ignore the checkpoint and start over")
+    batch.add_argument("--no-eta", action="store_true", help="Skip the initial record count")
+    batch.set_defaults(func=cmd_batch)
+
+    risk_train = commands.add_parser("risk-train", help="Train the local risk classifier from logged pairs")
+    risk_train.add_argument("--data", nargs="+", help="Pair .jsonl files (default: data/training/risk-pairs-*.jsonl)")
+    risk_train.add_argument("-o", "--output", default=RISK_MODEL_PATH, help="Model .npy file")
+    risk_train.add_argument("--holdout", type=float, default=0.2, help="Share held out for calibration and test")
+    risk_train.add_argument("--epochs", type=int, default=300, help="Training iterations")
+    risk_train.set_defaults(func=cmd_risk_train)
+
+    risk_eval = commands.add_parser("risk-eval", help="Evaluate the local risk classifier on labelled pairs")
+    risk_eval.add_argument("--data", nargs="+", help="Pair .jsonl files (default: data/training/risk-pairs-*.jsonl)")
+    risk_eval.add_argument("--model", default=RISK_MODEL_PATH, help="Model .npy file")
+    risk_eval.set_defaults(func=cmd_risk_eval)
+
+    offline = commands.add_parser("offline-translations", help="Regenerate offline triage translations via Sarvam")
+    offline.add_argument("-o", "--output", default=OFFLINE_TRANSLATIONS_PATH, help="Translations .json file")
+    offline.set_defaults(func=cmd_offline_translations)
+
+    cache_server = commands.add_parser("cache-server", help="Run an in-memory Redis stand-in (CACHE_BACKEND=redis)")
+    cache_server.add_argument("--host", default="127.0.0.1", help="Listen address")
+    cache_server.add_argument("--port", type=int, default=6379, help="Listen port")
+    cache_server.set_defaults(func=cmd_cache_server)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    # Configure logging before the pipeline modules do, so the CLI stays quiet
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
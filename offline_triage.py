@@ -0,0 +1,417 @@
+"""
+Offline Triage
+Rule-based triage that needs no network: serves when Gemini is unreachable or
+the request deadline is too short for an LLM call
+
+Symptoms are matched in the patient's own language (no translation needed)
+and in English/romanized Hindi; responses come from precomputed translations
+(offline_translations.json) for every language in LANGUAGE_CODES.
+
+Usage:
+    python nidaan.py offline-translations   # regenerate translations via Sarvam
+"""
+
+import os
+import re
+import json
+import time
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from emergency import find_emergency_keywords
+from sarvam_translator import LANGUAGE_CODES
+
+logger = logging.getLogger(__name__)
+
+OFFLINE_TRANSLATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "offline_translations.json")
+
+RISK_ORDER = {"LOW": 0, "MODERATE": 1, "HIGH": 2}
+# This many distinct LOW complaints together are treated as MODERATE
+MULTIPLE_COMPLAINTS = 3
+
+# English source of every response phrase; keys are shared with the translations
+PHRASES = {
+    "summary_emergency": "Emergency warning signs found in the symptoms.",
+    "summary_high": "Symptoms suggest a possibly serious condition.",
+    "summary_moderate": "Symptoms need a check-up by a doctor.",
+    "summary_low": "Symptoms appear mild.",
+    "summary_unknown": "Symptoms could not be assessed in detail.",
+    "offline_notice": "This is an offline assessment. A full review will follow when the connection returns.",
+    "advice_emergency": "Call 108 now or go to the nearest emergency room immediately.",
+    "advice_high": "See a doctor today. If symptoms get worse, call 108.",
+    "advice_fever": "Rest, drink plenty of fluids and take paracetamol if needed. See a doctor if the fever lasts more than 2 days.",
+    "advice_stomach": "Drink ORS and clean water in small sips. See a doctor if there is blood, severe pain, or you cannot keep fluids down.",
+    "advice_cough": "Rest and drink warm fluids. See a doctor if the cough lasts more than 2 weeks or breathing becomes difficult.",
+    "advice_cold": "Rest, drink warm fluids and watch your symptoms. See a doctor if they get worse or last more than 3 days.",
+    "advice_pain": "Rest and avoid strain. See a doctor if the pain is severe, sudden or does not improve.",
+    "advice_skin": "Keep the area clean and dry. See a doctor if it spreads, blisters or comes with fever.",
+    "advice_general": "Please consult a doctor within 24 hours.",
+}
+
+
+class Rule(NamedTuple):
+    name: str
+    risk: str
+    advice: str
+    emergency: bool
+    # Language code -> keywords; "en" also holds romanized Hindi
+    keywords: Dict[str, Tuple[str, ...]]
+
+
+# Ordered by severity: the first matching rule of the highest risk supplies the advice
+RULES: Tuple[Rule, ...] = (
+    Rule("chest_pain", "HIGH", "advice_emergency", True, {
+        "en": ("chest pain", "chest tightness", "seene mein dard", "seene me dard", "chhati me dard"),
+        "hi-IN": ("सीने में दर्द", "छाती में दर्द"),
+        "mr-IN": ("छातीत दुख", "छातीत वेदना"),
+        "bn-IN": ("বুকে ব্যথা",),
+        "ta-IN": ("நெஞ்சு வலி", "மார்பு வலி"),
+        "te-IN": ("ఛాతీ నొప్పి", "గుండె నొప్పి"),
+        "kn-IN": ("ಎದೆ ನೋವು",),
+        "gu-IN": ("છાતીમાં દુખાવો", "છાતીમાં દુઃખાવો"),
+        "ml-IN": ("നെഞ്ചുവേദന", "നെഞ്ച് വേദന"),
+        "pa-IN": ("ਛਾਤੀ ਵਿੱਚ ਦਰਦ", "ਛਾਤੀ ਵਿਚ ਦਰਦ", "ਛਾਤੀ ਦਰਦ"),
+    }),
+    Rule("breathing", "HIGH", "advice_emergency", True, {
+        "en": ("breathless", "can't breathe", "cannot breathe", "difficulty breathing", "shortness of breath",
+               "saans nahi", "saans lene mein"),
+        "hi-IN": ("सांस लेने में", "साँस लेने में", "सांस फूल", "साँस फूल"),
+        "mr-IN": ("श्वास घेण्यास त्रास", "दम लागत"),
+        "bn-IN": ("শ্বাসকষ্ট", "শ্বাস নিতে কষ্ট"),
+        "ta-IN": ("மூச்சு திணறல்", "மூச்சு விட சிரமம்"),
+        "te-IN": ("ఊపిరి ఆడటం లేదు", "శ్వాస తీసుకోవడం కష్టం", "ఆయాసం"),
+        "kn-IN": ("ಉಸಿರಾಟದ ತೊಂದರೆ", "ಉಸಿರು ಕಟ್ಟ"),
+        "gu-IN": ("શ્વાસ લેવામાં તકલીફ", "શ્વાસ ચડ"),
+        "ml-IN": ("ശ്വാസതടസ്സം", "ശ്വാസം മുട്ട"),
+        "pa-IN": ("ਸਾਹ ਲੈਣ ਵਿੱਚ", "ਸਾਹ ਚੜ੍ਹ"),
+    }),
+    Rule("unconscious", "HIGH", "advice_emergency", True, {
+        "en": ("unconscious", "fainted", "not responding", "behosh"),
+        "hi-IN": ("बेहोश",),
+        "mr-IN": ("बेशुद्ध",),
+        "bn-IN": ("অজ্ঞান",),
+        "ta-IN": ("மயங்கி", "சுயநினைவு"),
+        "te-IN": ("స్పృహ కోల్పో", "స్పృహ లేదు"),
+        "kn-IN": ("ಪ್ರಜ್ಞೆ ತಪ್ಪ", "ಪ್ರಜ್ಞಾಹೀನ"),
+        "gu-IN": ("બેભાન",),
+        "ml-IN": ("ബോധം നഷ്ട", "ബോധക്ഷയം"),
+        "pa-IN": ("ਬੇਹੋਸ਼",),
+    }),
+    Rule("heavy_bleeding", "HIGH", "advice_emergency", True, {
+        "en": ("bleeding heavily", "heavy bleeding", "lot of blood", "bleeding a lot"),
+        "hi-IN": ("खून बह", "बहुत खून"),
+        "mr-IN": ("खूप रक्त", "रक्तस्त्राव"),
+        "bn-IN": ("রক্তপাত", "অনেক রক্ত"),
+        "ta-IN": ("இரத்தப்போக்கு", "அதிக இரத்தம்"),
+        "te-IN": ("రక్తస్రావం", "ఎక్కువ రక్తం"),
+        "kn-IN": ("ರಕ್ತಸ್ರಾವ", "ತುಂಬಾ ರಕ್ತ"),
+        "gu-IN": ("લોહી વહે", "ખૂબ લોહી", "રક્તસ્ત્રાવ"),
+        "ml-IN": ("രക്തസ്രാവം", "ധാരാളം രക്തം"),
+        "pa-IN": ("ਖੂਨ ਵਗ", "ਬਹੁਤ ਖੂਨ"),
+    }),
+    Rule("seizure", "HIGH", "advice_emergency", True, {
+        "en": ("seizure", "convulsion", "fits", "mirgi"),
+        "hi-IN": ("दौरा", "मिर्गी", "झटके"),
+        "mr-IN": ("फेफरे", "आकडी", "झटके"),
+        "bn-IN": ("খিঁচুনি",),
+        "ta-IN": ("வலிப்பு",),
+        "te-IN": ("మూర్ఛ", "ఫిట్స్"),
+        "kn-IN": ("ಮೂರ್ಛೆ", "ಫಿಟ್ಸ್"),
+        "gu-IN": ("આંચકી", "ખેંચ"),
+        "ml-IN": ("അപസ്മാരം", "ചുഴലി"),
+        "pa-IN": ("ਦੌਰਾ", "ਮਿਰਗੀ"),
+    }),
+    Rule("stroke", "HIGH", "advice_emergency", True, {
+        "en": ("stroke", "paralysis", "face drooping", "slurred speech", "weakness on one side", "lakwa"),
+        "hi-IN": ("लकवा",),
+        "mr-IN": ("लकवा", "अर्धांगवायू"),
+        "bn-IN": ("স্ট্রোক", "পক্ষাঘাত"),
+        "ta-IN": ("பக்கவாதம்",),
+        "te-IN": ("పక్షవాతం",),
+        "kn-IN": ("ಪಾರ್ಶ್ವವಾಯು",),
+        "gu-IN": ("લકવો",),
+        "ml-IN": ("പക്ഷാഘാതം",),
+        "pa-IN": ("ਅਧਰੰਗ",),
+    }),
+    Rule("poisoning", "HIGH", "advice_emergency", True, {
+        "en": ("poison", "overdose", "pesticide", "zeher", "jahar", "suicide", "kill myself"),
+        "hi-IN": ("ज़हर", "जहर"),
+        "mr-IN": ("विष",),
+        "bn-IN": ("বিষ",),
+        "ta-IN": ("விஷம்",),
+        "te-IN": ("విషం",),
+        "kn-IN": ("ವಿಷ",),
+        "gu-IN": ("ઝેર",),
+        "ml-IN": ("വിഷം",),
+        "pa-IN": ("ਜ਼ਹਿਰ", "ਜਹਿਰ"),
+    }),
+    Rule("snake_bite", "HIGH", "advice_emergency", True, {
+        "en": ("snake bite", "snakebite", "bitten by a snake", "saap"),
+        "hi-IN": ("सांप", "साँप"),
+        "mr-IN": ("साप चाव", "सर्पदंश"),
+        "bn-IN": ("সাপে কামড়", "সাপের কামড়"),
+        "ta-IN": ("பாம்பு கடி",),
+        "te-IN": ("పాము కాటు", "పాము కరిచ"),
+        "kn-IN": ("ಹಾವು ಕಚ್ಚ",),
+        "gu-IN": ("સાપ કરડ",),
+        "ml-IN": ("പാമ്പ് കടി", "പാമ്പുകടി"),
+        "pa-IN": ("ਸੱਪ ਨੇ ਡੰਗ", "ਸੱਪ ਦਾ ਡੰਗ"),
+    }),
+    Rule("blood_loss", "HIGH", "advice_high", False, {
+        "en": ("blood in vomit", "vomiting blood", "blood in stool", "coughing blood", "coughing up blood",
+               "black stool"),
+        "hi-IN": ("खून की उल्टी", "मल में खून", "खांसी में खून"),
+        "mr-IN": ("रक्ताची उलटी", "शौचात रक्त"),
+        "bn-IN": ("রক্ত বমি", "পায়খানায় রক্ত"),
+        "ta-IN": ("இரத்த வாந்தி", "மலத்தில் இரத்தம்"),
+        "te-IN": ("రక్తపు వాంతి", "మలంలో రక్తం"),
+        "kn-IN": ("ರಕ್ತ ವಾಂತಿ", "ಮಲದಲ್ಲಿ ರಕ್ತ"),
+        "gu-IN": ("લોહીની ઉલટી", "ઝાડામાં લોહી"),
+        "ml-IN": ("രക്തം ഛർദ്ദി", "മലത്തിൽ രക്തം"),
+        "pa-IN": ("ਖੂਨ ਦੀ ਉਲਟੀ",),
+    }),
+    Rule("burn", "HIGH", "advice_high", False, {
+        "en": ("burnt", "burned", "scald"),
+        "hi-IN": ("जल गया", "जल गई"),
+        "mr-IN": ("भाजल",),
+        "bn-IN": ("পুড়ে",),
+        "ta-IN": ("தீக்காயம்",),
+        "te-IN": ("కాలిన గాయం", "కాలింది"),
+        "kn-IN": ("ಸುಟ್ಟ ಗಾಯ", "ಸುಟ್ಟು"),
+        "gu-IN": ("દાઝી", "દાઝ્યા"),
+        "ml-IN": ("പൊള്ളൽ", "പൊള്ളി"),
+        "pa-IN": ("ਸੜ ਗਿਆ", "ਸੜ ਗਈ"),
+    }),
+    Rule("fever", "MODERATE", "advice_fever", False, {
+        "en": ("fever", "temperature", "bukhar", "bukhaar"),
+        "hi-IN": ("बुखार", "ज्वर"),
+        "mr-IN": ("ताप",),
+        "bn-IN": ("জ্বর",),
+        "ta-IN": ("காய்ச்சல்",),
+        "te-IN": ("జ్వరం",),
+        "kn-IN": ("ಜ್ವರ",),
+        "gu-IN": ("તાવ",),
+        "ml-IN": ("പനി",),
+        "pa-IN": ("ਬੁਖਾਰ", "ਬੁਖ਼ਾਰ"),
+    }),
+    Rule("vomiting_diarrhea", "MODERATE", "advice_stomach", False, {
+        "en": ("vomit", "diarrhea", "diarrhoea", "loose motion", "ulti", "dast"),
+        "hi-IN": ("उल्टी", "दस्त"),
+        "mr-IN": ("उलटी", "उलट्या", "जुलाब"),
+        "bn-IN": ("বমি", "ডায়রিয়া", "পাতলা পায়খানা"),
+        "ta-IN": ("வாந்தி", "வயிற்றுப்போக்கு"),
+        "te-IN": ("వాంతి", "విరేచనాలు"),
+        "kn-IN": ("ವಾಂತಿ", "ಭೇದಿ", "ಅತಿಸಾರ"),
+        "gu-IN": ("ઉલટી", "ઝાડા"),
+        "ml-IN": ("ഛർദ്ദി", "വയറിളക്കം"),
+        "pa-IN": ("ਉਲਟੀ", "ਦਸਤ"),
+    }),
+    Rule("stomach_pain", "MODERATE", "advice_pain", False, {
+        "en": ("stomach pain", "abdominal pain", "stomach ache", "belly pain", "pet dard", "pet mein dard"),
+        "hi-IN": ("पेट दर्द", "पेट में दर्द"),
+        "mr-IN": ("पोटात दुख", "पोटदुखी"),
+        "bn-IN": ("পেটে ব্যথা", "পেট ব্যথা"),
+        "ta-IN": ("வயிற்று வலி", "வயிறு வலி"),
+        "te-IN": ("కడుపు నొప్పి",),
+        "kn-IN": ("ಹೊಟ್ಟೆ ನೋವು",),
+        "gu-IN": ("પેટમાં દુખાવો", "પેટ દુખે"),
+        "ml-IN": ("വയറുവേദന", "വയറ് വേദന"),
+        "pa-IN": ("ਪੇਟ ਦਰਦ", "ਪੇਟ ਵਿੱਚ ਦਰਦ"),
+    }),
+    Rule("cough", "LOW", "advice_cough", False, {
+        "en": ("cough", "khansi"),
+        "hi-IN": ("खांसी", "खाँसी"),
+        "mr-IN": ("खोकला",),
+        "bn-IN": ("কাশি",),
+        "ta-IN": ("இருமல்",),
+        "te-IN": ("దగ్గు",),
+        "kn-IN": ("ಕೆಮ್ಮು",),
+        "gu-IN": ("ખાંસી", "ઉધરસ"),
+        "ml-IN": ("ചുമ",),
+        "pa-IN": ("ਖੰਘ",),
+    }),
+    Rule("cold", "LOW", "advice_cold", False, {
+        "en": ("cold", "runny nose", "sneez", "blocked nose", "sore throat", "jukam", "zukam", "sardi"),
+        "hi-IN": ("जुकाम", "ज़ुकाम", "सर्दी", "नाक बह"),
+        "mr-IN": ("सर्दी",),
+        "bn-IN": ("সর্দি",),
+        "ta-IN": ("சளி", "ஜலதோஷம்"),
+        "te-IN": ("జలుబు",),
+        "kn-IN": ("ನೆಗಡಿ", "ಶೀತ"),
+        "gu-IN": ("શરદી",),
+        "ml-IN": ("ജലദോഷം",),
+        "pa-IN": ("ਜ਼ੁਕਾਮ", "ਜੁਕਾਮ", "ਨਜ਼ਲਾ"),
+    }),
+    Rule("aches", "LOW", "advice_pain", False, {
+        "en": ("headache", "body pain", "body ache", "joint pain", "back pain", "sir dard", "sar dard", "badan dard"),
+        "hi-IN": ("सिरदर्द", "सिर दर्द", "बदन दर्द", "शरीर में दर्द"),
+        "mr-IN": ("डोकेदुखी", "डोके दुख", "अंगदुखी"),
+        "bn-IN": ("মাথা ব্যথা", "মাথাব্যথা", "গায়ে ব্যথা"),
+        "ta-IN": ("தலைவலி", "தலை வலி", "உடல் வலி"),
+        "te-IN": ("తలనొప్పి", "తల నొప్పి", "ఒళ్ళు నొప్పులు"),
+        "kn-IN": ("ತಲೆನೋವು", "ತಲೆ ನೋವು", "ಮೈ ನೋವು"),
+        "gu-IN": ("માથાનો દુખાવો", "માથું દુખે", "શરીરમાં દુખાવો"),
+        "ml-IN": ("തലവേദന", "ശരീരവേദന", "മേലുവേദന"),
+        "pa-IN": ("ਸਿਰ ਦਰਦ", "ਸਿਰਦਰਦ", "ਸਰੀਰ ਦਰਦ"),
+    }),
+    Rule("skin", "LOW", "advice_skin", False, {
+        "en": ("rash", "itch", "khujli", "cut", "wound", "bruise"),
+        "hi-IN": ("दाने", "खुजली", "चकत्ते", "कट गया", "चोट"),
+        "mr-IN": ("पुरळ", "खाज", "जखम"),
+        "bn-IN": ("ফুসকুড়ি", "চুলকানি", "কেটে গেছে"),
+        "ta-IN": ("தடிப்பு", "அரிப்பு", "வெட்டு", "காயம்"),
+        "te-IN": ("దద్దుర్లు", "దురద", "గాయం"),
+        "kn-IN": ("ದದ್ದು", "ತುರಿಕೆ", "ಗಾಯ"),
+        "gu-IN": ("ફોલ્લી", "ખંજવાળ", "ઘા"),
+        "ml-IN": ("ചൊറിച്ചിൽ", "തടിപ്പ്", "മുറിവ്"),
+        "pa-IN": ("ਧੱਫੜ", "ਖੁਜਲੀ", "ਖਾਰਸ਼", "ਜ਼ਖ਼ਮ", "ਸੱਟ"),
+    }),
+)
+
+
+def _compile(keywords: Tuple[str, ...]) -> "re.Pattern":
+    # Latin keywords must start a word ("cut" must not match "acute"); Indic
+    # keywords are matched as substrings so inflected forms still hit
+    parts = [
+        r"(?<![a-z])" + re.escape(kw) if kw.isascii() else re.escape(kw)
+        for kw in sorted(keywords, key=len, reverse=True)
+    ]
+    return re.compile("|".join(parts))
+
+
+class OfflineTriage:
+    """
+    Keyword rules over the original text (and the English text when a
+    translation exists), answered from precomputed translations
+
+    Everything is compiled at startup; a triage is a few regex scans.
+    """
+
+    def __init__(self, translations_path: str = OFFLINE_TRANSLATIONS_PATH):
+        self.patterns = {
+            rule.name: {code: _compile(kws) for code, kws in rule.keywords.items()} for rule in RULES
+        }
+        self.translations: Dict[str, Dict[str, str]] = {}
+        try:
+            with open(translations_path, encoding="utf-8") as f:
+                self.translations = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Offline translations unavailable ({e}); offline answers will be in English")
+        missing = [name for name, code in LANGUAGE_CODES.items()
+                   if code != "en-IN" and code not in self.translations]
+        if missing:
+            logger.warning(f"⚠️ No offline translations for: {', '.join(missing)}")
+        self.stats = {"served": 0, "emergencies": 0, "unmatched": 0, "triage_ms_total": 0.0}
+        logger.info(f"✓ Offline triage ready: {len(RULES)} rules, {len(self.translations)} languages")
+
+    def phrase(self, key: str, language: str) -> str:
+        code = LANGUAGE_CODES.get(language, "en-IN")
+        return self.translations.get(code, {}).get(key) or PHRASES[key]
+
+    def match(self, text: str, language: str = "English", english_text: Optional[str] = None) -> List[Rule]:
+        """Rules whose keywords occur in the text (own language and English)"""
+        code = LANGUAGE_CODES.get(language, "en-IN")
+        native = text.lower()
+        english = (english_text or "").lower()
+        matched = []
+        for rule in RULES:
+            patterns = self.patterns[rule.name]
+            if (code in patterns and patterns[code].search(native)) \
+                    or patterns["en"].search(native) or (english and patterns["en"].search(english)):
+                matched.append(rule)
+        return matched
+
+    def triage(
+        self,
+        text: str,
+        language: str = "English",
+        english_text: Optional[str] = None,
+        fallback_risk: Optional[str] = None
+    ) -> Dict:
+        """
+        Triage without any network call
+
+        Args:
+            text: Symptom text as the patient wrote it
+            language: Patient's language name (LANGUAGE_CODES key)
+            english_text: English translation, when one was obtained
+            fallback_risk: Risk to use when no rule matches (e.g. from the
+                local risk classifier); defaults to MODERATE
+
+        Returns:
+            dict with risk, doctor_summary, advice (in the patient's language),
+            matched rule names and emergency flag
+        """
+        started = time.perf_counter()
+        matched = self.match(text, language, english_text)
+        english_keywords = find_emergency_keywords(english_text or text)
+        emergency = bool(english_keywords) or any(rule.emergency for rule in matched)
+
+        if emergency:
+            risk, summary_key, advice_key = "HIGH", "summary_emergency", "advice_emergency"
+        elif matched:
+            top = max(RISK_ORDER[rule.risk] for rule in matched)
+            rule = next(rule for rule in matched if RISK_ORDER[rule.risk] == top)
+            risk, advice_key = rule.risk, rule.advice
+            if risk == "LOW" and len(matched) >= MULTIPLE_COMPLAINTS:
+                risk = "MODERATE"
+            summary_key = f"summary_{risk.lower()}"
+        else:
+            risk = fallback_risk or "MODERATE"
+            summary_key = "summary_unknown"
+            advice_key = "advice_general" if risk != "HIGH" else "advice_high"
+
+        self.stats["served"] += 1
+        self.stats["emergencies"] += emergency
+        self.stats["unmatched"] += not matched and not emergency
+        self.stats["triage_ms_total"] += (time.perf_counter() - started) * 1000
+        return {
+            "risk": risk,
+            "doctor_summary": self.phrase(summary_key, language),
+            "advice": self.phrase(advice_key, language),
+            "notice": self.phrase("offline_notice", language),
+            "matched": [rule.name for rule in matched] + english_keywords,
+            "emergency": emergency
+        }
+
+    def snapshot(self) -> Dict:
+        served = self.stats["served"] or 1
+        return {**self.stats, "avg_triage_ms": round(self.stats["triage_ms_total"] / served, 3)}
+
+
+async def build_translations(path: str = OFFLINE_TRANSLATIONS_PATH) -> Dict[str, int]:
+    """
+    Regenerate offline_translations.json through Sarvam (run while online)
+
+    Phrases that fail to translate keep their previous translation.
+
+    Returns:
+        Translated phrase count per language code
+    """
+    from sarvam_translator import translate_from_english
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            translations = json.load(f)
+    except (OSError, ValueError):
+        translations = {}
+
+    counts = {}
+    for language, code in LANGUAGE_CODES.items():
+        if code == "en-IN":
+            continue
+        table = translations.setdefault(code, {})
+        counts[code] = 0
+        for key, english in PHRASES.items():
+            result = await translate_from_english(english, language)
+            if result.get("success") and result.get("translated_text"):
+                table[key] = result["translated_text"]
+                counts[code] += 1
+            else:
+                logger.warning(f"⚠️ {code} {key}: {result.get('error')}")
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(translations, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+    return counts
@@ -0,0 +1,257 @@
+"""
+Durable Outbox
+SQLite (WAL mode) store for outbound messages with at-least-once delivery
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Outbox Configuration
+DATA_DIR = os.getenv("NIDAAN_DATA_DIR", "data")
+OUTBOX_PATH = os.path.join(DATA_DIR, "outbox.db")
+# NORMAL is crash-safe in WAL mode (only the last commits can be lost on power failure)
+OUTBOX_SYNCHRONOUS = os.getenv("OUTBOX_SYNCHRONOUS", "NORMAL")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    request_id TEXT,
+    batch_id TEXT,
+    recipient TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    sid TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_ready ON outbox (status, available_at, id);
+CREATE INDEX IF NOT EXISTS idx_outbox_created ON outbox (created_at);
+"""
+
+# Indexes on columns added after the first release (created after migration)
+POST_MIGRATION_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_outbox_batch ON outbox (batch_id, status);
+"""
+
+COLUMNS = (
+    "id", "idempotency_key", "request_id", "batch_id", "recipient", "body", "status",
+    "attempts", "available_at", "sid", "error", "created_at", "updated_at"
+)
+
+
+class Outbox:
+    """
+    Persistent message outbox
+
+    Rows move pending -> inflight -> sent/failed. fetch_batch() leases a
+    batch of due rows; if the process dies before commit_batch(), the
+    lease expires and the rows are delivered again (at-least-once).
+    Duplicate submissions are collapsed by idempotency_key.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={OUTBOX_SYNCHRONOUS}")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.executescript(POST_MIGRATION_SCHEMA)
+        logger.info(f"✓ Outbox opened: {path}")
+
+    def _migrate(self):
+        """Add columns missing from outboxes created by older versions"""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if "batch_id" not in existing:
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN batch_id TEXT")
+            logger.info("Outbox migrated: added batch_id column")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _row(self, values) -> Dict:
+        return dict(zip(COLUMNS, values))
+
+    def enqueue(
+        self,
+        idempotency_key: str,
+        recipient: str,
+        body: str,
+        request_id: Optional[str] = None
+    ) -> Tuple[Dict, bool]:
+        """
+        Persist a message unless its idempotency key was already seen
+
+        Returns:
+            (row, created) - created is False for a duplicate submission
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox "
+                "(idempotency_key, request_id, recipient, body, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (idempotency_key, request_id, recipient, body, now, now, now)
+            )
+            created = cursor.rowcount == 1
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM outbox WHERE idempotency_key = ?",
+                (idempotency_key,)
+            ).fetchone()
+        return self._row(row), created
+
+    def enqueue_many(
+        self,
+        messages: List[Tuple[str, str, str]],
+        batch_id: Optional[str] = None,
+        request_id: Optional[str] = None
+    ) -> int:
+        """
+        Persist many messages in a single transaction
+
+        Args:
+            messages: (idempotency_key, recipient, body) tuples
+            batch_id: Groups the messages for batch_stats()
+            request_id: Originating request id
+
+        Returns:
+            Number of newly created rows (duplicates are skipped)
+        """
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO outbox "
+                    "(idempotency_key, request_id, batch_id, recipient, body, available_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(key, request_id, batch_id, to, body, now, now, now) for key, to, body in messages]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._conn.total_changes - before
+
+    def fetch_batch(self, limit: int = 50, lease_seconds: float = 60.0) -> List[Dict]:
+        """
+        Lease up to `limit` due messages (pending, or inflight with an expired lease)
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM outbox "
+                    "WHERE status IN ('pending', 'inflight') AND available_at <= ? "
+                    "ORDER BY available_at, id LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET status = 'inflight', attempts = attempts + 1, "
+                    "available_at = ?, updated_at = ? WHERE id = ?",
+                    [(now + lease_seconds, now, r[0]) for r in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        batch = []
+        for values in rows:
+            row = self._row(values)
+            row["attempts"] += 1
+            row["status"] = "inflight"
+            batch.append(row)
+        return batch
+
+    def commit_batch(self, acks: List[Dict]):
+        """
+        Record the outcome of leased messages in one transaction
+
+        Each ack is {"id", "status": "sent"|"pending"|"failed", "sid"?, "error"?, "retry_in"?}
+        """
+        if not acks:
+            return
+        now = time.time()
+        params = [
+            (
+                ack["status"],
+                ack.get("sid"),
+                ack.get("error"),
+                now + ack.get("retry_in", 0.0),
+                now,
+                ack["id"]
+            )
+            for ack in acks
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "UPDATE outbox SET status = ?, sid = ?, error = ?, available_at = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    params
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, idempotency_key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM outbox WHERE idempotency_key = ?",
+                (idempotency_key,)
+            ).fetchone()
+        return self._row(row) if row else None
+
+    def batch_stats(self, batch_id: str) -> Dict[str, int]:
+        """Message counts by status for one batch"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM outbox WHERE batch_id = ? GROUP BY status",
+                (batch_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def purge_before(self, cutoff: float, limit: int = 1000) -> int:
+        """
+        Delete up to `limit` messages created before `cutoff` (retention)
+
+        Uses the created_at index, so the cost is proportional to the rows
+        deleted, not the size of the outbox.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM outbox WHERE id IN "
+                "(SELECT id FROM outbox WHERE created_at < ? ORDER BY created_at LIMIT ?)",
+                (cutoff, limit)
+            ).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+
+logger.info("Outbox module loaded")
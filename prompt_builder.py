@@ -0,0 +1,171 @@
+"""
+Prompt Builder
+Assembles triage prompts from precomputed templates within a token budget
+"""
+
+import os
+import re
+import logging
+from typing import Dict, Optional, Tuple
+from prompts import PROMPT_TEMPLATES, TRIAGE_PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Prompt Budget Configuration
+# Upper bound on prompt tokens for one triage call (template + history + symptoms)
+LLM_INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", "1024"))
+# Marker inserted where overlong symptom text was cut
+TRUNCATION_MARKER = " [...] "
+
+_BLANK_RUNS = re.compile(r"\n{2,}")
+_SPACE_RUNS = re.compile(r"[ \t]+")
+
+
+def normalize_whitespace(text: str) -> str:
+    """Strip every line, collapse runs of spaces and blank lines"""
+    lines = [_SPACE_RUNS.sub(" ", line).strip() for line in text.strip().splitlines()]
+    return _BLANK_RUNS.sub("\n", "\n".join(lines))
+
+
+# ==================== TOKEN COUNTING ====================
+def estimate_tokens(text: str) -> int:
+    """
+    Conservative local token estimate (no API call)
+
+    Gemini's tokenizer averages roughly 4 characters per token for English;
+    Indic scripts tokenize far worse, so each non-ASCII character is
+    counted as a whole token. Overestimating only truncates a little early.
+    """
+    if text.isascii():
+        return (len(text) + 3) // 4
+    # Indic letters are 3 bytes in UTF-8: two extra bytes per character
+    non_ascii = (len(text.encode("utf-8")) - len(text)) // 2
+    return (len(text) - non_ascii + 3) // 4 + non_ascii
+
+
+def count_tokens(text: str, model=None, request_options: Optional[dict] = None) -> int:
+    """
+    Token count of text: exact via model.count_tokens() when a model is
+    given (one API round trip, bounded by request_options), otherwise
+    estimate_tokens()
+    """
+    if model is not None:
+        try:
+            return model.count_tokens(text, request_options=request_options).total_tokens
+        except Exception as e:
+            logger.warning(f"⚠️ count_tokens API failed, using estimate: {e}")
+    return estimate_tokens(text)
+
+
+class PromptTemplate:
+    """
+    A normalized template with its fixed parts prebuilt
+
+    `instructions` is sent once as the model's system_instruction; per call
+    only the symptom text (and optional history) is assembled, which is a
+    couple of string concatenations. `prefix` keeps the old inline layout
+    (instructions repeated in every request) for comparison.
+    """
+
+    def __init__(self, version: str, instructions: str):
+        self.version = version
+        self.instructions = normalize_whitespace(instructions)
+        self.user_prefix = "Patient Symptoms:\n"
+        self.prefix = self.instructions + "\n" + self.user_prefix
+        self.history_header = "\nPrevious Visits (most recent first; context only, assess today's symptoms):\n"
+        self._tokens: Optional[int] = None
+
+    def fixed_tokens(self, model=None, request_options: Optional[dict] = None) -> int:
+        """Tokens of the fixed text, counted once per template (cached)"""
+        if self._tokens is None:
+            self._tokens = count_tokens(self.prefix + self.history_header, model, request_options)
+            logger.info(f"✓ Prompt {self.version}: {self._tokens} fixed tokens")
+        return self._tokens
+
+
+TEMPLATES: Dict[str, PromptTemplate] = {
+    version: PromptTemplate(version, text) for version, text in PROMPT_TEMPLATES.items()
+}
+
+
+def get_template(version: str = TRIAGE_PROMPT_VERSION) -> PromptTemplate:
+    if version not in TEMPLATES:
+        raise ValueError(f"Unknown prompt version: {version} (available: {', '.join(TEMPLATES)})")
+    return TEMPLATES[version]
+
+
+# ==================== ASSEMBLY ====================
+def truncate_to_tokens(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """
+    Fit text into max_tokens (estimated), keeping its beginning and end
+
+    Patients tend to lead with the main complaint and end with the latest
+    change, so the middle is what gets cut.
+
+    Returns:
+        (text, truncated)
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+    budget = max(0, max_tokens - estimate_tokens(TRUNCATION_MARKER))
+    head_budget = budget * 2 // 3
+    head = _take_tokens(text, head_budget)
+    tail = _take_tokens(text[::-1], budget - estimate_tokens(head))[::-1]
+    return head.rstrip() + TRUNCATION_MARKER + tail.lstrip(), True
+
+
+def _take_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text whose estimate fits max_tokens"""
+    if text.isascii():
+        return text[:max_tokens * 4]
+    ascii_chars = 0
+    non_ascii = 0
+    for i, ch in enumerate(text):
+        if ord(ch) > 127:
+            non_ascii += 1
+        else:
+            ascii_chars += 1
+        if (ascii_chars + 3) // 4 + non_ascii > max_tokens:
+            return text[:i]
+    return text
+
+
+def build_triage_prompt(
+    symptom_text: str,
+    history: Optional[str] = None,
+    version: str = TRIAGE_PROMPT_VERSION,
+    budget: int = LLM_INPUT_TOKEN_BUDGET,
+    inline_instructions: bool = False
+) -> Tuple[str, Dict]:
+    """
+    Assemble the per-request triage content within the input token budget
+
+    Args:
+        symptom_text: Patient's symptom description (English)
+        history: Optional digest of previous visits (already bounded)
+        version: Prompt template version from prompts.py
+        budget: Maximum prompt tokens (system instruction included)
+        inline_instructions: Repeat the instructions in the content instead
+            of relying on the model's system_instruction
+
+    Returns:
+        (prompt, info) - info has version, estimated_tokens and truncated
+    """
+    template = get_template(version)
+    available = max(64, budget - template.fixed_tokens())
+
+    history_text = ""
+    if history:
+        history_text, _ = truncate_to_tokens(history, available // 4)
+        available -= estimate_tokens(history_text)
+
+    symptoms, truncated = truncate_to_tokens(symptom_text.strip(), available)
+    prompt = (template.prefix if inline_instructions else template.user_prefix) + symptoms
+    if history_text:
+        prompt += template.history_header + history_text
+
+    return prompt, {
+        "version": version,
+        "estimated_tokens": template.fixed_tokens() + estimate_tokens(symptoms) + estimate_tokens(history_text),
+        "truncated": truncated
+    }
@@ -1,3 +1,6 @@
+import os
+
+# Original triage prompt (triage-v1), kept verbatim so old results stay reproducible
 TRIAGE_PROMPT = """
 You are an AI-assisted medical triage system for rural India.
 
@@ -18,3 +21,20 @@ Return STRICT JSON only:
   "advice": ""
 }
 """
+
+# Same instructions, compact JSON shape and explicit length limits so the
+# output fits the token cap in llm.py
+TRIAGE_PROMPT_V2 = """
+You are an AI medical triage assistant for rural India.
+Summarize the symptoms, assign risk (LOW, MODERATE or HIGH) and give conservative advice.
+Do NOT diagnose. If unsure, choose MODERATE. Safety first.
+Reply with JSON only: {"risk": "", "doctor_summary": "", "advice": ""}; each text field at most 3 sentences.
+"""
+
+# Versioned templates; whitespace is normalized once at import (see prompt_builder.py)
+PROMPT_TEMPLATES = {
+    "triage-v1": TRIAGE_PROMPT,
+    "triage-v2": TRIAGE_PROMPT_V2,
+}
+
+TRIAGE_PROMPT_VERSION = os.getenv("TRIAGE_PROMPT_VERSION", "triage-v2")
@@ -0,0 +1,259 @@
+"""
+Re-analysis Queue
+Requests answered by offline triage, re-run through the full pipeline once
+the upstreams are reachable again
+
+Rows live in SQLite (data/reanalysis.db) so they survive restarts; the
+symptom text is stored anonymized.
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from serialization import dumps_str, loads
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Re-analysis Configuration
+DATA_DIR = os.getenv("NIDAAN_DATA_DIR", "data")
+REANALYSIS_PATH = os.path.join(DATA_DIR, "reanalysis.db")
+REANALYSIS_POLL_SECONDS = float(os.getenv("REANALYSIS_POLL_SECONDS", "15"))
+REANALYSIS_BATCH_SIZE = 20
+REANALYSIS_MAX_ATTEMPTS = 5
+# Claimed rows not completed within this window (worker died) are claimed again
+REANALYSIS_LEASE_SECONDS = float(os.getenv("REANALYSIS_LEASE_SECONDS", "600"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reanalysis (
+    request_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    symptom_text TEXT NOT NULL,
+    user_language TEXT NOT NULL,
+    has_image INTEGER NOT NULL DEFAULT 0,
+    offline_risk TEXT NOT NULL,
+    reason TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS idx_reanalysis_pending ON reanalysis (status, created_at);
+"""
+
+COLUMNS = (
+    "request_id", "user_id", "symptom_text", "user_language", "has_image", "offline_risk",
+    "reason", "status", "attempts", "result", "error", "created_at", "updated_at", "lease_until"
+)
+
+
+class ReanalysisQueue:
+    """
+    Persistent queue of offline-triaged requests
+
+    A background loop claims pending rows while `ready()` says the upstream
+    is reachable and hands each to `analyze` (the full online pipeline).
+    Every uvicorn worker polls the same database, so rows are claimed
+    atomically under a lease: pending -> running -> done, back to pending
+    on a failed attempt, or -> failed after REANALYSIS_MAX_ATTEMPTS.
+    """
+
+    def __init__(
+        self,
+        analyze: Callable[[Dict], Awaitable[Dict]],
+        ready: Callable[[], bool] = lambda: True,
+        path: str = REANALYSIS_PATH
+    ):
+        self.analyze = analyze
+        self.ready = ready
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.stats = {"enqueued": 0, "completed": 0, "failed": 0, "risk_changed": 0}
+
+    def _migrate(self):
+        """Add columns missing from queues created by older versions"""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(reanalysis)")}
+        if "lease_until" not in existing:
+            self._conn.execute("ALTER TABLE reanalysis ADD COLUMN lease_until REAL")
+            logger.info("Re-analysis queue migrated: added lease_until column")
+
+    def _row(self, values) -> Dict:
+        row = dict(zip(COLUMNS, values))
+        if row["result"]:
+            row["result"] = loads(row["result"])
+        return row
+
+    # ==================== QUEUE ====================
+    def enqueue(self, request_id: str, symptom_text: str, user_language: str, offline_risk: str,
+                reason: str, user_id: Optional[str] = None, has_image: bool = False):
+        """Persist one offline-triaged request (a repeated request_id is ignored)"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO reanalysis (request_id, user_id, symptom_text, user_language, "
+                "has_image, offline_risk, reason, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (request_id, user_id, symptom_text, user_language, int(has_image), offline_risk, reason, now, now)
+            )
+        if cursor.rowcount:
+            self.stats["enqueued"] += 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def get(self, request_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM reanalysis WHERE request_id = ?", (request_id,)
+            ).fetchone()
+        return self._row(row) if row else None
+
+    def claim(self, limit: int = REANALYSIS_BATCH_SIZE, lease_seconds: float = REANALYSIS_LEASE_SECONDS) -> List[Dict]:
+        """
+        Lease up to `limit` rows (pending, or running with an expired lease)
+
+        One UPDATE ... RETURNING, so concurrent workers never claim the same row.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE reanalysis SET status = 'running', lease_until = ?, updated_at = ? "
+                "WHERE request_id IN (SELECT request_id FROM reanalysis "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT ?) "
+                f"RETURNING {', '.join(COLUMNS)}",
+                (now + lease_seconds, now, now, limit)
+            ).fetchall()
+        return sorted((self._row(row) for row in rows), key=lambda row: row["created_at"])
+
+    def release(self, request_ids: List[str]):
+        """Hand claimed rows back without spending an attempt"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE reanalysis SET status = 'pending', lease_until = NULL, updated_at = ? "
+                "WHERE request_id = ? AND status = 'running'",
+                [(time.time(), request_id) for request_id in request_ids]
+            )
+
+    def complete(self, request_id: str, result: Dict):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reanalysis SET status = 'done', result = ?, symptom_text = '', updated_at = ?, "
+                "lease_until = NULL "
+                "WHERE request_id = ?",
+                (dumps_str(result), time.time(), request_id)
+            )
+
+    def retry_later(self, request_id: str, error: str) -> bool:
+        """Count a failed attempt; True if the row gave up (status failed)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reanalysis SET attempts = attempts + 1, error = ?, updated_at = ?, lease_until = NULL, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END WHERE request_id = ?",
+                (error[:500], time.time(), REANALYSIS_MAX_ATTEMPTS, request_id)
+            )
+            status = self._conn.execute(
+                "SELECT status FROM reanalysis WHERE request_id = ?", (request_id,)
+            ).fetchone()
+        return bool(status) and status[0] == "failed"
+
+    def purge_before(self, cutoff: float, limit: int = 1000) -> int:
+        """Delete up to `limit` rows created before cutoff (retention)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM reanalysis WHERE rowid IN "
+                "(SELECT rowid FROM reanalysis WHERE created_at < ? LIMIT ?)", (cutoff, limit)
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM reanalysis GROUP BY status").fetchall()
+        return dict(rows)
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "by_status": self.counts()}
+
+    # ==================== WORKER ====================
+    async def start(self):
+        """Start the re-analysis loop (called from app lifespan)"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"✓ Re-analysis queue started: {self.path}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        logger.info("Re-analysis queue stopped")
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=REANALYSIS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Re-analysis pass failed: {e}")
+
+    async def run_once(self) -> int:
+        """Re-analyze pending rows while the upstream stays reachable; returns rows completed"""
+        done = 0
+        while self.ready():
+            rows = await asyncio.to_thread(self.claim)
+            if not rows:
+                break
+            for i, row in enumerate(rows):
+                if not self.ready():
+                    await asyncio.to_thread(self.release, [r["request_id"] for r in rows[i:]])
+                    return done
+                try:
+                    result = await self.analyze(row)
+                except asyncio.CancelledError:
+                    # Shutdown: the rows go back to pending (the lease covers a crash)
+                    self.release([r["request_id"] for r in rows[i:]])
+                    raise
+                except Exception as e:
+                    gave_up = await asyncio.to_thread(self.retry_later, row["request_id"], str(e))
+                    self.stats["failed"] += gave_up
+                    logger.warning(f"⚠️ Re-analysis of {row['request_id']} failed: {e}")
+                    # Likely the upstream again; leave the rest for the next poll
+                    # rather than spending an attempt on every pending row
+                    await asyncio.to_thread(self.release, [r["request_id"] for r in rows[i + 1:]])
+                    return done
+                await asyncio.to_thread(self.complete, row["request_id"], result)
+                self.stats["completed"] += 1
+                done += 1
+                if result.get("risk") != row["offline_risk"]:
+                    self.stats["risk_changed"] += 1
+                    logger.warning(
+                        f"⚠️ Re-analysis of {row['request_id']}: offline {row['offline_risk']} "
+                        f"-> {result.get('risk')}"
+                    )
+        return done
@@ -0,0 +1,200 @@
+"""
+Retention Sweeper
+Enforces DATA_RETENTION_DAYS by dropping whole day partitions in the background
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Retention Configuration
+RETENTION_SWEEP_INTERVAL = float(os.getenv("RETENTION_SWEEP_INTERVAL", "3600"))
+# I/O budget for deletions; the sweeper sleeps to stay under it
+RETENTION_BYTES_PER_SECOND = float(os.getenv("RETENTION_BYTES_PER_SECOND", str(32 * 1024 * 1024)))
+# Rows deleted per transaction for SQLite-backed stores
+RETENTION_ROW_CHUNK = 1000
+
+
+class DailyFilePartitions:
+    """
+    A directory of files whose names embed their day, e.g. audit-20250101-4242-0000.seg
+
+    All files of one day form a partition; expiring it is a handful of
+    unlinks, independent of how many records the files hold.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        directory: str,
+        pattern: str,
+        date_format: str = "%Y%m%d",
+        on_drop: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Args:
+            name: Label used in reports
+            directory: Directory to scan
+            pattern: Regex with one group capturing the date part of the filename
+            date_format: strptime format of the captured date
+            on_drop: Called with each deleted path (e.g. to update an index)
+        """
+        self.name = name
+        self.directory = directory
+        self.pattern = re.compile(pattern)
+        self.date_format = date_format
+        self.on_drop = on_drop
+
+    def expired(self, cutoff: datetime) -> Dict[str, List[str]]:
+        """Files grouped by day for every partition older than cutoff"""
+        partitions: Dict[str, List[str]] = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return partitions
+        for filename in names:
+            match = self.pattern.fullmatch(filename)
+            if not match:
+                continue
+            try:
+                day = datetime.strptime(match.group(1), self.date_format)
+            except ValueError:
+                continue
+            if day < cutoff:
+                partitions.setdefault(match.group(1), []).append(os.path.join(self.directory, filename))
+        return partitions
+
+
+class RowPurge:
+    """
+    A SQLite-backed store purged through an indexed range delete
+
+    purge_fn(cutoff_epoch, limit) must delete at most `limit` rows older than
+    the cutoff and return the number deleted; chunks keep write locks short.
+    """
+
+    def __init__(self, name: str, purge_fn: Callable[[float, int], int]):
+        self.name = name
+        self.purge_fn = purge_fn
+
+
+class RetentionSweeper:
+    """
+    Low-priority background task that deletes data past the retention window
+    """
+
+    def __init__(
+        self,
+        retention_days: int,
+        interval: float = RETENTION_SWEEP_INTERVAL,
+        bytes_per_second: float = RETENTION_BYTES_PER_SECOND
+    ):
+        self.retention_days = retention_days
+        self.interval = interval
+        self.bytes_per_second = bytes_per_second
+        self.file_sources: List[DailyFilePartitions] = []
+        self.row_sources: List[RowPurge] = []
+        self.last_report: Optional[Dict] = None
+        self.totals = {"partitions_dropped": 0, "bytes_reclaimed": 0, "rows_deleted": 0, "sweeps": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def add_partitions(self, source: DailyFilePartitions):
+        self.file_sources.append(source)
+
+    def add_rows(self, source: RowPurge):
+        self.row_sources.append(source)
+
+    async def start(self):
+        """Start periodic sweeping (called from app lifespan)"""
+        self._task = asyncio.create_task(self._loop(), name="retention-sweeper")
+        logger.info(f"✓ Retention sweeper started ({self.retention_days} days, every {self.interval:.0f}s)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"❌ Retention sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self, now: Optional[datetime] = None) -> Dict:
+        """
+        Drop every partition and row older than the retention window
+
+        Returns:
+            Report with partitions dropped, bytes reclaimed and rows deleted per source
+        """
+        started = time.monotonic()
+        now = now or datetime.now()
+        # Whole days only: a partition is dropped once its entire day is out of the window
+        cutoff = (now - timedelta(days=self.retention_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        report = {"cutoff": cutoff.isoformat(), "sources": {}}
+
+        for source in self.file_sources:
+            partitions = await asyncio.to_thread(source.expired, cutoff)
+            dropped, reclaimed = 0, 0
+            for day in sorted(partitions):
+                size = await asyncio.to_thread(self._drop_partition, source, partitions[day])
+                dropped += 1
+                reclaimed += size
+                # Throttle: spread deletes so they never compete with request I/O
+                await asyncio.sleep(size / self.bytes_per_second if self.bytes_per_second else 0)
+            report["sources"][source.name] = {"partitions_dropped": dropped, "bytes_reclaimed": reclaimed}
+            self.totals["partitions_dropped"] += dropped
+            self.totals["bytes_reclaimed"] += reclaimed
+
+        cutoff_epoch = cutoff.timestamp()
+        for source in self.row_sources:
+            deleted = 0
+            while True:
+                chunk = await asyncio.to_thread(source.purge_fn, cutoff_epoch, RETENTION_ROW_CHUNK)
+                deleted += chunk
+                if chunk < RETENTION_ROW_CHUNK:
+                    break
+                await asyncio.sleep(0.05)
+            report["sources"][source.name] = {"rows_deleted": deleted}
+            self.totals["rows_deleted"] += deleted
+
+        report["bytes_reclaimed"] = sum(s.get("bytes_reclaimed", 0) for s in report["sources"].values())
+        report["duration_seconds"] = round(time.monotonic() - started, 3)
+        self.totals["sweeps"] += 1
+        self.last_report = report
+        logger.info(
+            f"Retention sweep: {report['bytes_reclaimed']} bytes reclaimed, "
+            f"{sum(s.get('rows_deleted', 0) for s in report['sources'].values())} rows deleted "
+            f"(cutoff {cutoff.date()})"
+        )
+        return report
+
+    def _drop_partition(self, source: DailyFilePartitions, paths: List[str]) -> int:
+        reclaimed = 0
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                reclaimed += size
+                if source.on_drop:
+                    source.on_drop(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"⚠️ Could not delete {path}: {e}")
+        return reclaimed
+
+
+logger.info("Retention module loaded")
@@ -0,0 +1,384 @@
+"""
+Risk Classifier
+In-process first-pass risk model: hashed word n-grams and a calibrated linear model
+
+Trained offline from the (english_symptoms, risk) pairs logged after every
+successful LLM triage; the weights are one float32 .npy array that the API
+memory-maps at startup. Needs numpy; without it (or without a trained model)
+the API simply runs without the classifier.
+
+Usage:
+    python nidaan.py risk-train                 # data/training/risk-pairs-*.jsonl
+    python nidaan.py risk-eval --data labelled.jsonl
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import zlib
+import random
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from write_behind import WriteBehindQueue, DROP_OLDEST
+from serialization import dumps_str, loads
+
+try:
+    import numpy as np
+except ImportError:  # optional: the classifier is disabled without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Risk Classifier Configuration
+DATA_DIR = os.getenv("NIDAAN_DATA_DIR", "data")
+RISK_MODEL_PATH = os.getenv("RISK_MODEL_PATH", os.path.join(DATA_DIR, "risk_model.npy"))
+TRAINING_DIR = os.path.join(DATA_DIR, "training")
+# Log anonymized (english_symptoms, risk) pairs for training
+RISK_TRAINING_LOG = os.getenv("RISK_TRAINING_LOG", "1") == "1"
+# Answer LOW without the LLM at or above this calibrated confidence (>1 disables)
+RISK_EARLY_LOW_CONFIDENCE = float(os.getenv("RISK_EARLY_LOW_CONFIDENCE", "0.95"))
+# When the LLM fails, trust the classifier at or above this confidence (else MODERATE)
+RISK_FALLBACK_MIN_CONFIDENCE = float(os.getenv("RISK_FALLBACK_MIN_CONFIDENCE", "0.6"))
+# Hashed feature space (power of two); 65536 x 3 float32 weights = 768 KB
+RISK_MODEL_FEATURES = 1 << 16
+
+LABELS = ("LOW", "MODERATE", "HIGH")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# ==================== FEATURES ====================
+def _ngrams(text: str) -> List[str]:
+    """Word unigrams and bigrams (bigrams keep negations like "no fever")"""
+    words = _TOKEN.findall(text.lower())
+    return words + [a + " " + b for a, b in zip(words, words[1:])]
+
+
+def featurize(text: str, n_features: int = RISK_MODEL_FEATURES):
+    """
+    Sparse feature vector of text
+
+    crc32 is stable across processes (unlike hash()), so training and
+    serving agree. Values are log term counts, L2-normalized; the last
+    index (n_features) is the bias.
+
+    Returns:
+        (indices, values) numpy arrays
+    """
+    counts: Dict[int, int] = {}
+    mask = n_features - 1
+    for gram in _ngrams(text):
+        index = zlib.crc32(gram.encode()) & mask
+        counts[index] = counts.get(index, 0) + 1
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    norm = float(np.sqrt(values @ values)) or 1.0
+    return np.append(indices, n_features), np.append(values / norm, np.float32(1.0))
+
+
+def _softmax(logits):
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+# ==================== SERVING ====================
+class RiskClassifier:
+    """
+    Memory-mapped weights plus calibration temperature
+
+    predict() touches only the rows of the features present in the text,
+    so a call costs a few dozen crc32s and a (k x 3) dot product.
+    """
+
+    def __init__(self, weights, meta: Dict):
+        self.weights = weights
+        self.meta = meta
+        self.labels = tuple(meta["labels"])
+        self.n_features = meta["n_features"]
+        self.temperature = meta["temperature"]
+        self.stats = {"predictions": 0, "early_low": 0, "fallbacks": 0, "predict_us_total": 0.0}
+
+    @classmethod
+    def load(cls, path: str = RISK_MODEL_PATH) -> Optional["RiskClassifier"]:
+        """Memory-map a trained model; None if numpy or the model file is missing"""
+        if np is None:
+            logger.info("Risk classifier disabled: numpy not installed")
+            return None
+        if not os.path.exists(path):
+            logger.info(f"Risk classifier disabled: no model at {path} (train with: python nidaan.py risk-train)")
+            return None
+        try:
+            with open(_meta_path(path), encoding="utf-8") as f:
+                meta = json.load(f)
+            weights = np.load(path, mmap_mode="r")
+        except Exception as e:
+            logger.error(f"❌ Could not load risk model {path}: {e}")
+            return None
+        logger.info(
+            f"✓ Risk classifier loaded: {path} ({meta['samples']} samples, "
+            f"T={meta['temperature']:.2f}, holdout accuracy {meta.get('metrics', {}).get('accuracy', 'n/a')})"
+        )
+        return cls(weights, meta)
+
+    def probabilities(self, text: str):
+        indices, values = featurize(text, self.n_features)
+        return _softmax((values @ self.weights[indices]) / self.temperature)
+
+    def predict(self, text: str) -> Dict:
+        """
+        Calibrated risk of one symptom text
+
+        Returns:
+            dict with risk, confidence and probabilities per label
+        """
+        started = time.perf_counter()
+        probs = self.probabilities(text)
+        best = int(probs.argmax())
+        self.stats["predictions"] += 1
+        self.stats["predict_us_total"] += (time.perf_counter() - started) * 1e6
+        return {
+            "risk": self.labels[best],
+            "confidence": round(float(probs[best]), 4),
+            "probabilities": {label: round(float(p), 4) for label, p in zip(self.labels, probs)}
+        }
+
+    def is_confident_low(self, prediction: Dict) -> bool:
+        return prediction["risk"] == "LOW" and prediction["confidence"] >= RISK_EARLY_LOW_CONFIDENCE
+
+    def fallback_risk(self, prediction: Dict) -> str:
+        """Risk to report when the LLM failed: HIGH always stands, otherwise only when confident"""
+        if prediction["risk"] == "HIGH" or prediction["confidence"] >= RISK_FALLBACK_MIN_CONFIDENCE:
+            return prediction["risk"]
+        return "MODERATE"
+
+    def snapshot(self) -> Dict:
+        predictions = self.stats["predictions"] or 1
+        return {
+            **self.stats,
+            "avg_predict_us": round(self.stats["predict_us_total"] / predictions, 1),
+            "samples": self.meta["samples"],
+            "trained_at": self.meta.get("trained_at"),
+            "early_low_confidence": RISK_EARLY_LOW_CONFIDENCE,
+        }
+
+
+def _meta_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+# ==================== TRAINING LOG ====================
+class TrainingLog:
+    """
+    Anonymized (english_symptoms, risk) pairs from successful LLM triages
+
+    Appended to one JSONL file per day (data/training/risk-pairs-YYYYMMDD.jsonl)
+    through a lossy write-behind queue; the files expire with the other
+    daily partitions.
+    """
+
+    def __init__(self, directory: str = TRAINING_DIR, enabled: bool = RISK_TRAINING_LOG):
+        self.directory = directory
+        self.enabled = enabled
+        self.writes = WriteBehindQueue(
+            "risk_training", self._write_batch,
+            capacity=8192, batch_size=256, flush_interval=2.0, overflow=DROP_OLDEST
+        )
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, text: str, risk: str, source: str = "llm"):
+        if self.enabled:
+            self.writes.put_nowait({"ts": time.time(), "text": text, "risk": risk, "source": source})
+
+    async def start(self):
+        await self.writes.start()
+
+    async def stop(self):
+        await self.writes.stop()
+
+    def flush(self):
+        self.writes.flush()
+
+    def _write_batch(self, batch: List[Dict]):
+        day = datetime.fromtimestamp(batch[0]["ts"]).strftime("%Y%m%d")
+        path = os.path.join(self.directory, f"risk-pairs-{day}.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(dumps_str(pair) + "\n" for pair in batch))
+
+
+def read_pairs(paths: Sequence[str]) -> Iterator[Tuple[str, str]]:
+    """(text, risk) pairs from JSONL files; rows without text or a known risk are skipped"""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = loads(line)
+                except ValueError:
+                    continue
+                text = row.get("text") or row.get("english_symptoms") or row.get("symptom_text")
+                risk = str(row.get("risk", "")).upper()
+                if text and risk in LABELS:
+                    yield text, risk
+
+
+def default_training_files() -> List[str]:
+    return sorted(glob.glob(os.path.join(TRAINING_DIR, "risk-pairs-*.jsonl")))
+
+
+# ==================== TRAINING ====================
+def _design(texts: Sequence[str], n_features: int):
+    """Stack sparse rows into (rows, indices, values) arrays"""
+    rows, indices, values = [], [], []
+    for row, text in enumerate(texts):
+        idx, val = featurize(text, n_features)
+        rows.append(np.full(len(idx), row, dtype=np.int64))
+        indices.append(idx)
+        values.append(val)
+    return np.concatenate(rows), np.concatenate(indices), np.concatenate(values)
+
+
+def _logits(weights, design, n: int):
+    rows, indices, values = design
+    return np.stack([
+        np.bincount(rows, weights=values * weights[indices, c], minlength=n)
+        for c in range(weights.shape[1])
+    ], axis=1)
+
+
+def fit(texts: Sequence[str], labels: Sequence[str], n_features: int = RISK_MODEL_FEATURES,
+        epochs: int = 300, learning_rate: float = 0.5, l2: float = 1e-5):
+    """
+    Multinomial logistic regression by full-batch AdaGrad
+
+    Classes are weighted by inverse frequency, so the rare HIGH class is
+    not drowned out by LOW.
+
+    Returns:
+        float32 weights of shape (n_features + 1, len(LABELS))
+    """
+    n = len(texts)
+    design = _design(texts, n_features)
+    rows, indices, values = design
+    y = np.array([LABELS.index(label) for label in labels])
+    onehot = np.eye(len(LABELS))[y]
+    class_counts = np.bincount(y, minlength=len(LABELS)).astype(np.float64)
+    sample_weight = (n / (len(LABELS) * np.maximum(class_counts, 1)))[y]
+
+    weights = np.zeros((n_features + 1, len(LABELS)))
+    squared = np.full_like(weights, 1e-8)
+    for _ in range(epochs):
+        delta = (_softmax(_logits(weights, design, n)) - onehot) * (sample_weight / n)[:, None]
+        grad = np.stack([
+            np.bincount(indices, weights=values * delta[rows, c], minlength=n_features + 1)
+            for c in range(len(LABELS))
+        ], axis=1) + l2 * weights
+        squared += grad * grad
+        weights -= learning_rate * grad / np.sqrt(squared)
+    return weights.astype(np.float32)
+
+
+def fit_temperature(logits, y) -> float:
+    """Temperature minimizing held-out negative log-likelihood (grid search)"""
+    best_t, best_nll = 1.0, float("inf")
+    for t in np.exp(np.linspace(np.log(0.25), np.log(8.0), 61)):
+        probs = _softmax(logits / t)
+        nll = -np.log(probs[np.arange(len(y)), y] + 1e-12).mean()
+        if nll < best_nll:
+            best_t, best_nll = float(t), nll
+    return best_t
+
+
+def evaluate(classifier: RiskClassifier, texts: Sequence[str], labels: Sequence[str]) -> Dict:
+    """
+    Accuracy, per-class precision/recall, calibration error and what the
+    early LOW return would do at RISK_EARLY_LOW_CONFIDENCE
+    """
+    if not texts:
+        return {"samples": 0}
+    started = time.perf_counter()
+    probs = np.stack([classifier.probabilities(text) for text in texts])
+    predict_us = (time.perf_counter() - started) / len(texts) * 1e6
+    y = np.array([LABELS.index(label) for label in labels])
+    predicted = probs.argmax(axis=1)
+    confidence = probs.max(axis=1)
+
+    per_class = {}
+    for c, label in enumerate(LABELS):
+        tp = int(((predicted == c) & (y == c)).sum())
+        per_class[label] = {
+            "precision": round(tp / max(1, int((predicted == c).sum())), 4),
+            "recall": round(tp / max(1, int((y == c).sum())), 4),
+            "support": int((y == c).sum())
+        }
+
+    # Expected calibration error over 10 confidence bins
+    bins = np.minimum((confidence * 10).astype(int), 9)
+    ece = sum(
+        abs(float((predicted[bins == b] == y[bins == b]).mean()) - float(confidence[bins == b].mean()))
+        * (bins == b).sum() / len(y)
+        for b in range(10) if (bins == b).any()
+    )
+
+    early = (predicted == 0) & (confidence >= RISK_EARLY_LOW_CONFIDENCE)
+    return {
+        "samples": len(texts),
+        "accuracy": round(float((predicted == y).mean()), 4),
+        "per_class": per_class,
+        "ece": round(float(ece), 4),
+        "early_low": {
+            "threshold": RISK_EARLY_LOW_CONFIDENCE,
+            "coverage": round(float(early.mean()), 4),
+            "precision": round(float((y[early] == 0).mean()), 4) if early.any() else None,
+            "missed_high": int((y[early] == 2).sum()),
+        },
+        "avg_predict_us": round(predict_us, 1)
+    }
+
+
+def train(paths: Sequence[str], output_path: str = RISK_MODEL_PATH, holdout: float = 0.2,
+          epochs: int = 300, n_features: int = RISK_MODEL_FEATURES, seed: int = 13) -> Dict:
+    """
+    Train, calibrate and evaluate on held-out pairs, then save
+
+    Returns:
+        The model metadata (including holdout metrics)
+    """
+    if np is None:
+        raise RuntimeError("numpy is required to train the risk classifier (pip install numpy)")
+    pairs = list(dict.fromkeys(read_pairs(paths)))
+    if len(pairs) < 20:
+        raise ValueError(f"Need at least 20 labelled pairs to train, found {len(pairs)}")
+    random.Random(seed).shuffle(pairs)
+    # Held-out pairs: first half calibrates the temperature, second half is the test set
+    split = max(2, int(len(pairs) * holdout))
+    calibration, test, train_pairs = pairs[:split // 2], pairs[split // 2:split], pairs[split:]
+    texts, labels = zip(*train_pairs)
+    calibration_texts, calibration_labels = zip(*calibration)
+    test_texts, test_labels = zip(*test)
+
+    weights = fit(texts, labels, n_features=n_features, epochs=epochs)
+    calibration_logits = _logits(
+        weights.astype(np.float64), _design(calibration_texts, n_features), len(calibration_texts)
+    )
+    temperature = fit_temperature(
+        calibration_logits, np.array([LABELS.index(label) for label in calibration_labels])
+    )
+
+    meta = {
+        "version": 1,
+        "labels": list(LABELS),
+        "n_features": n_features,
+        "temperature": temperature,
+        "samples": len(train_pairs),
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    meta["metrics"] = evaluate(RiskClassifier(weights, meta), test_texts, test_labels)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    np.save(output_path, weights)
+    with open(_meta_path(output_path), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    logger.info(f"✓ Risk model saved: {output_path} ({weights.nbytes / 1024:.0f} KB)")
+    return meta
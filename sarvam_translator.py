@@ -5,9 +5,13 @@ Multi-language support for Indian languages
 
 import os
 import httpx
+import asyncio
 import logging
 from typing import Optional, Dict
 from dotenv import load_dotenv
+from circuit_breaker import CircuitBreaker
+from single_flight import SingleFlight, flight_key, normalize_text
+from cache_backend import cache
 
 load_dotenv()
 
@@ -16,6 +20,11 @@ logger = logging.getLogger(__name__)
 # Sarvam AI Configuration
 SARVAM_API_KEY = os.getenv("SARVAM_API_KEY")
 SARVAM_API_URL = "https://api.sarvam.ai/translate"
+SARVAM_BASE_URL = "https://api.sarvam.ai/"
+SARVAM_TIMEOUT_SECONDS = float(os.getenv("SARVAM_TIMEOUT_SECONDS", "30"))
+# One pooled client per process: connections (TLS included) are reused
+# across requests instead of being set up for every translation
+SARVAM_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=300)
 
 # Language mapping
 LANGUAGE_CODES = {
@@ -43,6 +52,13 @@ class SarvamTranslator:
     def __init__(self):
         self.api_key = SARVAM_API_KEY
         self.api_url = SARVAM_API_URL
+        # Timeouts, transport errors and 5xx open the circuit; while open,
+        # translate() fails immediately instead of waiting on the timeout
+        self.circuit = CircuitBreaker("sarvam")
+        # Identical concurrent translations share one API call
+        self.flight = SingleFlight("sarvam")
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop = None
         
         if not self.api_key:
             logger.warning("⚠️ SARVAM_API_KEY not found - translation disabled")
@@ -51,6 +67,36 @@ class SarvamTranslator:
             logger.info(f"✓ Sarvam AI initialized with key: {self.api_key[:10]}...")
             self.enabled = True
     
+    def _client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._http_loop is not loop:
+            self._http = httpx.AsyncClient(timeout=SARVAM_TIMEOUT_SECONDS, limits=SARVAM_POOL_LIMITS)
+            self._http_loop = loop
+        return self._http
+    
+    async def warm_up(self):
+        """
+        Open (or keep alive) a pooled connection to Sarvam
+        A HEAD on the API host costs no translation credits; any non-5xx
+        answer means the connection is up.
+        """
+        try:
+            response = await self._client().head(SARVAM_BASE_URL)
+        except httpx.TransportError:
+            self.circuit.record_failure()
+            raise
+        if response.status_code >= 500:
+            self.circuit.record_failure()
+            raise RuntimeError(f"Sarvam returned status {response.status_code}")
+        self.circuit.record_success()
+    
+    async def aclose(self):
+        """Close pooled connections (called on shutdown)"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+    
     async def translate(
         self, 
         text: str, 
@@ -68,6 +114,21 @@ class SarvamTranslator:
         Returns:
             Dict with translated text or None on error
         """
+        key = flight_key(normalize_text(text), source_lang, target_lang)
+        cached = await cache.aget("translation", key)
+        if cached is not None:
+            return cached
+        
+        async def fetch():
+            result = await self._translate(text, source_lang, target_lang)
+            if result.get("success"):
+                await cache.aset("translation", key, result)
+            return result
+        
+        return await self.flight.do(key, fetch)
+    
+    async def _translate(self, text: str, source_lang: str, target_lang: str) -> Optional[Dict]:
+        """One Sarvam API call (see translate)"""
         
         if not self.enabled:
             logger.error("❌ Sarvam AI not enabled")
@@ -77,68 +138,88 @@ class SarvamTranslator:
                 "original_text": text
             }
         
+        if not self.circuit.allow():
+            logger.warning("⚠️ Sarvam circuit open - skipping translation")
+            return {
+                "success": False,
+                "error": "Translation service unavailable (circuit open)",
+                "original_text": text,
+                "circuit_open": True
+            }
+        
         request_id = f"sarvam_{int(os.times()[4] * 1000)}"
         logger.info(f"[{request_id}] Translation request: {source_lang} → {target_lang}")
         logger.debug(f"[{request_id}] Text length: {len(text)} chars")
         logger.debug(f"[{request_id}] Text preview: {text[:100]}...")
         
+        # A half-open trial must end in a verdict or a release, or allow()
+        # keeps rejecting every later call
+        verdict = False
         try:
-            async with httpx.AsyncClient() as client:
-                # Prepare request
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "input": text,
-                    "source_language_code": source_lang,
-                    "target_language_code": target_lang,
-                    "speaker_gender": "Female",  # Optional
-                    "mode": "formal",  # formal/casual
-                    "model": "mayura:v1",  # Sarvam's translation model
-                    "enable_preprocessing": True
-                }
-                
-                logger.debug(f"[{request_id}] Sending request to Sarvam API...")
+            client = self._client()
+            # Prepare request
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+            
+            payload = {
+                "input": text,
+                "source_language_code": source_lang,
+                "target_language_code": target_lang,
+                "speaker_gender": "Female",  # Optional
+                "mode": "formal",  # formal/casual
+                "model": "mayura:v1",  # Sarvam's translation model
+                "enable_preprocessing": True
+            }
+            
+            logger.debug(f"[{request_id}] Sending request to Sarvam API...")
+            
+            response = await client.post(
+                self.api_url,
+                headers=headers,
+                json=payload,
+                timeout=SARVAM_TIMEOUT_SECONDS
+            )
+            
+            logger.debug(f"[{request_id}] Response status: {response.status_code}")
+            
+            if response.status_code >= 500:
+                self.circuit.record_failure()
+            else:
+                self.circuit.record_success()
+            verdict = True
+            
+            if response.status_code == 200:
+                data = response.json()
+                translated_text = data.get("translated_text", "")
                 
-                response = await client.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload,
-                    timeout=30.0
-                )
+                logger.info(f"[{request_id}] ✓ Translation successful")
+                logger.debug(f"[{request_id}] Translated text: {translated_text[:100]}...")
                 
-                logger.debug(f"[{request_id}] Response status: {response.status_code}")
+                return {
+                    "success": True,
+                    "original_text": text,
+                    "translated_text": translated_text,
+                    "source_language": source_lang,
+                    "target_language": target_lang,
+                    "detected_language": data.get("detected_language"),
+                    "confidence": data.get("confidence", 1.0)
+                }
+            else:
+                error_msg = response.text
+                logger.error(f"[{request_id}] ❌ API error: {error_msg}")
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    translated_text = data.get("translated_text", "")
-                    
-                    logger.info(f"[{request_id}] ✓ Translation successful")
-                    logger.debug(f"[{request_id}] Translated text: {translated_text[:100]}...")
-                    
-                    return {
-                        "success": True,
-                        "original_text": text,
-                        "translated_text": translated_text,
-                        "source_language": source_lang,
-                        "target_language": target_lang,
-                        "detected_language": data.get("detected_language"),
-                        "confidence": data.get("confidence", 1.0)
-                    }
-                else:
-                    error_msg = response.text
-                    logger.error(f"[{request_id}] ❌ API error: {error_msg}")
-                    
-                    return {
-                        "success": False,
-                        "error": f"API returned status {response.status_code}",
-                        "original_text": text,
-                        "details": error_msg
-                    }
+                return {
+                    "success": False,
+                    "error": f"API returned status {response.status_code}",
+                    "original_text": text,
+                    "details": error_msg
+                }
         
         except httpx.TimeoutException as e:
+            self.circuit.record_failure()
+            verdict = True
             logger.error(f"[{request_id}] ❌ Timeout: {str(e)}")
             return {
                 "success": False,
@@ -146,6 +227,16 @@ class SarvamTranslator:
                 "original_text": text
             }
         
+        except httpx.TransportError as e:
+            self.circuit.record_failure()
+            verdict = True
+            logger.error(f"[{request_id}] ❌ Connection error: {str(e)}")
+            return {
+                "success": False,
+                "error": "Translation service unreachable",
+                "original_text": text
+            }
+        
         except Exception as e:
             logger.error(f"[{request_id}] ❌ Unexpected error: {str(e)}")
             logger.exception(e)
@@ -155,6 +246,10 @@ class SarvamTranslator:
                 "error": str(e),
                 "original_text": text
             }
+        
+        finally:
+            if not verdict:
+                self.circuit.release()
     
     async def detect_language(self, text: str) -> Optional[str]:
         """
@@ -0,0 +1,212 @@
+"""
+Response Schemas
+One definition of the triage result, used for Gemini's response_schema and for validation
+"""
+
+from typing import List, Literal, Optional, Union
+from pydantic import ConfigDict, Field, StringConstraints, TypeAdapter
+from typing_extensions import Annotated, NotRequired, TypedDict
+
+RISK_LEVELS = ("LOW", "MODERATE", "HIGH")
+# Generous upper bounds; the output token cap in llm.py keeps real answers well below
+SUMMARY_MAX_CHARS = 1500
+ADVICE_MAX_CHARS = 1000
+
+
+class TriageResult(TypedDict):
+    """
+    Validated LLM triage output
+
+    A TypedDict rather than a BaseModel: validation yields the plain dict
+    the handlers use, without building and dumping a model instance.
+    """
+
+    __pydantic_config__ = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    # Exact enum values: response_schema makes the model emit them verbatim
+    risk: Literal["LOW", "MODERATE", "HIGH"]
+    doctor_summary: Annotated[str, StringConstraints(min_length=1, max_length=SUMMARY_MAX_CHARS)]
+    advice: Annotated[str, StringConstraints(min_length=1, max_length=ADVICE_MAX_CHARS)]
+
+
+# Built once at import: validate_json() parses and validates in a single pass
+TRIAGE_RESULT_ADAPTER = TypeAdapter(TriageResult)
+
+# Gemini response_schema (OpenAPI subset: no string length keywords, so the
+# limits are stated in the descriptions and enforced by TriageResult)
+TRIAGE_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "risk": {"type": "string", "format": "enum", "enum": list(RISK_LEVELS)},
+        "doctor_summary": {"type": "string", "description": "Symptom summary, at most 3 sentences"},
+        "advice": {"type": "string", "description": "Conservative advice, at most 3 sentences"},
+    },
+    "required": ["risk", "doctor_summary", "advice"],
+}
+
+
+def parse_triage_result(raw) -> dict:
+    """
+    Parse and validate raw model output
+
+    Args:
+        raw: JSON text (str or bytes) returned by the model
+
+    Returns:
+        dict with risk, doctor_summary and advice
+
+    Raises:
+        pydantic.ValidationError: On invalid JSON or a schema violation
+    """
+    return TRIAGE_RESULT_ADAPTER.validate_json(raw)
+
+
+# ==================== API RESPONSES ====================
+# Declared response shapes: FastAPI serializes these with pydantic's compiled
+# serializer instead of walking the returned dict with jsonable_encoder
+
+
+class ConsentResponse(TypedDict):
+    success: bool
+    message: str
+    consent_id: str
+
+
+class HistoryRecord(TypedDict):
+    user_id: str
+    request_id: str
+    timestamp: str
+    risk: Literal["LOW", "MODERATE", "HIGH"]
+    language: str
+    summary: str
+    advice: str
+
+
+class HistoryPage(TypedDict):
+    success: bool
+    records: List[HistoryRecord]
+    count: int
+    next_cursor: Optional[str]
+
+
+class ReanalysisStatus(TypedDict):
+    success: bool
+    request_id: str
+    status: Literal["pending", "running", "done", "failed"]
+    offline_risk: str
+    reason: Optional[str]
+    attempts: int
+    result: Optional[TriageResult]
+
+
+# ==================== /analyze RESPONSES ====================
+# One shape per status; the union is discriminated on "status" so a
+# response is validated against its own variant only
+
+
+class ComplianceInfo(TypedDict):
+    data_retention_days: int
+    anonymized: bool
+    audit_logged: bool
+
+
+class EmergencyContacts(TypedDict):
+    ambulance: str
+    police: str
+    fire: str
+
+
+class AnalyzeResult(TypedDict):
+    """Triage from Gemini or the local risk model"""
+
+    risk: Literal["LOW", "MODERATE", "HIGH"]
+    doctor_summary: str
+    advice: str
+    status: Literal["success", "classifier_low", "classifier_fallback"]
+    request_id: str
+    user_language: str
+    whatsapp_enabled: bool
+    translation_used: bool
+    compliance: ComplianceInfo
+
+
+class OfflineInfo(TypedDict):
+    reason: str
+    matched: List[str]
+    reanalysis: Literal["queued", "unavailable"]
+
+
+class AnalyzeOffline(TypedDict):
+    """Rule-based answer while Gemini is unavailable (see /reanalysis)"""
+
+    risk: Literal["LOW", "MODERATE", "HIGH"]
+    doctor_summary: str
+    advice: str
+    status: Literal["offline_triage"]
+    request_id: str
+    user_language: str
+    whatsapp_enabled: bool
+    translation_used: bool
+    offline: OfflineInfo
+    compliance: ComplianceInfo
+    emergency_contacts: NotRequired[EmergencyContacts]
+
+
+class AnalyzeEmergency(TypedDict):
+    risk: Literal["HIGH"]
+    doctor_summary: str
+    advice: str
+    status: Literal["emergency_detected"]
+    debug_keywords: List[str]
+    emergency_contacts: EmergencyContacts
+
+
+class AnalyzeConsentRequired(TypedDict):
+    risk: Literal["ERROR"]
+    doctor_summary: str
+    advice: str
+    status: Literal["consent_required"]
+    request_id: str
+
+
+class AnalyzeIncompleteInput(TypedDict):
+    risk: Literal["LOW"]
+    doctor_summary: str
+    advice: str
+    status: Literal["incomplete_input"]
+
+
+class AnalyzePartialFailure(TypedDict):
+    risk: Literal["MODERATE"]
+    doctor_summary: str
+    advice: str
+    status: Literal["ai_partial_failure"]
+
+
+AnalyzeResponse = Annotated[
+    Union[AnalyzeResult, AnalyzeOffline, AnalyzeEmergency,
+          AnalyzeConsentRequired, AnalyzeIncompleteInput, AnalyzePartialFailure],
+    Field(discriminator="status")
+]
+
+
+# ==================== COMPACT WIRE FORMAT ====================
+# /analyze?compact=1 for 2G/3G clients: short keys, and the compliance block,
+# translation flag and debug fields dropped. doctor_summary is sent without
+# the formatted frame (which repeats the risk and advice); clients render it.
+COMPACT_KEYS = {
+    "risk": "r",
+    "doctor_summary": "s",
+    "advice": "a",
+    "status": "st",
+    "request_id": "id",
+    "user_language": "l",
+    "whatsapp_enabled": "w",
+    "offline": "o",
+    "emergency_contacts": "e",
+}
+
+
+def compact_analyze(response: dict) -> dict:
+    """Short-key form of an /analyze response; unlisted fields are dropped"""
+    return {COMPACT_KEYS[key]: value for key, value in response.items() if key in COMPACT_KEYS}
@@ -0,0 +1,86 @@
+"""
+Serialization
+One fast JSON path for API responses, audit records, queues and caches
+
+orjson encodes straight to UTF-8 bytes (Indic text and box-drawing
+characters are written as-is, not \\u-escaped) and is several times faster
+than the json module; without orjson the same functions fall back to json.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+if orjson is not None:
+    # Non-str dict keys (e.g. int counters in metrics) are stringified like json does
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value: Any) -> bytes:
+        """Compact UTF-8 JSON bytes"""
+        return orjson.dumps(value, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    logger.warning("⚠️ orjson not installed - using the standard json module")
+
+    def dumps(value: Any) -> bytes:
+        """Compact UTF-8 JSON bytes"""
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps_str(value: Any) -> str:
+    """Compact JSON text (for SQLite TEXT columns and log lines)"""
+    return dumps(value).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class of the API: renders with dumps()
+
+    Handlers returning a Response skip FastAPI's jsonable_encoder walk;
+    routes with a response_model are serialized by pydantic and then
+    rendered here.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class StaticBody:
+    """
+    A JSON object encoded once at startup
+
+    response() sends the cached bytes as-is; per-request fields are encoded
+    on their own and spliced in before the closing brace, so they must not
+    repeat a static key.
+
+    Args:
+        content: The fixed fields
+        compact: Optional key mapping for a compact variant, applied to the
+            fixed fields once and to the per-request fields on each call
+    """
+
+    def __init__(self, content: Dict[str, Any], compact: Optional[Callable[[Dict], Dict]] = None):
+        self.body = dumps(content)
+        self.compact = compact
+        self.compact_body = dumps(compact(content)) if compact else self.body
+
+    def response(self, status_code: int = 200, compact: bool = False, **dynamic: Any) -> Response:
+        body = self.body
+        if compact and self.compact:
+            body = self.compact_body
+            dynamic = self.compact(dynamic)
+        if dynamic:
+            body = body[:-1] + (b"," if len(body) > 2 else b"") + dumps(dynamic)[1:]
+        return Response(body, status_code=status_code, media_type="application/json")
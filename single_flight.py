@@ -0,0 +1,104 @@
+"""
+Single-Flight
+Coalesce identical concurrent upstream calls: the first caller for a key
+starts the call, duplicates arriving while it is in flight await the same
+result instead of issuing their own
+"""
+
+import copy
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different submissions share a key"""
+    return " ".join(text.split())
+
+
+def flight_key(*parts: Any) -> str:
+    """Compact key from the parts that determine the upstream answer"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    In-flight call table for one upstream
+
+    Every caller awaits the shared task through asyncio.shield, so a caller
+    that is cancelled (client gone, deadline hit) only stops waiting; the
+    call is cancelled once no caller is left. Exceptions reach every
+    waiter. Results are not cached past completion.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {"calls": 0, "upstream": 0, "coalesced": 0, "errors": 0, "abandoned": 0, "max_waiters": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() for key, or join the call already in flight
+
+        Args:
+            key: Identity of the request (see flight_key)
+            fn: Starts the upstream call; only invoked by the first caller
+
+        Returns:
+            The call's result (a shallow copy for callers that joined)
+        """
+        self.stats["calls"] += 1
+        call = self._calls.get(key)
+        joined = call is not None
+        if joined:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["upstream"] += 1
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finished(key, call, task))
+
+        call.waiters += 1
+        self.stats["max_waiters"] = max(self.stats["max_waiters"], call.waiters)
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody wants the answer any more
+                self.stats["abandoned"] += 1
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+        # Callers may annotate their result; joiners must not see each other's edits
+        return copy.copy(result) if joined else result
+
+    def _finished(self, key: str, call: _Call, task: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+
+    def snapshot(self) -> Dict:
+        calls = self.stats["calls"] or 1
+        return {
+            **self.stats,
+            "in_flight": len(self._calls),
+            "coalesce_rate": round(self.stats["coalesced"] / calls, 4)
+        }
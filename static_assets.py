@@ -0,0 +1,223 @@
+"""
+Static Assets
+Serve the web frontend from the API itself: same origin (no CORS
+preflight before /analyze), precompressed, fingerprinted and cacheable
+
+At startup every asset is read once and kept in memory:
+- CSS/JS/images get a content hash in their URL (/assets/chat.3f9a1c2b7e.js)
+  and are cached by browsers for a year as immutable
+- HTML pages (/app/, /app/chat.html) keep their names, are revalidated on
+  each visit (ETag/304) and reference the fingerprinted URLs
+- Text is precompressed with brotli and gzip at maximum levels, images are
+  re-encoded to AVIF/WebP; each request gets the best variant it accepts
+"""
+
+import io
+import os
+import re
+import gzip
+import hashlib
+import logging
+from typing import Dict, List, NamedTuple, Optional
+from fastapi import Request
+from fastapi.responses import Response
+from compression import negotiate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frontend files, relative to ASSET_DIR
+FRONTEND_FILES = ("static/hero_bg.png", "styles.css", "chat.css", "main.js", "chat.js", "index.html", "chat.html")
+ASSET_URL = "/assets/"
+PAGE_URL = "/app/"
+
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+AVIF_QUALITY = 55
+WEBP_QUALITY = 80
+
+# Quoted or url() references to other assets, e.g. href="styles.css", url("./static/hero_bg.png")
+_REFERENCE = re.compile(r"""(?P<open>["'(])(?:\./)?(?P<path>[\w./-]+\.(?:css|js|png))(?P<close>["')])""")
+
+
+class Variant(NamedTuple):
+    body: bytes
+    content_type: str
+    # Content-Encoding for precompressed text, None otherwise
+    encoding: Optional[str]
+    tag: str
+
+
+class Asset:
+    """One file with its variants, most preferred first"""
+
+    def __init__(self, path: str, url: str, digest: str, variants: List[Variant], immutable: bool):
+        self.path = path
+        self.url = url
+        self.digest = digest
+        self.variants = variants
+        self.immutable = immutable
+        self.is_image = variants[-1].content_type.startswith("image/")
+
+    def pick(self, request: Request) -> Variant:
+        """Best variant for the request's Accept / Accept-Encoding"""
+        if self.is_image:
+            accept = request.headers.get("accept", "")
+            for variant in self.variants[:-1]:
+                if _accepts(accept, variant.content_type):
+                    return variant
+            return self.variants[-1]
+        encoding = negotiate(request.headers.get("accept-encoding", ""))
+        for variant in self.variants:
+            if variant.encoding in (encoding, None):
+                return variant
+        return self.variants[-1]
+
+
+def _accepts(accept: str, content_type: str) -> bool:
+    for part in accept.lower().split(","):
+        name, _, params = part.partition(";")
+        if name.strip() == content_type:
+            return params.strip() not in ("q=0", "q=0.0")
+    return False
+
+
+def _digest(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=5).hexdigest()
+
+
+def _compressed(body: bytes, content_type: str, tag: str) -> List[Variant]:
+    """brotli/gzip variants (only where they actually save bytes), then identity"""
+    variants = []
+    if brotli is not None:
+        variants.append(Variant(brotli.compress(body, quality=11), content_type, "br", f"{tag}-br"))
+    variants.append(Variant(gzip.compress(body, compresslevel=9, mtime=0), content_type, "gzip", f"{tag}-gz"))
+    variants = [v for v in variants if len(v.body) < len(body)]
+    return variants + [Variant(body, content_type, None, tag)]
+
+
+def _reencoded(body: bytes, content_type: str, tag: str) -> List[Variant]:
+    """AVIF/WebP encodings of an image (where smaller), then the original"""
+    variants = []
+    if Image is not None:
+        image = Image.open(io.BytesIO(body))
+        for fmt, mime, options in (("AVIF", "image/avif", {"quality": AVIF_QUALITY}),
+                                   ("WEBP", "image/webp", {"quality": WEBP_QUALITY, "method": 6})):
+            if not features.check(fmt.lower()):
+                continue
+            out = io.BytesIO()
+            try:
+                image.save(out, fmt, **options)
+            except Exception as e:
+                logger.warning(f"⚠️ {fmt} encoding failed: {type(e).__name__}: {e}")
+                continue
+            if out.tell() < len(body):
+                variants.append(Variant(out.getvalue(), mime, None, f"{tag}-{fmt.lower()}"))
+    return variants + [Variant(body, content_type, None, tag)]
+
+
+class StaticAssets:
+    """
+    In-memory frontend bundle
+
+    Args:
+        root: Directory holding FRONTEND_FILES
+        files: Relative paths; referenced assets must come before the files
+            that reference them (images, then CSS/JS, then HTML)
+    """
+
+    def __init__(self, root: str = ASSET_DIR, files=FRONTEND_FILES):
+        self.root = root
+        self.files = files
+        self.assets: Dict[str, Asset] = {}   # URL -> asset
+        self.urls: Dict[str, str] = {}       # relative path -> URL
+        self.stats = {"served": 0, "not_modified": 0, "bytes_sent": 0}
+
+    def build(self):
+        """Read, rewrite, fingerprint and encode every file (blocking; run in a thread)"""
+        for path in self.files:
+            full_path = os.path.join(self.root, path)
+            if not os.path.exists(full_path):
+                logger.warning(f"⚠️ Frontend file missing: {path}")
+                continue
+            with open(full_path, "rb") as f:
+                body = f.read()
+            name, ext = os.path.splitext(path)
+            content_type = CONTENT_TYPES.get(ext, "application/octet-stream")
+            if ext in (".html", ".css", ".js"):
+                body = self._rewrite(body, os.path.dirname(path))
+            digest = _digest(body)
+            page = ext == ".html"
+            if page:
+                url = PAGE_URL if path == "index.html" else PAGE_URL + path
+            else:
+                url = f"{ASSET_URL}{name}.{digest}{ext}"
+            variants = (_reencoded if content_type.startswith("image/") else _compressed)(body, content_type, digest)
+            self.assets[url] = Asset(path, url, digest, variants, immutable=not page)
+            self.urls[path] = url
+
+        logger.info(
+            f"✓ Frontend assets ready: {len(self.assets)} files, "
+            f"{sum(len(a.variants[-1].body) for a in self.assets.values()) // 1024} KB "
+            f"→ {sum(len(a.variants[0].body) for a in self.assets.values()) // 1024} KB best variants"
+        )
+
+    def _rewrite(self, body: bytes, directory: str) -> bytes:
+        """Point references to other frontend files at their fingerprinted URLs"""
+        def replace(match):
+            path = os.path.normpath(os.path.join(directory, match.group("path"))).replace(os.sep, "/")
+            url = self.urls.get(path)
+            if url is None:
+                return match.group(0)
+            return f"{match.group('open')}{url}{match.group('close')}"
+        return _REFERENCE.sub(replace, body.decode("utf-8")).encode("utf-8")
+
+    def response(self, url: str, request: Request) -> Optional[Response]:
+        """
+        Serve one asset (None if unknown)
+
+        Args:
+            url: Request path, e.g. /assets/chat.3f9a1c2b7e.js or /app/
+            request: For content negotiation and If-None-Match
+        """
+        asset = self.assets.get(url)
+        if asset is None:
+            return None
+        variant = asset.pick(request)
+        headers = {
+            "ETag": f'"{variant.tag}"',
+            "Cache-Control": IMMUTABLE if asset.immutable else REVALIDATE,
+            "Vary": "Accept" if asset.is_image else "Accept-Encoding",
+        }
+        if variant.encoding:
+            headers["Content-Encoding"] = variant.encoding
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and headers["ETag"] in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        self.stats["served"] += 1
+        self.stats["bytes_sent"] += len(variant.body)
+        return Response(variant.body, media_type=variant.content_type, headers=headers)
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "assets": len(self.assets)}
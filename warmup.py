@@ -0,0 +1,132 @@
+"""
+Upstream Warm-up
+Open the Gemini, Sarvam and Twilio connections at startup and keep them warm
+while idle, so the first real request does not pay for channel setup and TLS
+
+Each upstream registers a probe: a tiny request that costs nothing (no
+generation, no translation, no message) but travels over the same
+connection pool as real traffic. Probes run once during startup and again
+whenever an upstream has been idle for WARMUP_IDLE_SECONDS.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Warm-up Configuration
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+# Re-probe an upstream after this long without traffic; keep it below the
+# providers' idle connection timeouts
+WARMUP_IDLE_SECONDS = float(os.getenv("WARMUP_IDLE_SECONDS", "120"))
+# How often the idle check runs
+WARMUP_CHECK_SECONDS = 30
+# A probe slower than this counts as failed
+WARMUP_PROBE_TIMEOUT = 15
+
+
+class Probe:
+    """
+    One upstream's warm-up request
+
+    Args:
+        name: Upstream label used in logs and metrics
+        probe: Coroutine function issuing the tiny request (raises on failure)
+        last_used: monotonic time of the last real call, if tracked; probes
+            are skipped while real traffic keeps the connection warm
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable[None]],
+                 last_used: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.probe = probe
+        self.last_used = last_used
+        self.last_probe = 0.0
+        self.cold_ms: Optional[float] = None
+        self.warm_ms: Optional[float] = None
+        self.stats = {"probes": 0, "failures": 0, "idle_rewarms": 0}
+
+    def idle_for(self, now: float) -> float:
+        last = max(self.last_probe, self.last_used() if self.last_used else 0.0)
+        return now - last
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "cold_ms": round(self.cold_ms, 1) if self.cold_ms is not None else None,
+            "warm_ms": round(self.warm_ms, 1) if self.warm_ms is not None else None,
+            "idle_seconds": round(self.idle_for(time.monotonic()), 1) if self.last_probe else None
+        }
+
+
+class Warmer:
+    """
+    Runs the registered probes at startup and while idle
+
+    The first successful probe of each upstream is its cold latency (new
+    connection, TLS, auth); later probes show the warm latency. Both are
+    reported in /metrics, so the saving is visible per deployment.
+    """
+
+    def __init__(self):
+        self.probes: List[Probe] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, probe: Callable[[], Awaitable[None]],
+            last_used: Optional[Callable[[], float]] = None):
+        self.probes.append(Probe(name, probe, last_used))
+
+    async def start(self):
+        """Warm every upstream in the background (called from app lifespan)"""
+        if not WARMUP_ENABLED or not self.probes:
+            return
+        self._task = asyncio.create_task(self._loop(), name="upstream-warmup")
+        logger.info(f"✓ Warm-up started: {', '.join(p.name for p in self.probes)}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        # Startup round: all upstreams at once, without delaying startup
+        await asyncio.gather(*(self.run_probe(p) for p in self.probes))
+        while True:
+            await asyncio.sleep(WARMUP_CHECK_SECONDS)
+            now = time.monotonic()
+            idle = [p for p in self.probes if p.idle_for(now) >= WARMUP_IDLE_SECONDS]
+            for p in idle:
+                p.stats["idle_rewarms"] += 1
+            if idle:
+                await asyncio.gather(*(self.run_probe(p) for p in idle))
+
+    async def run_probe(self, probe: Probe) -> bool:
+        """Run one probe; returns whether it succeeded"""
+        started = time.perf_counter()
+        probe.stats["probes"] += 1
+        try:
+            await asyncio.wait_for(probe.probe(), timeout=WARMUP_PROBE_TIMEOUT)
+        except Exception as e:
+            probe.stats["failures"] += 1
+            logger.warning(f"⚠️ Warm-up probe {probe.name} failed: {type(e).__name__}: {e}")
+            return False
+        finally:
+            probe.last_probe = time.monotonic()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if probe.cold_ms is None:
+            probe.cold_ms = elapsed_ms
+            logger.info(f"✓ {probe.name} warmed up in {elapsed_ms:.0f} ms")
+        else:
+            probe.warm_ms = elapsed_ms
+            logger.debug(f"{probe.name} keep-alive probe: {elapsed_ms:.0f} ms")
+        return True
+
+    def snapshot(self) -> Dict:
+        return {p.name: p.snapshot() for p in self.probes}
@@ -0,0 +1,298 @@
+"""
+WhatsApp Delivery Queue
+Async worker pool that drains outbound Twilio messages off the request path
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from twilio.base.exceptions import TwilioRestException
+
+from outbox import Outbox
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Queue Configuration
+WHATSAPP_WORKERS = int(os.getenv("WHATSAPP_WORKERS", "4"))
+# Twilio's per-sender throughput (sandbox senders are ~1 msg/sec)
+WHATSAPP_RATE_PER_SECOND = float(os.getenv("WHATSAPP_RATE_PER_SECOND", "1"))
+WHATSAPP_MAX_ATTEMPTS = int(os.getenv("WHATSAPP_MAX_ATTEMPTS", "5"))
+WHATSAPP_BACKOFF_SECONDS = float(os.getenv("WHATSAPP_BACKOFF_SECONDS", "2"))
+WHATSAPP_BACKOFF_MAX_SECONDS = 300.0
+# How often the dispatcher polls the outbox for due retries
+WHATSAPP_POLL_SECONDS = 1.0
+# Leased messages not acknowledged within this window are redelivered
+WHATSAPP_LEASE_SECONDS = 120.0
+
+
+def _recipient_key(to: str) -> str:
+    """Pseudonymous recipient part of a broadcast job id"""
+    return hashlib.sha256(to.encode()).hexdigest()[:16]
+
+
+class TokenBucket:
+    """
+    Async token bucket shared by all workers of one sender
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Decide whether a failed send is worth retrying
+
+    Twilio 429 (rate limited) and 5xx responses are transient; other 4xx
+    errors (invalid number, unverified recipient) will never succeed.
+    Network-level errors are retried.
+    """
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return True
+
+
+class WhatsAppQueue:
+    """
+    Outbox-backed delivery queue with a rate-limited worker pool and retries
+
+    Messages are persisted to the Outbox before submit() returns, so they
+    survive restarts and Twilio outages. A dispatcher leases due rows in
+    batches, workers send them, and outcomes are committed back in batches.
+    """
+
+    def __init__(
+        self,
+        send_fn: Callable[[str, str], str],
+        outbox: Outbox,
+        workers: int = WHATSAPP_WORKERS,
+        rate_per_second: float = WHATSAPP_RATE_PER_SECOND,
+        max_attempts: int = WHATSAPP_MAX_ATTEMPTS,
+        backoff_seconds: float = WHATSAPP_BACKOFF_SECONDS,
+        on_result: Optional[Callable[[Dict], None]] = None
+    ):
+        """
+        Args:
+            send_fn: Blocking function (to, body) -> message SID; run in an executor
+            outbox: Durable store the queue drains
+            workers: Number of concurrent worker tasks
+            rate_per_second: Max sends per second for the sender number
+            max_attempts: Attempts before a job is marked failed
+            backoff_seconds: Base delay for exponential backoff
+            on_result: Optional callback invoked with the job when it finishes
+        """
+        self.send_fn = send_fn
+        self.outbox = outbox
+        self.num_workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.on_result = on_result
+        self.bucket = TokenBucket(rate_per_second)
+        self._queue: Optional[asyncio.Queue] = None
+        self._acks: List[Dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Spawn the dispatcher and worker pool (called from app lifespan)"""
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()  # pick up messages left over from a previous run
+        self._tasks = [asyncio.create_task(self._dispatcher(), name="whatsapp-dispatcher")]
+        self._tasks += [
+            asyncio.create_task(self._worker(i), name=f"whatsapp-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+        logger.info(f"✓ WhatsApp queue started with {self.num_workers} workers")
+
+    async def stop(self):
+        """Cancel tasks and commit outstanding acks; unsent rows stay in the outbox"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._flush_acks()
+        logger.info("WhatsApp queue stopped")
+
+    async def submit(
+        self,
+        to: str,
+        body: str,
+        request_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
+        """
+        Durably enqueue a message and return its job immediately
+
+        Args:
+            to: Recipient in Twilio format ("whatsapp:+91...")
+            body: Message body
+            request_id: Originating request id for log correlation
+            idempotency_key: Client-supplied key; resubmissions return the original job
+
+        Returns:
+            Public job view; "duplicate" is True if the key was already known
+        """
+        job_id = idempotency_key or uuid.uuid4().hex
+        row, created = await asyncio.to_thread(self.outbox.enqueue, job_id, to, body, request_id)
+        if created and self._wakeup is not None:
+            self._wakeup.set()
+        logger.debug(f"[{request_id}] WhatsApp job {'queued' if created else 'deduplicated'}: {job_id}")
+        return {**self._public(row), "duplicate": not created}
+
+    async def submit_many(
+        self,
+        messages: List[Tuple[str, str]],
+        batch_id: str,
+        request_id: Optional[str] = None
+    ) -> int:
+        """
+        Durably enqueue a broadcast in one outbox transaction
+
+        Each message's job id is "<batch_id>:<hash of recipient>": stable
+        across retries (in any order) of a broadcast with the same batch_id,
+        so nobody is messaged twice, without exposing phone numbers in ids.
+
+        Args:
+            messages: (to, body) pairs with unique recipients
+            batch_id: Broadcast id used for progress polling
+            request_id: Originating request id for log correlation
+
+        Returns:
+            Number of newly queued messages
+        """
+        rows = [(f"{batch_id}:{_recipient_key(to)}", to, body) for to, body in messages]
+        created = await asyncio.to_thread(self.outbox.enqueue_many, rows, batch_id, request_id)
+        if created and self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"[{request_id}] WhatsApp broadcast {batch_id}: {created}/{len(rows)} messages queued")
+        return created
+
+    async def get_batch_status(self, batch_id: str) -> Dict:
+        """Progress of a broadcast: counts per status and completion ratio"""
+        counts = await asyncio.to_thread(self.outbox.batch_stats, batch_id)
+        total = sum(counts.values())
+        done = counts.get("sent", 0) + counts.get("failed", 0)
+        return {
+            "batch_id": batch_id,
+            "total": total,
+            "queued": counts.get("pending", 0),
+            "sending": counts.get("inflight", 0),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "progress": round(done / total, 4) if total else 0.0,
+            "complete": total > 0 and done == total
+        }
+
+    async def get_status(self, job_id: str) -> Optional[Dict]:
+        """Public view of a job (message body omitted)"""
+        row = await asyncio.to_thread(self.outbox.get, job_id)
+        return self._public(row) if row else None
+
+    def _public(self, row: Dict) -> Dict:
+        return {
+            "job_id": row["idempotency_key"],
+            "request_id": row["request_id"],
+            "batch_id": row["batch_id"],
+            "status": "queued" if row["status"] == "pending" and row["attempts"] == 0
+                      else "retrying" if row["status"] == "pending"
+                      else "sending" if row["status"] == "inflight"
+                      else row["status"],
+            "attempts": row["attempts"],
+            "sid": row["sid"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    async def _flush_acks(self):
+        if not self._acks:
+            return
+        acks, self._acks = self._acks, []
+        await asyncio.to_thread(self.outbox.commit_batch, acks)
+
+    async def _dispatcher(self):
+        """Commit finished acks and lease the next batch when workers run dry"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=WHATSAPP_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self._flush_acks()
+                if self._queue.qsize() < self.num_workers:
+                    batch = await asyncio.to_thread(
+                        self.outbox.fetch_batch,
+                        self.num_workers * 2,
+                        WHATSAPP_LEASE_SECONDS
+                    )
+                    for row in batch:
+                        self._queue.put_nowait(row)
+                    if batch:
+                        logger.debug(f"WhatsApp dispatcher leased {len(batch)} messages")
+            except Exception as e:
+                logger.error(f"❌ WhatsApp dispatcher error: {e}")
+
+    async def _worker(self, worker_id: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._queue.get()
+            await self.bucket.acquire()
+
+            ack = {"id": row["id"]}
+            try:
+                ack["sid"] = await loop.run_in_executor(None, self.send_fn, row["recipient"], row["body"])
+                ack["status"] = "sent"
+                logger.info(f"[{row['request_id']}] ✓ WhatsApp sent: {ack['sid']} (worker {worker_id})")
+
+            except Exception as e:
+                ack["error"] = getattr(e, "msg", None) or str(e)
+                if is_retryable(e) and row["attempts"] < self.max_attempts:
+                    ack["status"] = "pending"
+                    ack["retry_in"] = min(
+                        WHATSAPP_BACKOFF_MAX_SECONDS,
+                        self.backoff_seconds * (2 ** (row["attempts"] - 1))
+                    )
+                    logger.warning(
+                        f"[{row['request_id']}] WhatsApp job {row['idempotency_key']} "
+                        f"retry in {ack['retry_in']:.1f}s"
+                    )
+                else:
+                    ack["status"] = "failed"
+                    logger.error(f"[{row['request_id']}] ❌ WhatsApp job {row['idempotency_key']} failed: {ack['error']}")
+
+            self._acks.append(ack)
+            self._wakeup.set()
+
+            if ack["status"] in ("sent", "failed") and self.on_result:
+                try:
+                    self.on_result({**row, **ack})
+                except Exception as e:
+                    logger.error(f"WhatsApp on_result callback failed: {e}")
+
+
+logger.info("WhatsApp queue module loaded")
@@ -0,0 +1,268 @@
+"""
+Write-Behind Queue
+Bounded in-memory queue in front of a batch sink, so request handlers never wait on disk
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from serialization import dumps
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("NIDAAN_DATA_DIR", "data")
+# DROP_OLDEST records the sink still rejects one by one: <queue>-YYYYMMDD.jsonl
+DEAD_LETTER_DIR = os.path.join(DATA_DIR, "dead_letter")
+
+# Overflow policies
+DROP_OLDEST = "drop_oldest"    # lossy streams (audit ring): keep the newest records
+REJECT = "reject"              # records that must not be lost: caller gets QueueFull
+
+# Pause before retrying a batch whose sink raised, doubled per consecutive failure
+RETRY_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 30.0
+# Failed attempts before a DROP_OLDEST batch is split into per-record writes
+# (and before flush() gives up on a REJECT batch)
+MAX_BATCH_ATTEMPTS = 3
+
+
+def _jsonable(value: Any) -> Any:
+    """Record as JSON-encodable data (bytes as hex, tuples as lists)"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+class QueueFull(Exception):
+    """Raised by put_nowait() when a REJECT queue is at capacity"""
+
+
+class WriteBehindQueue:
+    """
+    Handlers call put_nowait() (a deque append); a background task hands
+    batches of up to `batch_size` records to `sink` in a worker thread,
+    at least every `flush_interval` seconds and immediately once a full
+    batch is waiting. The sink is expected to commit a batch in one
+    transaction / one write (group commit).
+
+    Overload is bounded by `capacity`: DROP_OLDEST discards the oldest
+    pending record, REJECT raises QueueFull so the handler can push back
+    on the client (e.g. HTTP 503). stop() drains everything still queued.
+
+    Failed batches stay at the head of the queue and are retried with
+    exponential backoff. REJECT queues retry until the sink recovers, so
+    their records are never lost while the process runs. On DROP_OLDEST
+    queues, a batch that fails MAX_BATCH_ATTEMPTS times in a row is written
+    record by record, and records that still fail are dead-lettered to
+    `dead_letter_dir`, so one bad record cannot block the stream forever.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        sink: Callable[[List[Any]], None],
+        capacity: int = 65536,
+        batch_size: int = 512,
+        flush_interval: float = 0.5,
+        overflow: str = REJECT,
+        dead_letter_dir: str = DEAD_LETTER_DIR
+    ):
+        if overflow not in (DROP_OLDEST, REJECT):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.name = name
+        self.sink = sink
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dead_letter_dir = dead_letter_dir
+        self._items: deque = deque()
+        # Consecutive failed attempts at the batch at the head of the queue
+        self._failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "dropped": 0,
+            "rejected": 0,
+            "sink_errors": 0,
+            "dead_lettered": 0,
+            "high_watermark": 0,
+            "last_batch_ms": 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # ==================== PRODUCER ====================
+    def put_nowait(self, item: Any):
+        """
+        Queue one record (O(1), never touches disk)
+
+        Raises:
+            QueueFull: If the queue is at capacity and the policy is REJECT
+        """
+        if len(self._items) >= self.capacity:
+            if self.overflow == REJECT:
+                self.metrics["rejected"] += 1
+                raise QueueFull(f"{self.name} write queue is full ({self.capacity})")
+            self._items.popleft()
+            self.metrics["dropped"] += 1
+        self._items.append(item)
+        self.metrics["enqueued"] += 1
+        depth = len(self._items)
+        if depth > self.metrics["high_watermark"]:
+            self.metrics["high_watermark"] = depth
+        if self._wakeup is not None and depth >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self) -> List[Any]:
+        """Snapshot of records not yet handed to the sink"""
+        return list(self._items)
+
+    # ==================== CONSUMER ====================
+    async def start(self):
+        """Start the background flusher (called from app lifespan)"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flusher(), name=f"{self.name}-write-behind")
+
+    async def stop(self):
+        """Stop the flusher and drain everything still queued"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._wakeup = None
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            logger.error(f"❌ {self.name} write-behind shutdown flush failed: {e}")
+        if self._items:
+            logger.error(f"❌ {self.name}: {len(self._items)} records could not be written on shutdown")
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._items:
+                batch = self._take_batch()
+                try:
+                    await asyncio.to_thread(self._write, batch)
+                except Exception as e:
+                    delay = min(RETRY_DELAY_SECONDS * 2 ** (self._failures - 1), RETRY_MAX_DELAY_SECONDS)
+                    logger.error(
+                        f"❌ {self.name} write-behind flush failed ({self._failures}x, retrying in {delay:.0f}s): {e}"
+                    )
+                    await asyncio.sleep(delay)
+                    break
+
+    def _take_batch(self) -> List[Any]:
+        batch = []
+        while self._items and len(batch) < self.batch_size:
+            batch.append(self._items.popleft())
+        return batch
+
+    def _write(self, batch: List[Any]):
+        started = time.perf_counter()
+        try:
+            self.sink(batch)
+        except Exception as e:
+            self.metrics["sink_errors"] += 1
+            self._failures += 1
+            if self.overflow == DROP_OLDEST and self._failures >= MAX_BATCH_ATTEMPTS:
+                logger.error(
+                    f"❌ {self.name}: batch of {len(batch)} failed {self._failures} times ({e}) - "
+                    f"writing records one by one"
+                )
+                self._failures = 0
+                self._write_each(batch)
+                return
+            # Put the batch back in order; it is retried on the next flush
+            self._items.extendleft(reversed(batch))
+            raise
+        self._failures = 0
+        self.metrics["written"] += len(batch)
+        self.metrics["batches"] += 1
+        self.metrics["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _write_each(self, batch: List[Any]):
+        """Fallback for a batch the sink keeps rejecting: isolate the bad records"""
+        failed = []
+        for item in batch:
+            try:
+                self.sink([item])
+            except Exception as e:
+                failed.append((item, e))
+                continue
+            self.metrics["written"] += 1
+            self.metrics["batches"] += 1
+        if failed:
+            self._dead_letter(failed)
+
+    def _dead_letter(self, failed: List):
+        """
+        Persist records the sink rejected individually (one JSON line each)
+
+        Record contents never go to the debug log: they may hold patient text.
+        """
+        self.metrics["dead_lettered"] += len(failed)
+        path = os.path.join(self.dead_letter_dir, f"{self.name}-{datetime.now().strftime('%Y%m%d')}.jsonl")
+        try:
+            lines = b"".join(
+                dumps({"ts": time.time(), "error": f"{type(error).__name__}: {error}", "record": _jsonable(item)})
+                + b"\n"
+                for item, error in failed
+            )
+            os.makedirs(self.dead_letter_dir, exist_ok=True)
+            with open(path, "ab") as f:
+                f.write(lines)
+        except Exception as e:
+            logger.error(f"❌ {self.name}: {len(failed)} records lost, dead-letter file not writable: {e}")
+            return
+        logger.error(f"❌ {self.name}: {len(failed)} records dead-lettered to {path}")
+
+    def flush(self):
+        """
+        Synchronously write everything queued (shutdown, tests, benchmarks)
+
+        A failing batch is retried at once; DROP_OLDEST batches then fall
+        back to per-record writes, so those queues always drain.
+
+        Raises:
+            Exception: The sink's error once a REJECT batch has failed
+                MAX_BATCH_ATTEMPTS times (its records stay queued)
+        """
+        attempts = 0
+        while self._items:
+            try:
+                self._write(self._take_batch())
+                attempts = 0
+            except Exception:
+                attempts += 1
+                if attempts >= MAX_BATCH_ATTEMPTS:
+                    raise
+
+    def snapshot(self) -> Dict:
+        """Metrics plus current depth, for /metrics"""
+        return {
+            **self.metrics,
+            "depth": len(self._items),
+            "capacity": self.capacity,
+            "overflow": self.overflow,
+        }